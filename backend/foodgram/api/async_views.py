@@ -0,0 +1,214 @@
+"""
+Асинхронные варианты чтения для ASGI (ASYNC_READ_API = True).
+
+Представления переиспользуют вьюсеты из api.views: аутентификация,
+права, фильтры, сериализаторы и формат ответа те же, что в синхронном
+API. SQL страниц и объектов выполняется асинхронным ORM (acount, aget,
+async for), справочники берутся через aget_reference_data. То, что
+может обратиться к базе неявно (аутентификация, проверка фильтров,
+сериализация), выполняется в потоке через sync_to_async, а генерация
+PDF - в общем пуле потоков, чтобы не занимать поток запроса.
+
+Остальные методы (POST, PATCH, DELETE) передаются синхронному
+вьюсету.
+"""
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+from recipe.models import Recipe
+from recipe.reference import aget_reference_data
+
+from .cache import aget_cart_version, cart_export_key
+from .exports import cart_ingredients, export_requested_async
+from .pagination import AsyncPageNumberPagination, KeysetPagination
+from .serializers import UserWithRecipes
+from .views import (CustomUserViewSet, IngridientsViewSet, RecipeViewset,
+                    TagViewset)
+
+
+class AsyncViewsetView(View):
+    """
+    GET и HEAD обрабатывает асинхронный метод handle, прочие методы -
+    синхронное представление вьюсета viewset_class с action_map.
+    """
+    viewset_class = None
+    action_map = None
+    detail = False
+    sync_view = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        sync_view = cls.viewset_class.as_view(
+            cls.action_map, detail=cls.detail)
+        view = super().as_view(sync_view=sync_view, **initkwargs)
+        return csrf_exempt(view)
+
+    async def get(self, request, *args, **kwargs):
+        viewset = self.make_viewset()
+        drf_request = viewset.initialize_request(request, *args, **kwargs)
+        # initialize_request берет action по методу, а у HEAD его нет.
+        viewset.action = self.action_map['get']
+        viewset.request = drf_request
+        viewset.headers = viewset.default_response_headers
+        try:
+            await sync_to_async(viewset.initial)(
+                drf_request, *args, **kwargs)
+            response = await self.handle(viewset, drf_request)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+        return viewset.finalize_response(
+            drf_request, response, *args, **kwargs)
+
+    head = get
+
+    async def post(self, request, *args, **kwargs):
+        return await self.sync(request, *args, **kwargs)
+
+    put = patch = delete = options = post
+
+    async def sync(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    def make_viewset(self):
+        action = self.action_map['get']
+        # Параметры @action (permission_classes, renderer_classes и т.п.)
+        # роутер передает через as_view, здесь - так же.
+        initkwargs = getattr(getattr(self.viewset_class, action),
+                             'kwargs', {})
+        viewset = self.viewset_class(**initkwargs)
+        viewset.action_map = self.action_map
+        viewset.detail = self.detail
+        viewset.args = self.args
+        viewset.kwargs = self.kwargs
+        viewset.format_kwarg = None
+        return viewset
+
+    async def handle(self, viewset, request):
+        raise NotImplementedError
+
+
+async def serialize(serializer):
+    """Данные сериализатора; ленивые запросы не блокируют цикл событий."""
+    return await sync_to_async(lambda: serializer.data)()
+
+
+class RecipeListView(AsyncViewsetView):
+    viewset_class = RecipeViewset
+    action_map = {'get': 'list', 'post': 'create'}
+
+    async def handle(self, viewset, request):
+        return await viewset.acached_response(
+            request, partial(self.build, viewset, request))
+
+    async def build(self, viewset, request):
+        await aget_reference_data()
+        queryset = await sync_to_async(viewset.filter_queryset)(
+            viewset.get_queryset())
+        paginator = viewset.paginator
+        page = await paginator.apaginate_queryset(queryset, request, viewset)
+        data = await serialize(viewset.get_serializer(page, many=True))
+        return paginator.get_paginated_response(data)
+
+
+class RecipeDetailView(AsyncViewsetView):
+    viewset_class = RecipeViewset
+    action_map = {'get': 'retrieve', 'put': 'update',
+                  'patch': 'partial_update', 'delete': 'destroy'}
+    detail = True
+
+    async def handle(self, viewset, request):
+        return await viewset.acached_response(
+            request, partial(self.build, viewset, request))
+
+    async def build(self, viewset, request):
+        await aget_reference_data()
+        queryset = await sync_to_async(viewset.filter_queryset)(
+            viewset.get_queryset())
+        try:
+            instance = await queryset.aget(pk=viewset.kwargs['pk'])
+        except Recipe.DoesNotExist:
+            raise Http404
+        viewset.check_object_permissions(request, instance)
+        data = await serialize(viewset.get_serializer(instance))
+        return Response(data)
+
+
+class TagListView(AsyncViewsetView):
+    viewset_class = TagViewset
+    action_map = {'get': 'list'}
+
+    async def handle(self, viewset, request):
+        return viewset.reference_list(request, await aget_reference_data())
+
+
+class IngredientListView(AsyncViewsetView):
+    viewset_class = IngridientsViewSet
+    action_map = {'get': 'list', 'post': 'create'}
+
+    async def handle(self, viewset, request):
+        return viewset.reference_list(request, await aget_reference_data())
+
+
+class SubscriptionsView(AsyncViewsetView):
+    viewset_class = CustomUserViewSet
+    action_map = {'get': 'subscriptions'}
+
+    async def handle(self, viewset, request):
+        recipes_limit = viewset.get_recipes_limit()
+        users = viewset.get_subscriptions_queryset(
+            request.user, recipes_limit)
+        if KeysetPagination.cursor_query_param in request.query_params:
+            paginator = KeysetPagination(ordering=('id', ))
+        else:
+            paginator = AsyncPageNumberPagination()
+        results = await paginator.apaginate_queryset(users, request)
+        context = viewset.get_serializer_context()
+        context['recipes_limit'] = recipes_limit
+        data = await serialize(
+            UserWithRecipes(results, context=context, many=True))
+        return paginator.get_paginated_response(data)
+
+
+class DownloadShoppingCartView(AsyncViewsetView):
+    """
+    Список покупок: строки читаются асинхронным ORM, документ
+    рендерится в пуле потоков (thread_sensitive=False), поэтому
+    долгий PDF не держит ни цикл событий, ни поток запроса.
+    """
+    viewset_class = RecipeViewset
+    action_map = {'get': 'download_shopping_cart'}
+
+    async def handle(self, viewset, request):
+        if export_requested_async(request):
+            return await sync_to_async(viewset.export_job_response)(request)
+        renderer = request.accepted_renderer
+        user_id = request.user.id
+        version = await aget_cart_version(user_id)
+        etag = f'"{version}-{renderer.format}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = cart_export_key(user_id, version, renderer.format)
+            content = await cache.aget(key)
+            if content is not None:
+                response = renderer.cached_response(content)
+            else:
+                ingredients = [
+                    row async for row in cart_ingredients(user_id)]
+                content = await sync_to_async(
+                    renderer.document, thread_sensitive=False)(ingredients)
+                if len(content) <= settings.SHOPPING_CART_CACHE_MAX_SIZE:
+                    await cache.aset(key, content,
+                                     settings.SHOPPING_CART_CACHE_TIMEOUT)
+                response = renderer.cached_response(content)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept',))
+        return response
@@ -0,0 +1,77 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CART_VERSION_KEY = 'shopping_cart:version:{user_id}'
+CART_EXPORT_KEY = 'shopping_cart:export:{user_id}:{version}:{format}'
+RELATIONS_VERSION_KEY = 'relations:version:{user_id}'
+RELATIONS_KEY = 'relations:{user_id}:{version}:{kind}'
+
+
+def get_cart_version(user_id):
+    """Текущая версия корзины пользователя."""
+    return cache.get_or_set(
+        CART_VERSION_KEY.format(user_id=user_id), lambda: uuid4().hex, None)
+
+
+async def aget_cart_version(user_id):
+    return await cache.aget_or_set(
+        CART_VERSION_KEY.format(user_id=user_id), lambda: uuid4().hex, None)
+
+
+def bump_cart_version(*user_ids):
+    """
+    Сбрасывает версии корзин после коммита транзакции, чтобы
+    параллельный запрос не закэшировал старые данные под новой версией.
+    """
+    bump_versions(CART_VERSION_KEY, user_ids)
+
+
+def bump_versions(key, user_ids):
+    if not user_ids:
+        return
+    transaction.on_commit(lambda: cache.set_many(
+        {key.format(user_id=user_id): uuid4().hex for user_id in user_ids},
+        None,
+    ))
+
+
+def cart_export_key(user_id, version, format):
+    return CART_EXPORT_KEY.format(
+        user_id=user_id, version=version, format=format)
+
+
+def get_relations_version(user_id):
+    """Версия подписок, избранного и корзины пользователя."""
+    return cache.get_or_set(
+        RELATIONS_VERSION_KEY.format(user_id=user_id),
+        lambda: uuid4().hex, None)
+
+
+def bump_relations_version(*user_ids):
+    bump_versions(RELATIONS_VERSION_KEY, user_ids)
+
+
+def relations_key(user_id, version, kind):
+    return RELATIONS_KEY.format(user_id=user_id, version=version, kind=kind)
+
+
+def cache_stream(chunks, key):
+    """
+    Отдает чанки дальше и кладет собранный документ в кэш, если он
+    уложился в SHOPPING_CART_CACHE_MAX_SIZE.
+    """
+    collected, size = [], 0
+    for chunk in chunks:
+        if collected is not None:
+            size += len(chunk)
+            if size > settings.SHOPPING_CART_CACHE_MAX_SIZE:
+                collected = None
+            else:
+                collected.append(chunk)
+        yield chunk
+    if collected is not None:
+        cache.set(key, b''.join(collected),
+                  settings.SHOPPING_CART_CACHE_TIMEOUT)
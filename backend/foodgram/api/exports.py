@@ -0,0 +1,194 @@
+"""
+Фоновая выгрузка списка покупок.
+
+download_shopping_cart с ?async=true (или при
+SHOPPING_CART_EXPORT_ASYNC = True) не рендерит документ в запросе, а
+ставит задание ExportJob в очередь в базе и отвечает 202 со ссылкой на
+задание. Задания выполняет команда run_export_worker; клиент опрашивает
+/api/exports/{id}/ и забирает готовый файл по /api/exports/{id}/file/.
+
+Задание одно на пользователя, версию корзины и формат, поэтому
+повторные запросы до изменения корзины получают то же задание, а
+готовый файл не рендерится заново. Документ отражает корзину на момент
+рендеринга. Через SHOPPING_CART_EXPORT_TTL секунд после создания или
+завершения задание вместе с файлом удаляет cleanup_expired.
+"""
+import logging
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from recipe.models import ExportJob, IngredientsRecipe
+
+from .cache import get_cart_version
+from .renderers import (CSVShoppingListRenderer, PDFShoppingListRenderer,
+                        TextShoppingListRenderer)
+
+logger = logging.getLogger(__name__)
+
+RENDERERS = {renderer.format: renderer for renderer in (
+    PDFShoppingListRenderer, CSVShoppingListRenderer,
+    TextShoppingListRenderer)}
+
+# Сколько заданий из головы очереди воркер пробует захватить за раз.
+CLAIM_BATCH = 10
+
+
+def export_requested_async(request):
+    """Просит ли клиент фоновую выгрузку параметром ?async=true."""
+    value = request.query_params.get('async')
+    if value is None:
+        return settings.SHOPPING_CART_EXPORT_ASYNC
+    return value in ('true', 'True', '1')
+
+
+def cart_ingredients(user_id):
+    """Строки списка покупок пользователя, сгруппированные по ингредиенту."""
+    return IngredientsRecipe.objects.filter(
+        recipe__is_in_shopping_cart__user_id=user_id
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('ingredient__name')
+
+
+def expiry(now):
+    return now + timedelta(seconds=settings.SHOPPING_CART_EXPORT_TTL)
+
+
+def enqueue_export(user_id, format):
+    """
+    Задание на выгрузку текущей версии корзины в формате format.
+    Существующее задание переиспользуется; упавшее или просроченное
+    ставится в очередь заново. Возвращает (задание, новое ли оно).
+    """
+    now = timezone.now()
+    job, created = ExportJob.objects.get_or_create(
+        user_id=user_id, format=format,
+        cart_version=get_cart_version(user_id),
+        defaults={'created': now, 'expires': expiry(now)},
+    )
+    if created or (job.status != ExportJob.FAILED and job.expires > now):
+        return job, created
+    old_file = job.file.name
+    if ExportJob.objects.filter(id=job.id, status=job.status).update(
+            status=ExportJob.PENDING, file='', error='', attempts=0,
+            created=now, started=None, finished=None, expires=expiry(now)):
+        if old_file:
+            transaction.on_commit(lambda: job.file.storage.delete(old_file))
+    job.refresh_from_db()
+    return job, True
+
+
+def stale_before():
+    """Задание, начатое раньше, считается брошенным упавшим воркером."""
+    return timezone.now() - timedelta(
+        seconds=settings.SHOPPING_CART_EXPORT_TIMEOUT)
+
+
+def claimable():
+    """Задания в очереди и зависшие: воркер упал, не завершив их."""
+    return ExportJob.objects.filter(
+        Q(status=ExportJob.PENDING)
+        | Q(status=ExportJob.RUNNING, started__lt=stale_before()),
+        attempts__lt=settings.SHOPPING_CART_EXPORT_MAX_ATTEMPTS,
+    )
+
+
+def fail_abandoned():
+    """
+    Зависшие задания, исчерпавшие попытки, помечает упавшими: claim_job
+    их уже не возьмет, и без этого клиент опрашивал бы их вечно.
+    Возвращает их число.
+    """
+    now = timezone.now()
+    failed = ExportJob.objects.filter(
+        status=ExportJob.RUNNING, started__lt=stale_before(),
+        attempts__gte=settings.SHOPPING_CART_EXPORT_MAX_ATTEMPTS,
+    ).update(status=ExportJob.FAILED,
+             error='Воркер не завершил выгрузку за отведенное время',
+             finished=now, expires=expiry(now))
+    if failed:
+        logger.warning('Брошенных заданий выгрузки помечено упавшими: %s',
+                       failed)
+    return failed
+
+
+def claim_job():
+    """
+    Забирает самое старое задание из очереди. Задание достается одному
+    воркеру: статус меняется условным UPDATE, проигравший берет
+    следующее. Возвращает задание или None, если очередь пуста.
+    """
+    queue = claimable()
+    for job_id in queue.order_by('created').values_list(
+            'id', flat=True)[:CLAIM_BATCH]:
+        if queue.filter(id=job_id).update(
+                status=ExportJob.RUNNING, started=timezone.now(),
+                attempts=F('attempts') + 1):
+            return ExportJob.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Рендерит документ задания, захваченного claim_job, и сохраняет
+    файл. При ошибке задание возвращается в очередь, пока не исчерпаны
+    попытки. Возвращает True, если файл готов.
+    """
+    # Задание могли перезахватить как зависшее или удалить; started
+    # отличает этот захват от следующих.
+    claimed = ExportJob.objects.filter(
+        id=job.id, status=ExportJob.RUNNING, started=job.started)
+    try:
+        content = RENDERERS[job.format]().document(
+            cart_ingredients(job.user_id).iterator())
+    except Exception as error:
+        logger.exception('Не удалось выгрузить список покупок, задание %s',
+                         job.id)
+        now = timezone.now()
+        if job.attempts >= settings.SHOPPING_CART_EXPORT_MAX_ATTEMPTS:
+            claimed.update(status=ExportJob.FAILED, error=str(error),
+                           finished=now, expires=expiry(now))
+        else:
+            claimed.update(status=ExportJob.PENDING, error=str(error))
+        return False
+    storage = job.file.storage
+    name = storage.save(f'exports/{uuid4().hex}.{job.format}',
+                        ContentFile(content))
+    now = timezone.now()
+    if not claimed.update(status=ExportJob.DONE, file=name, error='',
+                          finished=now, expires=expiry(now)):
+        storage.delete(name)
+        return False
+    return True
+
+
+def cleanup_expired(batch_size=1000):
+    """
+    Удаляет просроченные задания и их файлы, а брошенные задания без
+    попыток помечает упавшими. Возвращает число удаленных заданий.
+    """
+    fail_abandoned()
+    now = timezone.now()
+    expired = ExportJob.objects.filter(expires__lte=now)
+    storage = ExportJob._meta.get_field('file').storage
+    deleted = 0
+    while True:
+        jobs = list(expired.order_by('id').values_list(
+            'id', 'file')[:batch_size])
+        if not jobs:
+            return deleted
+        # Задание, поставленное заново после выборки, уже не просрочено
+        # и не удаляется; его старый файл удаляет enqueue_export.
+        deleted += expired.filter(
+            id__in=[job_id for job_id, _ in jobs]).delete()[0]
+        for _, name in jobs:
+            if name:
+                storage.delete(name)
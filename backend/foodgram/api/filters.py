@@ -1,33 +1,55 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from recipe.models import Ingredient, Recipe, Tag
+from recipe.models import Recipe
+from recipe.reference import get_reference_data
+from recipe.search import search
 
 User = get_user_model()
 
 
-class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='startswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ['name']
-
-
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
+    ORDERING_CHOICES = (
+        ('-pub_date', 'Сначала новые'),
+        ('pub_date', 'Сначала старые'),
+        ('-favorites_count', 'Сначала популярные'),
+        ('favorites_count', 'Сначала непопулярные'),
+    )
+
+    tags = filters.MultipleChoiceFilter(
         field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+        choices=lambda: get_reference_data().tag_choices(),
+        method='filter_tags',
     )
 
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=ORDERING_CHOICES, method='filter_ordering')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author',)
 
+    def filter_tags(self, queryset, name, value):
+        """
+        EXISTS вместо JOIN по тегам: не нужен DISTINCT, и сортировка
+        по индексу (например, по популярности) сохраняется. Слаги
+        переводятся в id по справочнику в памяти.
+        """
+        if not value:
+            return queryset
+        tags = get_reference_data().tags_by_slug
+        tag_ids = [tags[slug].id for slug in value if slug in tags]
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_ids)))
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, по убыванию релевантности."""
+        return search(queryset, value)
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
@@ -38,4 +60,13 @@ class RecipeFilter(FilterSet):
         user = self.request.user
         if value and not user.is_anonymous:
             return queryset.filter(is_in_shopping_cart__user=user)
-        return queryset
\ No newline at end of file
+        return queryset
+
+    @staticmethod
+    def ordering_fields(value):
+        """Сортировка с id для однозначного порядка при равных значениях."""
+        direction = '-' if value.startswith('-') else ''
+        return (value, f'{direction}id')
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*self.ordering_fields(value))
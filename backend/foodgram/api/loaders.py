@@ -0,0 +1,164 @@
+"""
+Пакетная загрузка связей сериализаторов.
+
+Сериализатор с BatchedRelationsMixin объявляет связи в
+batched_relations, а BatchListSerializer перед сериализацией страницы
+собирает ключи всех ее объектов и загружает каждую связь одним запросом
+через загрузчики запроса (Loader). Загруженное кладется в кэши связей
+Django, поэтому поля сериализатора (author, tags.all(),
+ingredients_in_recipe.all()) работают как прежде, но без запроса на
+объект. Связи, уже загруженные select_related или prefetch_related
+представления, не перечитываются.
+
+Загрузчик живет один запрос и запоминает значения по ключам: автор
+нескольких рецептов читается один раз, как и рецепт, повторно
+встретившийся в ответе.
+"""
+from django.contrib.auth.models import User
+from django.db import models
+from rest_framework import serializers
+
+from recipe.models import IngredientsRecipe, Recipe, Tag
+from recipe.reference import get_reference_data
+
+
+class Loader:
+    """Значения по ключам, загружаются пачкой и запоминаются."""
+
+    def __init__(self):
+        self.values = {}
+
+    def load_many(self, keys):
+        missing = {key for key in keys if key not in self.values}
+        if missing:
+            loaded = self.batch(missing)
+            for key in missing:
+                self.values[key] = loaded.get(key)
+        return [self.values[key] for key in keys]
+
+    def load(self, key):
+        return self.load_many((key, ))[0]
+
+    def batch(self, keys):
+        """{ключ: значение} для множества keys одним запросом."""
+        raise NotImplementedError
+
+
+class GroupLoader(Loader):
+    """Списки значений по ключу: строки связи один-ко-многим."""
+
+    def batch(self, keys):
+        groups = {key: [] for key in keys}
+        for key, value in self.rows(keys):
+            groups[key].append(value)
+        return groups
+
+    def rows(self, keys):
+        """Пары (ключ, значение) в порядке выдачи."""
+        raise NotImplementedError
+
+
+class UserLoader(Loader):
+
+    def batch(self, keys):
+        return User.objects.in_bulk(keys)
+
+
+class RecipeTagsLoader(GroupLoader):
+    """Теги рецептов: запрос только к связям, сами теги из справочника."""
+
+    def rows(self, keys):
+        links = list(Recipe.tags.through.objects.filter(
+            recipe_id__in=keys).order_by('id').values_list(
+                'recipe_id', 'tag_id'))
+        tags = get_reference_data().tags
+        missing = {tag_id for _, tag_id in links if tag_id not in tags}
+        if missing:
+            # Справочник мог устареть: недостающие теги читаем из базы.
+            tags = {**tags, **Tag.objects.in_bulk(missing)}
+        return [(recipe_id, tags[tag_id]) for recipe_id, tag_id in links
+                if tag_id in tags]
+
+
+class RecipeIngredientsLoader(GroupLoader):
+
+    def rows(self, keys):
+        return ((item.recipe_id, item) for item in
+                IngredientsRecipe.objects.filter(
+                    recipe_id__in=keys).order_by('id'))
+
+
+def get_loader(context, loader_class):
+    """
+    Загрузчик loader_class запроса из context, создается при первом
+    обращении. Без запроса загрузчики хранятся в самом context.
+    """
+    request = context.get('request')
+    if request is None:
+        loaders = context.setdefault('_loaders', {})
+    else:
+        loaders = getattr(request, '_loaders', None)
+        if loaders is None:
+            loaders = request._loaders = {}
+    if loader_class not in loaders:
+        loaders[loader_class] = loader_class()
+    return loaders[loader_class]
+
+
+def is_many(instance, name):
+    field = instance._meta.get_field(name)
+    return field.many_to_many or field.one_to_many
+
+
+def is_loaded(instance, name):
+    if is_many(instance, name):
+        return name in getattr(instance, '_prefetched_objects_cache', {})
+    return instance._meta.get_field(name).is_cached(instance)
+
+
+def set_loaded(instance, name, value):
+    """Кладет value в кэш связи name, как это делает prefetch_related."""
+    if not is_many(instance, name):
+        instance._meta.get_field(name).set_cached_value(instance, value)
+        return
+    queryset = getattr(instance, name).get_queryset()
+    queryset._result_cache = list(value)
+    queryset._prefetch_done = True
+    if not hasattr(instance, '_prefetched_objects_cache'):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[name] = queryset
+
+
+class BatchListSerializer(serializers.ListSerializer):
+    """Загружает связи всех объектов страницы до их сериализации."""
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        instances = list(data)
+        self.child.load_relations(instances)
+        return [self.child.to_representation(item) for item in instances]
+
+
+class BatchedRelationsMixin:
+    """
+    batched_relations - словарь {связь: (загрузчик, поле с ключом)}.
+    В Meta такого сериализатора указывается
+    list_serializer_class = BatchListSerializer.
+    """
+    batched_relations = {}
+
+    def load_relations(self, instances):
+        for name, (loader_class, key) in self.batched_relations.items():
+            pending = [instance for instance in instances
+                       if not is_loaded(instance, name)]
+            if not pending:
+                continue
+            values = get_loader(self.context, loader_class).load_many(
+                [getattr(instance, key) for instance in pending])
+            for instance, value in zip(pending, values):
+                set_loaded(instance, name, value)
+
+    def to_representation(self, instance):
+        self.load_relations((instance, ))
+        return super().to_representation(instance)
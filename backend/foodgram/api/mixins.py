@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from foodgram.metrics import QueryBudgetExceeded, current_metrics, registry
+from recipe.data_version import aget_recipes_version, get_recipes_version
+from recipe.reference import get_reference_data
+
+logger = logging.getLogger(__name__)
+
+
+class QueryMetricsMixin:
+    """
+    Дополняет метрики QueryMetricsMiddleware временем сериализации и
+    проверяет бюджет SQL-запросов представления.
+
+    query_budget - число или словарь {action: число}. При превышении
+    бюджета пишется предупреждение, а с QUERY_BUDGET_STRICT = True
+    выбрасывается QueryBudgetExceeded, что роняет тесты.
+    """
+    query_budget = None
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        metrics = current_metrics()
+        if metrics is not None:
+            to_representation = serializer.to_representation
+
+            def timed_to_representation(instance):
+                started = time.perf_counter()
+                try:
+                    return to_representation(instance)
+                finally:
+                    metrics.serializer_time += (
+                        time.perf_counter() - started)
+
+            serializer.to_representation = timed_to_representation
+        return serializer
+
+    def get_query_budget(self):
+        if isinstance(self.query_budget, dict):
+            return self.query_budget.get(self.action)
+        return self.query_budget
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        metrics = current_metrics()
+        budget = self.get_query_budget()
+        if metrics is None or budget is None or metrics.queries <= budget:
+            return response
+        message = (f'{type(self).__name__}.{self.action}: '
+                   f'{metrics.queries} SQL-запросов при бюджете {budget}, '
+                   f'повторов {metrics.duplicates}')
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+        return response
+
+
+class ReferenceDataMixin:
+    """
+    Ответы со справочниками (recipe.reference): ETag по версии
+    справочников и Cache-Control, чтобы клиенты и прокси не забирали
+    неизменившиеся списки повторно.
+    """
+
+    def reference_response(self, request, build, reference=None):
+        """
+        build(reference) возвращает данные ответа. reference передают
+        асинхронные представления, уже получившие справочники.
+        """
+        if reference is None:
+            reference = get_reference_data()
+        etag = f'"{reference.version}-{request.accepted_renderer.format}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(build(reference))
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.REFERENCE_CACHE_MAX_AGE)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class ResponseCacheMixin:
+    """
+    Кэш ответов анонимным пользователям: они получают одинаковые
+    ответы, поэтому данные ответа кэшируются под версией данных
+    рецептов (recipe.data_version) и нормализованными параметрами.
+
+    ETag строится по ключу кэша, Last-Modified - момент последнего
+    изменения данных рецептов (pub_date при правке рецепта не
+    меняется). Запрос с If-None-Match или If-Modified-Since получает
+    304 без обращения к базе и к закэшированным данным.
+    """
+    # Параметры, с которыми ответ кэшируется; с другими - нет.
+    cached_query_params = frozenset()
+    # Параметры, порядок и повторы значений которых не важны.
+    unordered_query_params = frozenset()
+
+    def response_cache_digest(self, request, version):
+        """Хэш ответа в версии version или None, если он не кэшируется."""
+        params = request.query_params
+        if (not settings.RECIPE_RESPONSE_CACHE
+                or request.user.is_authenticated
+                or not set(params) <= self.cached_query_params):
+            return None
+        normalized = {
+            name: (sorted(set(params.getlist(name)))
+                   if name in self.unordered_query_params
+                   else params.getlist(name))
+            for name in params
+        }
+        # Адрес сайта входит в ключ: из него строятся ссылки next и
+        # previous.
+        raw = json.dumps((version, self.action, self.kwargs,
+                          request.build_absolute_uri('/'), normalized),
+                         sort_keys=True)
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def cached_response(self, request, build):
+        """build() строит ответ, если его нет в кэше."""
+        version, changed = get_recipes_version()
+        digest = self.response_cache_digest(request, version)
+        if digest is None:
+            return build()
+        response = self.not_modified(request, digest, changed)
+        if response is not None:
+            return response
+        key = f'recipes:response:{digest}'
+        data = cache.get(key)
+        if data is not None:
+            return self.finish_cached(
+                request, Response(data), digest, changed, 'hit')
+        response = build()
+        if response.status_code == 200:
+            cache.set(key, response.data,
+                      settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+        return self.finish_cached(request, response, digest, changed, 'miss')
+
+    async def acached_response(self, request, build):
+        """cached_response для асинхронных представлений; build - корутина."""
+        version, changed = await aget_recipes_version()
+        digest = self.response_cache_digest(request, version)
+        if digest is None:
+            return await build()
+        response = self.not_modified(request, digest, changed)
+        if response is not None:
+            return response
+        key = f'recipes:response:{digest}'
+        data = await cache.aget(key)
+        if data is not None:
+            return self.finish_cached(
+                request, Response(data), digest, changed, 'hit')
+        response = await build()
+        if response.status_code == 200:
+            await cache.aset(key, response.data,
+                             settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+        return self.finish_cached(request, response, digest, changed, 'miss')
+
+    def etag(self, request, digest):
+        return f'"{digest}-{request.accepted_renderer.format}"'
+
+    def not_modified(self, request, digest, changed):
+        response = get_conditional_response(
+            request, etag=self.etag(request, digest),
+            last_modified=int(changed))
+        if response is not None:
+            self.finish_cached(
+                request, response, digest, changed, 'not_modified')
+        return response
+
+    def finish_cached(self, request, response, digest, changed, result):
+        registry.increment('response_cache_requests_total',
+                           view=self.action, result=result)
+        if response.status_code not in (200, 304):
+            return response
+        response['ETag'] = self.etag(request, digest)
+        response['Last-Modified'] = http_date(changed)
+        if response.status_code == 200:
+            response['X-Cache'] = result.upper()
+        # Пользователи с токеном или сессией получают по тому же адресу
+        # другой ответ, так что прокси должны учитывать заголовки.
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
@@ -0,0 +1,218 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, LimitOffsetPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .filters import RecipeFilter
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу (keyset): следующая страница выбирается
+    условием WHERE (pub_date, id) < (последние значения) вместо OFFSET,
+    поэтому глубокие страницы не дорожают и не съезжают при вставке
+    новых записей.
+
+    Страница задается непрозрачным ?cursor=, размер - ?limit=.
+    Общее число записей не считается, если не передан ?count=true.
+    """
+    ordering = ('-pub_date', '-id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.get_page_queryset(queryset, request)
+        if self.count_requested(request):
+            self.count = queryset.count()
+        return self.set_page(list(page))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset на асинхронном ORM."""
+        page = self.get_page_queryset(queryset, request)
+        if self.count_requested(request):
+            self.count = await queryset.acount()
+        return self.set_page([item async for item in page])
+
+    def count_requested(self, request):
+        return request.query_params.get(self.count_query_param) in (
+            'true', 'True', '1')
+
+    def get_page_queryset(self, queryset, request):
+        """Запрос страницы с лишней записью - признаком следующей."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(position))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.last = results[-1] if results else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.last))
+
+    def fields(self):
+        return [(field.lstrip('-'), field.startswith('-'))
+                for field in self.ordering]
+
+    def position_filter(self, position):
+        """(a, b) < (x, y) как a < x OR (a = x AND b < y)."""
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.fields(), position):
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, instance):
+        position = [str(getattr(instance, name))
+                    for name, _ in self.fields()]
+        return urlsafe_b64encode(
+            json.dumps(position).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4)))
+            fields = self.fields()
+            if not isinstance(position, list) or len(position) != len(
+                    fields):
+                raise ValueError
+            return [model._meta.get_field(name).to_python(value)
+                    for (name, _), value in zip(fields, position)]
+        except (BinasciiError, UnicodeDecodeError, ValueError, TypeError,
+                ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class RecipePagination(LimitOffsetPagination):
+    """
+    limit/offset по умолчанию; с параметром ?cursor (можно пустым для
+    первой страницы) - KeysetPagination по (pub_date, id) или по
+    сортировке из ?ordering.
+
+    Результаты ?search упорядочены по релевантности, а курсор заменил бы
+    этот порядок своим, поэтому ?cursor вместе с ?search отклоняется
+    с ответом 400: поиск листается только через limit/offset.
+    """
+    search_query_param = 'search'
+    cursor_with_search_message = (
+        'Результаты поиска листаются через limit/offset, '
+        'cursor с search не сочетается')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.get_keyset(request)
+        if self.keyset is not None:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset на асинхронном ORM; повторяет
+        LimitOffsetPagination.paginate_queryset.
+        """
+        self.keyset = self.get_keyset(request)
+        if self.keyset is not None:
+            return await self.keyset.apaginate_queryset(
+                queryset, request, view)
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [item async for item in
+                queryset[self.offset:self.offset + self.limit]]
+
+    def get_keyset(self, request):
+        if KeysetPagination.cursor_query_param not in request.query_params:
+            return None
+        if request.query_params.get(self.search_query_param):
+            raise serializers.ValidationError(
+                {KeysetPagination.cursor_query_param: [
+                    self.cursor_with_search_message]})
+        ordering = request.query_params.get('ordering')
+        if ordering in dict(RecipeFilter.ORDERING_CHOICES):
+            return KeysetPagination(RecipeFilter.ordering_fields(ordering))
+        return KeysetPagination()
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """PageNumberPagination с apaginate_queryset на асинхронном ORM."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count у Paginator - cached_property, считаем его заранее.
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        self.page.object_list = [
+            item async for item in self.page.object_list]
+        return list(self.page)
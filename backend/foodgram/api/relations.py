@@ -0,0 +1,92 @@
+"""
+Связи текущего пользователя: на кого он подписан, что в избранном и в
+корзине.
+
+Вместо запроса EXISTS на каждую строку ответа UserRelations один раз за
+запрос читает множество id нужного вида и отвечает на все проверки
+is_subscribed, is_favorited и is_in_shopping_cart в памяти. С
+USER_RELATIONS_CACHE = True множества хранятся и в общем кэше под
+версией пользователя, которую меняют действия favorite, shopping_cart и
+subscribe (invalidate). Изменения в обход API, например из админки,
+видны через USER_RELATIONS_CACHE_TIMEOUT.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from recipe.models import FavoritesRecipe, Follow, ShoppingList
+
+from .cache import (bump_relations_version, get_relations_version,
+                    relations_key)
+
+FOLLOWING = 'following'
+FAVORITES = 'favorites'
+CART = 'cart'
+
+# Вид связи -> (модель, поле с id).
+SOURCES = {
+    FOLLOWING: (Follow, 'author_id'),
+    FAVORITES: (FavoritesRecipe, 'recipe_id'),
+    CART: (ShoppingList, 'recipe_id'),
+}
+
+# Вид связи, которую меняет добавление строки модели.
+MODEL_KINDS = {FavoritesRecipe: FAVORITES, ShoppingList: CART}
+
+
+class UserRelations:
+    """Множества id связей пользователя, читаются при первой проверке."""
+
+    def __init__(self, user):
+        self.user_id = user.id if user.is_authenticated else None
+        self.version = None
+        self.ids = {}
+
+    def get(self, kind):
+        if kind not in self.ids:
+            self.ids[kind] = self.load(kind)
+        return self.ids[kind]
+
+    def load(self, kind):
+        if self.user_id is None:
+            return frozenset()
+        if not settings.USER_RELATIONS_CACHE:
+            return self.query(kind)
+        # Версия читается до запроса к базе: если связи изменятся во
+        # время чтения, результат ляжет под уже устаревшую версию.
+        if self.version is None:
+            self.version = get_relations_version(self.user_id)
+        key = relations_key(self.user_id, self.version, kind)
+        ids = cache.get(key)
+        if ids is None:
+            ids = self.query(kind)
+            cache.set(key, ids, settings.USER_RELATIONS_CACHE_TIMEOUT)
+        return ids
+
+    def query(self, kind):
+        model, field = SOURCES[kind]
+        return frozenset(model.objects.filter(
+            user_id=self.user_id).values_list(field, flat=True))
+
+    def is_subscribed(self, author_id):
+        return author_id in self.get(FOLLOWING)
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.get(FAVORITES)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.get(CART)
+
+    def invalidate(self, kind):
+        """Связи вида kind изменились: перечитать их здесь и в кэше."""
+        self.ids.pop(kind, None)
+        self.version = None
+        if self.user_id is not None:
+            bump_relations_version(self.user_id)
+
+
+def get_relations(request):
+    """UserRelations запроса, создается при первом обращении."""
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        relations = request._user_relations = UserRelations(request.user)
+    return relations
@@ -0,0 +1,94 @@
+import csv
+
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from foodgram.utils import download
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+
+    Строки списка - словари с ключами ingredient__name,
+    ingredient__measurement_unit и total_amount. Рендерер только выбирается
+    согласованием контента DRF (?format= или заголовок Accept), сам ответ
+    отдается потоком через stream_response.
+    """
+    filename = 'shopping_cart'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Через render проходят только ответы с ошибками.
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'text/plain; charset=utf-8'
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode('utf-8')
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def attach(self, response):
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.filename}.{self.format}"')
+        return response
+
+    def stream(self, ingredients):
+        raise NotImplementedError
+
+    def stream_response(self, ingredients):
+        return self.attach(StreamingHttpResponse(
+            self.stream(ingredients), content_type=self.content_type))
+
+    def document(self, ingredients):
+        """Документ целиком, в байтах, - для кэша и фоновой выгрузки."""
+        return b''.join(self.stream_response(ingredients).streaming_content)
+
+    def cached_response(self, content):
+        return self.attach(
+            HttpResponse(content, content_type=self.content_type))
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream_response(self, ingredients):
+        return download(ingredients)
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for ingredient in ingredients:
+            yield writer.writerow((ingredient['ingredient__name'],
+                                   ingredient['total_amount'],
+                                   ingredient['ingredient__measurement_unit']))
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield 'Список покупок.\n\n'
+        for ingredient in ingredients:
+            yield (f"{ingredient['ingredient__name']}: "
+                   f"{ingredient['total_amount']} - "
+                   f"{ingredient['ingredient__measurement_unit']}\n")
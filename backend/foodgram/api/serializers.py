@@ -5,11 +5,21 @@ import webcolors
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from djoser.serializers import UserCreateSerializer
+from django.conf import settings
 from django.db import models, transaction
-from recipe.models import (Recipe, Tag, Ingredient,
-                           FavoritesRecipe,
-                           Follow, ShoppingList, IngredientsRecipe)
+from django.urls import reverse
+from recipe.models import (Recipe, Tag, Ingredient, ExportJob,
+                           Follow, IngredientsRecipe)
 from django.contrib.auth.models import User
+from recipe.cook_index import record_recipe_ingredients
+from recipe.images import cap_image, replace_image, schedule_variants
+from recipe.reference import get_reference_data
+from recipe.search import update_search_documents
+
+from .cache import bump_cart_version
+from .loaders import (BatchedRelationsMixin, BatchListSerializer,
+                      RecipeIngredientsLoader, RecipeTagsLoader, UserLoader)
+from .relations import get_relations
 
 
 class AuthorSerializers(serializers.ModelSerializer):
@@ -30,6 +40,40 @@ class Hex2NameColor(serializers.Field):
         return data
 
 
+class RecipeImageField(Base64ImageField):
+    """Base64ImageField, уменьшающий слишком большие картинки."""
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        if file is None:
+            return file
+        try:
+            return cap_image(file)
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
+
+
+class ImageVariantsField(serializers.Field):
+    """URL миниатюр картинки {вариант: {формат: url}}."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        storage = Recipe._meta.get_field('image').storage
+        request = self.context.get('request')
+        result = {}
+        for variant, formats in value.items():
+            result[variant] = {}
+            for format, name in formats.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[variant][format] = url
+        return result
+
+
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     id = serializers.ModelField(
         model_field=IngredientsRecipe()._meta.get_field('id'))
@@ -53,17 +97,42 @@ class TagtSerializer(serializers.ModelSerializer):
         model = Tag
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class TagPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """Тег по id из справочника в памяти, без запроса на каждый тег."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = get_reference_data().tags.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            # Справочник мог устареть: проверяем по базе.
+            return super().to_internal_value(data)
+        return tag
+
+
+class RecipeSerializer(BatchedRelationsMixin, serializers.ModelSerializer):
     author = AuthorSerializers(required=False)
     ingredients = IngredientInRecipeSerializer(
         many=True, required=True, source='ingredients_in_recipe')
-    image = Base64ImageField(required=False, allow_null=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    image = RecipeImageField(required=False, allow_null=True)
+    image_variants = ImageVariantsField()
+    tags = TagPrimaryKeyField(
         many=True, queryset=Tag.objects.all(), required=True)
 
+    batched_relations = {
+        'author': (UserLoader, 'author_id'),
+        'tags': (RecipeTagsLoader, 'id'),
+        'ingredients_in_recipe': (RecipeIngredientsLoader, 'id'),
+    }
+
     class Meta:
-        fields = ('__all__')
+        exclude = ('search_document', )
+        read_only_fields = ('favorites_count', 'shopping_cart_count')
         model = Recipe
+        list_serializer_class = BatchListSerializer
 
     def validate(self, data):
         result = super().validate(data)
@@ -84,6 +153,14 @@ class RecipeSerializer(serializers.ModelSerializer):
         if data['cooking_time'] < 1:
             raise serializers.ValidationError(
                 'время приготовления должно состовлять минимум минуту')
+        missing = set(list_ingr) - get_reference_data().ingredients.keys()
+        if missing:
+            # Справочник мог устареть: недостающие проверяем по базе.
+            missing -= set(Ingredient.objects.filter(
+                id__in=missing).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}')
 
         return result
 
@@ -94,40 +171,83 @@ class RecipeSerializer(serializers.ModelSerializer):
         validated_data['author'] = self.context['request'].user
         recipe = Recipe.objects.create(
             **validated_data)
-        for ingredient in ingredients:
-            IngredientsRecipe.objects.create(
-                ingredient_id=ingredient['id'],
-                recipe_id=recipe.id,
-                amount=ingredient['amount']).save()
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(ingredient_id=ingredient['id'],
+                              recipe=recipe,
+                              amount=ingredient['amount'])
+            for ingredient in ingredients
+        )
         recipe.tags.set(tags)
+        update_search_documents([recipe.id])
+        record_recipe_ingredients(
+            recipe.id, [ingredient['id'] for ingredient in ingredients])
+        if recipe.image:
+            schedule_variants(recipe.id)
         return recipe
 
+    def update_ingredients(self, instance, ingredients):
+        """
+        Приводит ингредиенты рецепта к присланным: добавляет новые,
+        меняет изменившиеся количества и удаляет лишние.
+        """
+        submitted = {ingredient['id']: ingredient['amount']
+                     for ingredient in ingredients}
+        existing = {item.ingredient_id: item
+                    for item in instance.ingredients_in_recipe.all()}
+        removed = [item.id for ingredient_id, item in existing.items()
+                   if ingredient_id not in submitted]
+        changed = []
+        for ingredient_id, item in existing.items():
+            amount = submitted.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        if removed:
+            IngredientsRecipe.objects.filter(id__in=removed).delete()
+        if changed:
+            IngredientsRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(ingredient_id=ingredient_id,
+                              recipe=instance,
+                              amount=amount)
+            for ingredient_id, amount in submitted.items()
+            if ingredient_id not in existing
+        )
+
     @transaction.atomic
     def update(self, instance, validated_data):
 
         ingredients = validated_data.pop('ingredients_in_recipe')
         tags = validated_data.pop('tags')
-        instance.ingredients_in_recipe.all().delete()
-        for ingredient in ingredients:
-            IngredientsRecipe.objects.create(
-                ingredient_id=ingredient['id'],
-                recipe_id=instance.id,
-                amount=ingredient['amount']).save()
+        old_variants = None
+        if 'image' in validated_data:
+            old_variants = instance.image_variants
+            validated_data['image_variants'] = {}
+        self.update_ingredients(instance, ingredients)
         instance.tags.set(tags)
         instance = super().update(instance, validated_data)
+        if old_variants is not None:
+            replace_image(instance, old_variants)
+        update_search_documents([instance.id])
+        record_recipe_ingredients(
+            instance.id, [ingredient['id'] for ingredient in ingredients])
+        bump_cart_version(*instance.is_in_shopping_cart.values_list(
+            'user_id', flat=True))
         return instance
 
     def to_representation(self, instance):
         result = []
         data = super().to_representation(instance)
-        ingredients = IngredientsRecipe.objects.filter(recipe=instance)
-        for ingredient_in_recipe in ingredients:
+        reference = get_reference_data().ingredients
+        for ingredient_in_recipe in instance.ingredients_in_recipe.all():
+            # Названия и единицы - из справочника в памяти, а не JOIN.
+            ingredient = (reference.get(ingredient_in_recipe.ingredient_id)
+                          or ingredient_in_recipe.ingredient)
             entry = {
-                'id': ingredient_in_recipe.ingredient.id,
+                'id': ingredient.id,
                 'amount': ingredient_in_recipe.amount,
-                'measurement_unit':
-                ingredient_in_recipe.ingredient.measurement_unit,
-                'name': ingredient_in_recipe.ingredient.name
+                'measurement_unit': ingredient.measurement_unit,
+                'name': ingredient.name
             }
             result.append(entry)
 
@@ -184,18 +304,23 @@ class ListUserSerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(required=True)
     last_name = serializers.CharField(required=True)
     is_subscribed = serializers.BooleanField(write_only=True)
+    recipes_count = serializers.IntegerField(
+        source='profile.recipes_count', read_only=True, default=0)
+    followers_count = serializers.IntegerField(
+        source='profile.followers_count', read_only=True, default=0)
 
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name',
-                  'last_name', 'is_subscribed')
+                  'last_name', 'is_subscribed', 'recipes_count',
+                  'followers_count')
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        user = self.context['request'].user
-        if user.is_authenticated:
-            follow = Follow.objects.filter(author=instance, user=user).exists()
-            data['is_subscribed'] = follow
+        request = self.context['request']
+        if request.user.is_authenticated:
+            data['is_subscribed'] = get_relations(request).is_subscribed(
+                instance.id)
         return data
 
 
@@ -228,31 +353,52 @@ class RecipeListSerializers(RecipeSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        user = self.context['request'].user
-        recipe_id = Recipe.objects.get(id=data['id'])
-        is_favorited = FavoritesRecipe.objects.filter(
-            recipe=recipe_id, user=user).exists()
-        is_in_shopping_cart = ShoppingList.objects.filter(
-            recipe=recipe_id, user=user).exists()
-        data['is_favorited'] = is_favorited
-        data['is_in_shopping_cart'] = is_in_shopping_cart
+        relations = get_relations(self.context['request'])
+        data['is_favorited'] = relations.is_favorited(instance.id)
+        data['is_in_shopping_cart'] = relations.is_in_shopping_cart(
+            instance.id)
 
         return data
 
 
-class UserWithRecipes(serializers.ModelSerializer):
+class UserWithRecipes(BatchedRelationsMixin, serializers.ModelSerializer):
+    """
+    Автор с последними рецептами. Рецепты (prefetched_recipes),
+    recipes_count и is_subscribed берутся из аннотаций запроса, а без
+    них - из профиля, связей пользователя и отдельным запросом.
+    """
+
     class Meta:
         model = User
-        fields = ('first_name', 'last_name', 'email', 'username')
+        fields = ('id', 'first_name', 'last_name', 'email', 'username')
+        list_serializer_class = BatchListSerializer
+
+    def load_relations(self, instances):
+        # Теги рецептов всех авторов страницы - одним запросом.
+        super().load_relations(instances)
+        RecipeMinified(context=self.context).load_relations([
+            recipe for instance in instances
+            for recipe in getattr(instance, 'prefetched_recipes', ())])
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        queryset = Recipe.objects.filter(author=instance)
-        serializers = RecipeSerializer(queryset, many=True)
-        recipes_count = Recipe.objects.filter(author=instance).count()
-        is_subscribed = Follow.objects.filter(
-            user=self.context['request'].user, author=instance).exists()
-        data['recipes'] = serializers.data
+        recipes = getattr(instance, 'prefetched_recipes', None)
+        if recipes is None:
+            recipes = instance.author.all()
+            recipes_limit = self.context.get('recipes_limit')
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
+        recipes_count = getattr(instance, 'recipes_count', None)
+        if recipes_count is None:
+            profile = getattr(instance, 'profile', None)
+            recipes_count = (profile.recipes_count if profile is not None
+                             else instance.author.count())
+        is_subscribed = getattr(instance, 'is_subscribed', None)
+        if is_subscribed is None:
+            is_subscribed = get_relations(
+                self.context['request']).is_subscribed(instance.id)
+        data['recipes'] = RecipeMinified(
+            recipes, many=True, context=self.context).data
         data['recipes_count'] = recipes_count
         data['is_subscribed'] = is_subscribed
         return data
@@ -268,9 +414,8 @@ class UserSubscriptions(serializers.ModelSerializer):
         recipes = Recipe.objects.filter(author=instance)
         serializer = RecipeSerializer(recipes, many=True)
         recipes_count = Recipe.objects.filter(author=instance).count()
-        is_subscribed = Follow.objects.filter(
-            user=self.context['request'].user,
-            author__username=instance).exists()
+        is_subscribed = get_relations(
+            self.context['request']).is_subscribed(instance.id)
 
         data['recipes'] = serializer.data
         data['recipes_count'] = recipes_count
@@ -278,63 +423,89 @@ class UserSubscriptions(serializers.ModelSerializer):
         return data
 
 
-class RecipeMinified(serializers.ModelSerializer):
+class RecipeMinified(BatchedRelationsMixin, serializers.ModelSerializer):
     image = Base64ImageField(required=True, allow_null=True)
+    image_variants = ImageVariantsField()
     tags = TagtSerializer(many=True, read_only=True)
+    batched_relations = {'tags': (RecipeTagsLoader, 'id')}
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image', 'name', 'cooking_time', 'tags')
+        fields = ('id', 'image', 'image_variants', 'name', 'cooking_time',
+                  'tags')
+        list_serializer_class = BatchListSerializer
 
 
-class FavoriteRecipeSerializers(serializers.ModelSerializer):
+class RecipeShortSerializer(serializers.ModelSerializer):
+    """Рецепт в ответах на изменение избранного и корзины."""
+    image = serializers.ImageField(read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
-        model = FavoritesRecipe
-        fields = ()
+        model = Recipe
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
-    def validate(self, data):
-        if FavoritesRecipe.objects.filter(
-                recipe=self.context['user'].username).exists():
-            raise serializers.ValidationError('У вас уже есть этот рецепт')
-        if FavoritesRecipe.objects.filter(user=self.context['user']):
-            raise serializers.ValidationError(
-                'Нельзя добавлять свой рецепт :)')
-        return data
 
-    def to_representation(self, instance):
-        print(instance)
-        data = super().to_representation(instance)
-        recipes = Recipe.objects.filter(is_favorited__in=instance)
-        print(recipes)
-        serializers = RecipeMinified(recipes, context=self.context, many=True)
+class AuthorShortSerializer(serializers.ModelSerializer):
+    """
+    Автор в ответе на подписку, без рецептов. is_subscribed
+    проставляет представление.
+    """
+    is_subscribed = serializers.BooleanField(read_only=True)
+    recipes_count = serializers.IntegerField(
+        source='profile.recipes_count', read_only=True, default=0)
 
-        data['recipes'] = serializers.data
-        return data
+    class Meta:
+        model = User
+        fields = ('id', 'email', 'username', 'first_name', 'last_name',
+                  'is_subscribed', 'recipes_count')
 
 
-class ShoppingListSerializer(serializers.ModelSerializer):
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.BATCH_MAX_RECIPES,
+    )
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """Задание на выгрузку списка покупок; file - ссылка на готовый файл."""
+    url = serializers.SerializerMethodField()
+    file = serializers.SerializerMethodField()
 
     class Meta:
-        model = ShoppingList
-        fields = ()
+        model = ExportJob
+        fields = ('id', 'url', 'status', 'format', 'file', 'error',
+                  'created', 'finished', 'expires')
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        recipes = Recipe.objects.filter(is_in_shopping_cart__in=instance)
-        serializers = RecipeMinified(recipes, context=self.context)
+    def build_url(self, view_name, obj):
+        # django.urls.reverse, а не DRF: ссылки не должны унаследовать
+        # ?format= запроса на выгрузку, у заданий свой формат ответа.
+        return self.context['request'].build_absolute_uri(
+            reverse(view_name, kwargs={'pk': obj.pk}))
 
-        data['recipes'] = serializers.data
-        return data
+    def get_url(self, obj):
+        return self.build_url('api:api:export-detail', obj)
 
+    def get_file(self, obj):
+        if obj.status != ExportJob.DONE:
+            return None
+        return self.build_url('api:api:export-file', obj)
 
-class RecipeNotAuthenticated(serializers.ModelSerializer):
+
+class RecipeNotAuthenticated(BatchedRelationsMixin,
+                             serializers.ModelSerializer):
     author = AuthorSerializers(required=False)
     ingredients = IngredientInRecipeSerializer(
         many=True, required=True, source='ingredients_in_recipe')
     image = Base64ImageField(required=False, allow_null=True)
+    image_variants = ImageVariantsField()
     tags = TagtSerializer(many=True, read_only=True)
+    batched_relations = RecipeSerializer.batched_relations
 
     class Meta:
-        fields = ('__all__')
+        exclude = ('search_document', )
+        read_only_fields = ('favorites_count', 'shopping_cart_count')
         model = Recipe
+        list_serializer_class = BatchListSerializer
@@ -0,0 +1,9 @@
+"""Адреса API с асинхронным чтением, как при ASYNC_READ_API = True."""
+from django.urls import include, path
+
+from api import urls
+
+urlpatterns = [
+    path('api/', include(
+        (urls.async_urlpatterns + urls.urlpatterns, 'api'))),
+]
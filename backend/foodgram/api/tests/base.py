@@ -0,0 +1,71 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipe.models import Ingredient, IngredientsRecipe, Recipe, Tag
+from recipe.reference import get_reference_data
+
+
+@override_settings(
+    RECIPE_RESPONSE_CACHE=False, IMAGE_WORKERS=0,
+    PASSWORD_HASHERS=('django.contrib.auth.hashers.MD5PasswordHasher', ))
+class APITestCase(TestCase):
+    """Теги, ингредиенты и пользователь user; клиенты с токеном."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user('cook')
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3))
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(10))
+
+    def setUp(self):
+        # Справочники и версии живут в кэше и памяти процесса, а база
+        # после каждого теста откатывается.
+        cache.clear()
+        get_reference_data()
+
+    @staticmethod
+    def create_user(username):
+        return User.objects.create_user(
+            username, f'{username}@example.com', 'password',
+            first_name=username, last_name=username)
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    @classmethod
+    def create_recipes(cls, author, count, ingredients=3, tags=2):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'{author.username} {number}',
+                   text='Рецепт', cooking_time=10, image='recipes/test.png')
+            for number in range(count))
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(recipe=recipe, ingredient=ingredient,
+                              amount=number + 1)
+            for recipe in recipes
+            for number, ingredient in enumerate(
+                cls.ingredients[:ingredients]))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in cls.tags[:tags])
+        return recipes
+
+    def count_queries(self, client, method, url, **kwargs):
+        """Число SQL-запросов ответа; статус ответа - 2xx."""
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(context)
@@ -0,0 +1,107 @@
+from django.test import override_settings
+
+from recipe.models import FavoritesRecipe, Follow, ShoppingList
+
+from .base import APITestCase
+
+ASYNC_URLCONF = 'api.tests.async_urls'
+
+
+class AsyncViewsParityTests(APITestCase):
+    """
+    Асинхронные представления (api.async_views) отвечают так же, как
+    синхронные RecipeViewset, CustomUserViewSet и справочники.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = [cls.create_user(f'author{number}')
+                       for number in range(3)]
+        cls.recipes = []
+        for number, author in enumerate(cls.authors):
+            cls.recipes += cls.create_recipes(
+                author, 4, tags=number + 1)
+        FavoritesRecipe.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingList.objects.create(user=cls.user, recipe=cls.recipes[5])
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def responses(self, url, user=None):
+        """Ответы синхронного и асинхронного представлений на url."""
+        client = self.client_for(user)
+        sync = client.get(url)
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            response = client.get(url)
+            # resolver_match вычисляется лениво, по текущим адресам.
+            self.assertEqual(response.resolver_match.func.__module__,
+                             'api.async_views', url)
+        return sync, response
+
+    def assertSame(self, url, user=None, status=200):
+        sync, response = self.responses(url, user)
+        self.assertEqual(sync.status_code, status, url)
+        self.assertEqual(response.status_code, status, url)
+        self.assertEqual(response.json(), sync.json(), url)
+        return sync.json()
+
+    def test_recipe_list(self):
+        for url in ('/api/recipes/', '/api/recipes/?limit=5&offset=5',
+                    '/api/recipes/?page=2&limit=4',
+                    f'/api/recipes/?author={self.authors[1].id}'):
+            for user in (None, self.user):
+                with self.subTest(url=url, user=user):
+                    self.assertSame(url, user)
+        for url in ('/api/recipes/?is_favorited=1',
+                    '/api/recipes/?is_in_shopping_cart=1'):
+            with self.subTest(url=url):
+                self.assertEqual(len(self.assertSame(url, self.user)[
+                    'results']), 1)
+
+    def test_tags_filter(self):
+        for tags in ('tag0', 'tag1', 'tag2', 'tag1&tags=tag2'):
+            with self.subTest(tags=tags):
+                self.assertSame(f'/api/recipes/?tags={tags}')
+        self.assertSame('/api/recipes/?tags=missing', status=400)
+
+    def test_cursor(self):
+        url = '/api/recipes/?cursor=&limit=5'
+        pages = 0
+        while url:
+            with self.subTest(url=url):
+                data = self.assertSame(url, self.user)
+            url = data['next']
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertSame('/api/recipes/?cursor=broken', status=404)
+
+    def test_detail(self):
+        for recipe in (self.recipes[0], self.recipes[5]):
+            for user in (None, self.user):
+                with self.subTest(recipe=recipe.id, user=user):
+                    self.assertSame(f'/api/recipes/{recipe.id}/', user)
+
+    def test_not_found(self):
+        for user in (None, self.user):
+            with self.subTest(user=user):
+                self.assertSame('/api/recipes/999999/', user, status=404)
+
+    def test_reference_data(self):
+        for url in ('/api/tags/', '/api/ingredients/',
+                    '/api/ingredients/?name=Ингр&limit=3'):
+            with self.subTest(url=url):
+                sync, response = self.responses(url)
+                self.assertEqual(response.json(), sync.json())
+                self.assertEqual(response['ETag'], sync['ETag'])
+
+    def test_subscriptions(self):
+        for query in ('', '?recipes_limit=1', '?page=1',
+                      '?cursor=&limit=1', '?recipes_limit=0'):
+            url = f'/api/users/subscriptions/{query}'
+            with self.subTest(url=url):
+                self.assertSame(url, self.user)
+        self.assertSame('/api/users/subscriptions/?page=2', self.user,
+                        status=404)
+        self.assertSame('/api/users/subscriptions/?recipes_limit=-1',
+                        self.user, status=400)
+        self.assertSame('/api/users/subscriptions/', status=401)
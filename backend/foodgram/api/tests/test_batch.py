@@ -0,0 +1,115 @@
+from django.conf import settings
+
+from api.cache import get_cart_version
+from recipe.models import FavoritesRecipe, Recipe, ShoppingList
+
+from .base import APITestCase
+
+MISSING_ID = 10 ** 9
+
+
+class BatchEndpointTests(APITestCase):
+    """POST и DELETE /recipes/favorite/ и /recipes/shopping_cart/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = cls.create_recipes(cls.create_user('author'), 60)
+        cls.ids = [recipe.id for recipe in cls.recipes]
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.user)
+
+    def batch(self, method, url, recipe_ids, status=200):
+        response = getattr(self.client, method)(
+            url, {'recipes': recipe_ids}, format='json')
+        self.assertEqual(response.status_code, status, response.data)
+        if status != 200:
+            return response.data
+        return [(item['id'], item['status'])
+                for item in response.data['results']]
+
+    def test_statuses(self):
+        first, second, third, fourth = self.ids[:4]
+        for url, model in (('/api/recipes/favorite/', FavoritesRecipe),
+                           ('/api/recipes/shopping_cart/', ShoppingList)):
+            with self.subTest(url=url):
+                # Повторы схлопываются, порядок - как в запросе.
+                self.assertEqual(
+                    self.batch('post', url,
+                               [second, first, second, MISSING_ID]),
+                    [(second, 'added'), (first, 'added'),
+                     (MISSING_ID, 'not_found')])
+                self.assertEqual(
+                    self.batch('post', url, [first, third]),
+                    [(first, 'exists'), (third, 'added')])
+                self.assertEqual(
+                    set(model.objects.filter(user=self.user).values_list(
+                        'recipe_id', flat=True)),
+                    {first, second, third})
+                self.assertEqual(
+                    self.batch('delete', url,
+                               [third, fourth, MISSING_ID, first, third]),
+                    [(third, 'removed'), (fourth, 'absent'),
+                     (MISSING_ID, 'not_found'), (first, 'removed')])
+                self.assertEqual(
+                    list(model.objects.filter(user=self.user).values_list(
+                        'recipe_id', flat=True)),
+                    [second])
+
+    def test_counters(self):
+        url = '/api/recipes/favorite/'
+        self.batch('post', url, self.ids[:3])
+        self.batch('delete', url, self.ids[1:2])
+        self.assertEqual(
+            list(Recipe.objects.filter(id__in=self.ids[:3]).order_by(
+                'id').values_list('favorites_count', flat=True)),
+            [1, 0, 1])
+
+    def test_cart_version(self):
+        url = '/api/recipes/shopping_cart/'
+        version = get_cart_version(self.user.id)
+        for method, recipe_ids, changed in (
+                ('post', self.ids[:2], True),
+                ('post', self.ids[:2], False),
+                ('delete', self.ids[2:3], False),
+                ('delete', self.ids[:1], True)):
+            with self.subTest(method=method, recipe_ids=recipe_ids):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.batch(method, url, recipe_ids)
+                new_version = get_cart_version(self.user.id)
+                self.assertEqual(new_version != version, changed)
+                version = new_version
+
+    def test_favorites_do_not_touch_cart_version(self):
+        version = get_cart_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch('post', '/api/recipes/favorite/', self.ids[:2])
+        self.assertEqual(get_cart_version(self.user.id), version)
+
+    def test_constant_queries(self):
+        url = '/api/recipes/favorite/'
+        for method in ('post', 'delete'):
+            with self.subTest(method=method):
+                small = self.count_queries(
+                    self.client, method, url, data={'recipes': self.ids[:1]},
+                    format='json')
+                large = self.count_queries(
+                    self.client, method, url,
+                    data={'recipes': self.ids[1:] + [MISSING_ID]},
+                    format='json')
+                self.assertEqual(small, large)
+
+    def test_invalid_body(self):
+        url = '/api/recipes/favorite/'
+        too_many = list(range(1, settings.BATCH_MAX_RECIPES + 2))
+        for recipe_ids in ([], too_many, ['id'], [0]):
+            with self.subTest(recipe_ids=recipe_ids[:3]):
+                self.assertIn(
+                    'recipes',
+                    self.batch('post', url, recipe_ids, status=400))
+        response = self.client_for().post(
+            url, {'recipes': self.ids[:1]}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(FavoritesRecipe.objects.exists())
@@ -0,0 +1,113 @@
+import random
+
+from django.core.cache import cache
+
+from recipe.cook_index import CHANGE_KEY, SEQUENCE_KEY, get_generation
+from recipe.models import IngredientsRecipe, Recipe
+
+from .base import APITestCase
+
+
+class CookableTests(APITestCase):
+    """
+    /recipes/cookable/ по обратному индексу (recipe.cook_index) совпадает
+    с подсчетом по базе, в том числе после правок и потери журнала.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = cls.create_user('author')
+        rng = random.Random(0)
+        cls.recipes = cls.create_recipes(cls.author, 20, ingredients=0)
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in cls.recipes
+            for ingredient in rng.sample(cls.ingredients, rng.randint(1, 6)))
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.author)
+
+    def cookable(self, ingredient_ids, max_missing=None):
+        params = {'ingredients': ','.join(map(str, ingredient_ids)),
+                  'limit': 100}
+        if max_missing is not None:
+            params['max_missing'] = max_missing
+        response = self.client.get('/api/recipes/cookable/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(recipe['id'], recipe['coverage'],
+                 recipe['missing_ingredients'])
+                for recipe in response.data['results']]
+
+    def brute_force(self, ingredient_ids, max_missing=None):
+        ingredient_ids = set(ingredient_ids)
+        matches = []
+        for recipe in Recipe.objects.prefetch_related('ingredients_in_recipe'):
+            ingredients = {item.ingredient_id
+                           for item in recipe.ingredients_in_recipe.all()}
+            matched = len(ingredients & ingredient_ids)
+            missing = len(ingredients) - matched
+            if not matched or (max_missing is not None
+                               and missing > max_missing):
+                continue
+            matches.append((matched / len(ingredients), matched, recipe.id,
+                            missing))
+        matches.sort(reverse=True)
+        return [(recipe_id, round(coverage, 3), missing)
+                for coverage, _, recipe_id, missing in matches]
+
+    def assertMatchesBruteForce(self):
+        ids = [ingredient.id for ingredient in self.ingredients]
+        for ingredient_ids, max_missing in (
+                (ids[:1], None), (ids[:3], None), (ids[2:7], 2),
+                (ids, 0), (ids[::2], 1)):
+            with self.subTest(ingredients=ingredient_ids,
+                              max_missing=max_missing):
+                self.assertEqual(
+                    self.cookable(ingredient_ids, max_missing),
+                    self.brute_force(ingredient_ids, max_missing))
+
+    def edit(self, recipe, ingredients):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {'ingredients': [{'id': ingredient.id, 'amount': 2}
+                                 for ingredient in ingredients],
+                 'tags': [self.tags[0].id], 'cooking_time': 10},
+                format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def delete(self, recipe):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_matches_brute_force(self):
+        self.assertMatchesBruteForce()
+
+    def test_after_edits(self):
+        self.assertMatchesBruteForce()
+        self.edit(self.recipes[0], self.ingredients[:1])
+        self.edit(self.recipes[1], self.ingredients[4:9])
+        self.delete(self.recipes[2])
+        self.assertMatchesBruteForce()
+
+    def test_after_change_log_gap(self):
+        self.assertMatchesBruteForce()
+        self.edit(self.recipes[0], self.ingredients[:1])
+        self.edit(self.recipes[1], self.ingredients[4:9])
+        # Запись журнала вытеснена из кэша до того, как процесс ее
+        # применил.
+        generation = get_generation()
+        cache.delete(CHANGE_KEY.format(generation=generation, number=1))
+        self.assertMatchesBruteForce()
+        self.edit(self.recipes[3], self.ingredients[7:])
+        self.assertMatchesBruteForce()
+
+    def test_after_sequence_eviction(self):
+        self.assertMatchesBruteForce()
+        cache.delete(SEQUENCE_KEY.format(generation=get_generation()))
+        self.edit(self.recipes[0], self.ingredients[:1])
+        self.delete(self.recipes[1])
+        self.assertMatchesBruteForce()
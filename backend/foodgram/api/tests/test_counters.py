@@ -0,0 +1,120 @@
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from recipe.counters import batched_counters
+from recipe.models import (FavoritesRecipe, Follow, Profile, Recipe,
+                           ShoppingList)
+
+from .base import APITestCase
+
+
+class CounterTests(APITestCase):
+    """Денормализованные счетчики рецептов и профилей (recipe.counters)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = cls.create_user('author')
+        cls.recipe = cls.create_recipes(cls.author, 1)[0]
+        cls.users = [cls.create_user(f'reader{number}')
+                     for number in range(3)]
+
+    def assertCounters(self, favorites=0, cart=0):
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.favorites_count,
+                          self.recipe.shopping_cart_count), (favorites, cart))
+
+    def followers(self):
+        return Profile.objects.get(user=self.author).followers_count
+
+    def test_favorite_and_cart(self):
+        client = self.client_for(self.user)
+        for action, expected in (('favorite', (1, 0)),
+                                 ('shopping_cart', (1, 1))):
+            client.post(f'/api/recipes/{self.recipe.id}/{action}/')
+            self.assertCounters(*expected)
+        client.delete(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertCounters(0, 1)
+        # Строки, созданные в обход API (админка, shell), тоже
+        # учитываются.
+        FavoritesRecipe.objects.create(user=self.users[0], recipe=self.recipe)
+        self.assertCounters(1, 1)
+        ShoppingList.objects.filter(recipe=self.recipe).delete()
+        self.assertCounters(1, 0)
+
+    def test_follow(self):
+        client = self.client_for(self.user)
+        client.post(f'/api/users/{self.author.id}/subscribe/')
+        Follow.objects.create(user=self.users[0], author=self.author)
+        self.assertEqual(self.followers(), 2)
+        client.delete(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(self.followers(), 1)
+        # Подписчик удаляется вместе с подпиской.
+        self.users[0].delete()
+        self.assertEqual(self.followers(), 0)
+
+    def recipes_counts(self):
+        return [Profile.objects.get(user=user).recipes_count
+                for user in (self.user, self.users[0])]
+
+    def test_recipes_count(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name='Новый', text='Рецепт', cooking_time=5,
+            image='recipes/test.png')
+        self.assertEqual(self.recipes_counts(), [1, 0])
+        recipe.author = self.users[0]
+        recipe.save()
+        self.assertEqual(self.recipes_counts(), [0, 1])
+        recipe.delete()
+        self.assertEqual(self.recipes_counts(), [0, 0])
+
+    def test_clamped_at_zero(self):
+        FavoritesRecipe.objects.create(user=self.user, recipe=self.recipe)
+        Follow.objects.create(user=self.user, author=self.author)
+        # Счетчики разошлись с данными, например после loaddata.
+        Recipe.objects.filter(id=self.recipe.id).update(favorites_count=0)
+        Profile.objects.filter(user=self.author).update(followers_count=0)
+        FavoritesRecipe.objects.filter(user=self.user).delete()
+        Follow.objects.filter(user=self.user).delete()
+        self.assertCounters(0, 0)
+        self.assertEqual(self.followers(), 0)
+
+    def test_deleted_user_releases_counters(self):
+        for user in self.users:
+            FavoritesRecipe.objects.create(user=user, recipe=self.recipe)
+            ShoppingList.objects.create(user=user, recipe=self.recipe)
+        self.users[0].delete()
+        self.assertCounters(2, 2)
+
+    def test_batched_counters(self):
+        other = self.create_recipes(self.create_user('other'), 1)[0]
+        for user in self.users:
+            for recipe in (self.recipe, other):
+                FavoritesRecipe.objects.create(user=user, recipe=recipe)
+        with CaptureQueriesContext(connection) as context:
+            with transaction.atomic(), batched_counters():
+                FavoritesRecipe.objects.filter(
+                    user__in=self.users[:2]).delete()
+        updates = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith('UPDATE "recipe_recipe"')]
+        # Одно изменение на оба рецепта.
+        self.assertEqual(len(updates), 1, updates)
+        self.assertCounters(1, 0)
+        other.refresh_from_db()
+        self.assertEqual(other.favorites_count, 1)
+
+    def test_recount_repairs_drift(self):
+        FavoritesRecipe.objects.create(user=self.user, recipe=self.recipe)
+        Follow.objects.create(user=self.user, author=self.author)
+        Recipe.objects.filter(id=self.recipe.id).update(
+            favorites_count=5, shopping_cart_count=3)
+        Profile.objects.filter(user=self.author).update(followers_count=7)
+        Profile.objects.filter(user=self.users[0]).delete()
+        call_command('recount', verbosity=0)
+        self.assertCounters(1, 0)
+        self.assertEqual(self.followers(), 1)
+        # Рецепты фикстуры созданы bulk_create, мимо сигналов.
+        self.assertEqual(
+            Profile.objects.get(user=self.author).recipes_count, 1)
+        self.assertTrue(Profile.objects.filter(user=self.users[0]).exists())
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import override_settings
+from django.utils import timezone
+
+from api.exports import claim_job, cleanup_expired, enqueue_export
+from recipe.models import ExportJob
+
+from .base import APITestCase
+
+
+class ExportJobTests(APITestCase):
+
+    def test_async_export_accepts_json(self):
+        client = self.client_for(self.user)
+        for query, format in (('', 'pdf'), ('&format=csv', 'csv'),
+                              ('&format=txt', 'txt')):
+            with self.subTest(query=query):
+                response = client.get(
+                    f'/api/recipes/download_shopping_cart/?async=true{query}',
+                    HTTP_ACCEPT='application/json')
+                self.assertEqual(response.status_code, 202)
+                self.assertEqual(response.json()['format'], format)
+
+    def test_sync_export_still_negotiates(self):
+        response = self.client_for(self.user).get(
+            '/api/recipes/download_shopping_cart/',
+            HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 406)
+
+    @override_settings(SHOPPING_CART_EXPORT_MAX_ATTEMPTS=1)
+    def test_abandoned_last_attempt_fails(self):
+        job, _ = enqueue_export(self.user.id, 'pdf')
+        self.assertEqual(claim_job().id, job.id)
+        # Воркер упал на последней попытке.
+        ExportJob.objects.filter(id=job.id).update(
+            started=timezone.now() - timedelta(
+                seconds=settings.SHOPPING_CART_EXPORT_TIMEOUT + 1))
+        self.assertIsNone(claim_job())
+        cleanup_expired()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+        self.assertTrue(job.error)
+        # Следующий запрос ставит выгрузку в очередь заново.
+        job, created = enqueue_export(self.user.id, 'pdf')
+        self.assertTrue(created)
+        self.assertEqual(job.status, ExportJob.PENDING)
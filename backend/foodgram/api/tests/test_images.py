@@ -0,0 +1,142 @@
+import base64
+import io
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from PIL import Image
+
+from recipe import images
+from recipe.models import Recipe
+
+from .base import APITestCase
+
+VARIANTS = {'list': (16, 16), 'card': (32, 32)}
+
+
+def image_bytes(size, format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def encode_image(size):
+    data = base64.b64encode(image_bytes(size)).decode()
+    return f'data:image/png;base64,{data}'
+
+
+@override_settings(IMAGE_MAX_DIMENSION=64, IMAGE_MAX_PIXELS=100 * 100,
+                   IMAGE_VARIANTS=VARIANTS)
+class RecipeImageTests(APITestCase):
+    """Проверка, уменьшение и миниатюры картинок рецептов (recipe.images)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media))
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.user)
+
+    def storage(self):
+        return Recipe._meta.get_field('image').storage
+
+    def payload(self, image_size, **fields):
+        return {
+            'name': 'Рецепт с картинкой', 'text': 'Текст',
+            'cooking_time': 10, 'image': encode_image(image_size),
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+            **fields,
+        }
+
+    def create(self, image_size):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/', self.payload(image_size), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Recipe.objects.get(id=response.data['id'])
+
+    def image_size(self, name):
+        with self.storage().open(name) as file:
+            return Image.open(file).size
+
+    def variant_files(self, recipe):
+        return [name for formats in recipe.image_variants.values()
+                for name in formats.values()]
+
+    def assertVariants(self, recipe):
+        self.assertEqual(set(recipe.image_variants), set(VARIANTS))
+        for variant, formats in recipe.image_variants.items():
+            self.assertEqual(set(formats), {'jpeg', 'webp'})
+            for name in formats.values():
+                width, height = self.image_size(name)
+                self.assertLessEqual(max(width, height),
+                                     max(VARIANTS[variant]))
+
+    def test_oversized_image_rejected(self):
+        response = self.client.post(
+            '/api/recipes/', self.payload((101, 100)), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_not_an_image_rejected(self):
+        with self.assertRaises(ValueError):
+            images.cap_image(ContentFile(b'not an image', name='text.png'))
+
+    def test_large_image_downscaled(self):
+        recipe = self.create((80, 40))
+        self.assertEqual(self.image_size(recipe.image.name), (64, 32))
+        self.assertVariants(recipe)
+
+    def test_small_image_kept(self):
+        recipe = self.create((20, 10))
+        self.assertEqual(self.image_size(recipe.image.name), (20, 10))
+        self.assertVariants(recipe)
+
+    def test_replaced_image_drops_old_variants(self):
+        recipe = self.create((20, 10))
+        old = self.variant_files(recipe)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/', self.payload((30, 30)),
+                format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        recipe.refresh_from_db()
+        self.assertVariants(recipe)
+        self.assertFalse(any(self.storage().exists(name) for name in old))
+
+    def test_result_dropped_when_image_replaced_mid_run(self):
+        recipe = self.create((20, 10))
+        built = self.variant_files(recipe)
+        images.delete_variants(recipe.image_variants)
+        Recipe.objects.filter(id=recipe.id).update(image_variants={})
+        render_variant = images.render_variant
+
+        def replace_during_render(*args, **kwargs):
+            # Картинку заменили, пока строились миниатюры старой.
+            Recipe.objects.filter(id=recipe.id).update(image='other.png')
+            return render_variant(*args, **kwargs)
+
+        with mock.patch('recipe.images.render_variant',
+                        replace_during_render):
+            self.assertFalse(images.generate_variants(recipe.id))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, {})
+        # Построенные миниатюры удалены, а не брошены в хранилище.
+        self.assertFalse(
+            any(self.storage().exists(name) for name in built))
+
+    def test_deleted_recipe(self):
+        recipe = self.create((20, 10))
+        recipe_id = recipe.id
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertFalse(
+            any(self.storage().exists(name)
+                for name in self.variant_files(recipe)))
+        self.assertFalse(images.generate_variants(recipe_id))
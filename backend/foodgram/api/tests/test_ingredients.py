@@ -0,0 +1,50 @@
+from recipe.models import Ingredient
+
+from .base import APITestCase
+
+
+class IngredientAutocompleteTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Salt', 'salmon', 'Sea salt', 'SALAMI', 'pepper',
+                         'Paprika', 'sweet pepper'))
+
+    def test_prefix_matches_istartswith(self):
+        client = self.client_for()
+        for query in ('sa', 'SAL', 'p', 'Pep', 'Ингр', 'x'):
+            with self.subTest(query=query):
+                response = client.get(
+                    '/api/ingredients/', {'name': query, 'limit': 100})
+                self.assertEqual(response.status_code, 200)
+                expected = set(Ingredient.objects.filter(
+                    name__istartswith=query).values_list('id', flat=True))
+                found = [item['id'] for item in response.json()]
+                # Сначала совпадения по началу названия, затем по
+                # вхождению.
+                self.assertEqual(set(found[:len(expected)]), expected)
+                self.assertFalse(Ingredient.objects.filter(
+                    id__in=found[len(expected):],
+                    name__istartswith=query).exists())
+                self.assertEqual(
+                    set(found),
+                    set(Ingredient.objects.filter(
+                        name__icontains=query).values_list('id', flat=True)))
+
+    def test_limit(self):
+        client = self.client_for()
+        response = client.get('/api/ingredients/', {'name': 's', 'limit': 2})
+        self.assertEqual([item['name'] for item in response.json()],
+                         ['SALAMI', 'salmon'])
+        for limit in ('0', 'много'):
+            with self.subTest(limit=limit):
+                response = client.get(
+                    '/api/ingredients/', {'name': 's', 'limit': limit})
+                self.assertEqual(response.status_code, 400)
+
+    def test_without_name_lists_all(self):
+        response = self.client_for().get('/api/ingredients/')
+        self.assertEqual(len(response.json()), Ingredient.objects.count())
@@ -0,0 +1,158 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from api.loaders import GroupLoader, Loader, RecipeTagsLoader, get_loader
+from api.serializers import RecipeListSerializers, UserWithRecipes
+from recipe.models import Recipe, Tag
+
+from .base import APITestCase
+
+TABLES = ('auth_user', 'recipe_recipe_tags', 'recipe_ingredientsrecipe',
+          'recipe_tag')
+
+
+class CountingLoader(Loader):
+    """Квадраты ключей; запоминает запрошенные пачки."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def batch(self, keys):
+        self.batches.append(set(keys))
+        return {key: key * key for key in keys if key > 0}
+
+
+class EvenLoader(GroupLoader):
+
+    def rows(self, keys):
+        return [(key, value) for key in sorted(keys)
+                for value in range(key) if key % 2 == 0]
+
+
+class LoaderTests(APITestCase):
+    """Загрузчики (api.loaders) сами по себе."""
+
+    def test_values_are_remembered(self):
+        loader = CountingLoader()
+        self.assertEqual(loader.load_many([2, 3, 2, -1]), [4, 9, 4, None])
+        self.assertEqual(loader.load_many([3, 4, -1]), [9, 16, None])
+        self.assertEqual(loader.load(2), 4)
+        # Повторы и уже загруженные ключи не запрашиваются снова, в том
+        # числе ключи без значения.
+        self.assertEqual(loader.batches, [{2, 3, -1}, {4}])
+
+    def test_groups(self):
+        loader = EvenLoader()
+        self.assertEqual(loader.load_many([1, 2, 4]),
+                         [[], [0, 1], [0, 1, 2, 3]])
+
+    def test_loader_per_request(self):
+        request = APIRequestFactory().get('/')
+        first = get_loader({'request': request}, CountingLoader)
+        self.assertIs(get_loader({'request': request}, CountingLoader),
+                      first)
+        self.assertIsNot(
+            get_loader({'request': APIRequestFactory().get('/')},
+                       CountingLoader), first)
+        context = {}
+        self.assertIs(get_loader(context, CountingLoader),
+                      get_loader(context, CountingLoader))
+
+    def test_stale_reference_tags(self):
+        recipe = self.create_recipes(self.user, 1, tags=1)[0]
+        # Тег создан, а справочник процесса еще не перечитан.
+        tag = Tag.objects.create(name='Новый', color='#ffffff', slug='new')
+        recipe.tags.add(tag)
+        with self.assertNumQueries(2):
+            tags = RecipeTagsLoader().load(recipe.id)
+        self.assertEqual(tags, [self.tags[0], tag])
+
+
+class BatchedSerializationTests(APITestCase):
+    """
+    Страница, сериализованная с пакетной загрузкой связей, совпадает с
+    объектами, сериализованными по одному, и читает каждую связь одним
+    запросом.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = [cls.create_user(f'author{number}')
+                       for number in range(5)]
+        for number, author in enumerate(cls.authors):
+            cls.create_recipes(author, 4, ingredients=number + 1,
+                               tags=number % 3 + 1)
+
+    def context(self):
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+        return {'request': request}
+
+    def serialize_one_by_one(self):
+        return [RecipeListSerializers(recipe, context=self.context()).data
+                for recipe in Recipe.objects.order_by('id')]
+
+    def table_queries(self, serialize):
+        with CaptureQueriesContext(connection) as context:
+            data = serialize()
+        counts = {table: 0 for table in TABLES}
+        for query in context.captured_queries:
+            for table in TABLES:
+                if f'FROM "{table}"' in query['sql']:
+                    counts[table] += 1
+        return data, counts
+
+    def test_page_matches_one_by_one(self):
+        expected = self.serialize_one_by_one()
+        data, counts = self.table_queries(lambda: RecipeListSerializers(
+            Recipe.objects.order_by('id'), many=True,
+            context=self.context()).data)
+        self.assertEqual(data, expected)
+        # Авторы, теги и ингредиенты - по запросу на страницу, теги
+        # берутся из справочника.
+        self.assertEqual(counts, {
+            'auth_user': 1, 'recipe_recipe_tags': 1,
+            'recipe_ingredientsrecipe': 1, 'recipe_tag': 0})
+
+    def test_prefetched_relations_not_reloaded(self):
+        expected = self.serialize_one_by_one()
+        recipes = Recipe.objects.order_by('id').select_related(
+            'author').prefetch_related('tags')
+        data, counts = self.table_queries(lambda: RecipeListSerializers(
+            recipes, many=True, context=self.context()).data)
+        self.assertEqual(data, expected)
+        # Запросы к авторам и тегам сделал prefetch_related, а не
+        # загрузчики.
+        self.assertEqual(counts['recipe_ingredientsrecipe'], 1)
+        self.assertEqual(counts['recipe_tag'], 1)
+
+    def test_authors_read_once_per_request(self):
+        context = self.context()
+        recipes = list(Recipe.objects.order_by('id'))
+        RecipeListSerializers(recipes[:10], many=True, context=context).data
+        _, counts = self.table_queries(lambda: RecipeListSerializers(
+            recipes[10:], many=True, context=context).data)
+        # Авторы второй половины частично уже загружены: читаются только
+        # новые, одним запросом.
+        self.assertEqual(counts['auth_user'], 1)
+        _, counts = self.table_queries(lambda: RecipeListSerializers(
+            recipes, many=True, context=context).data)
+        self.assertEqual(counts['auth_user'], 0)
+
+    def test_authors_with_recipes(self):
+        authors = list(self.authors)
+        for author in authors:
+            author.prefetched_recipes = list(
+                Recipe.objects.filter(author=author).order_by('-id')[:2])
+        expected = [UserWithRecipes(author, context=self.context()).data
+                    for author in authors]
+        for author in authors:
+            for recipe in author.prefetched_recipes:
+                recipe._prefetched_objects_cache = {}
+        data, counts = self.table_queries(lambda: UserWithRecipes(
+            authors, many=True, context=self.context()).data)
+        self.assertEqual(data, expected)
+        self.assertEqual(counts['recipe_recipe_tags'], 1)
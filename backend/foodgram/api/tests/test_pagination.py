@@ -0,0 +1,33 @@
+from recipe.search import update_search_documents
+
+from .base import APITestCase
+
+
+class RecipePaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        recipes = cls.create_recipes(cls.create_user('author'), 3)
+        update_search_documents([recipe.id for recipe in recipes])
+
+    def test_search_rejects_cursor(self):
+        client = self.client_for()
+        for query in ('', '&ordering=-favorites_count'):
+            url = f'/api/recipes/?search=Рецепт&cursor={query}'
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.json())
+
+    def test_search_pages_by_offset(self):
+        response = self.client_for().get(
+            '/api/recipes/?search=Рецепт&limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_empty_search_keeps_cursor(self):
+        response = self.client_for().get('/api/recipes/?search=&cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from recipe.models import FavoritesRecipe, RecipeScore
+from recipe.popularity import event_added, recompute_scores
+
+from .base import APITestCase
+
+
+class PopularRecipesTests(APITestCase):
+    """Рейтинг популярности (recipe.popularity) и /recipes/popular/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = cls.create_recipes(cls.create_user('author'), 3)
+        cls.readers = [cls.create_user(f'reader{number}')
+                       for number in range(3)]
+
+    def popular(self):
+        response = self.client_for().get('/api/recipes/popular/?limit=10')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()]
+
+    def favorite(self, reader, recipe, days_ago):
+        created = timezone.now() - timedelta(days=days_ago)
+        FavoritesRecipe.objects.create(
+            user=reader, recipe=recipe, created=created)
+        event_added(FavoritesRecipe, recipe.id, created)
+
+    def test_removed_events_leave_popular(self):
+        recipe = self.recipes[0]
+        client = self.client_for(self.user)
+        for action in ('favorite', 'shopping_cart'):
+            client.post(f'/api/recipes/{recipe.id}/{action}/')
+        self.assertEqual(self.popular(), [recipe.id])
+        client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(self.popular(), [recipe.id])
+        self.assertEqual(RecipeScore.objects.get().events, 1)
+        client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assertEqual(self.popular(), [])
+        self.assertFalse(RecipeScore.objects.exists())
+
+    def test_batch_removal_leaves_popular(self):
+        client = self.client_for(self.user)
+        ids = [recipe.id for recipe in self.recipes]
+        client.post('/api/recipes/favorite/', {'recipes': ids},
+                    format='json')
+        self.assertEqual(set(self.popular()), set(ids))
+        client.delete('/api/recipes/favorite/', {'recipes': ids[1:]},
+                      format='json')
+        self.assertEqual(self.popular(), ids[:1])
+        self.assertEqual(RecipeScore.objects.count(), 1)
+
+    def test_recent_events_weigh_more(self):
+        old, recent, fresh = self.recipes
+        # Два события месячной давности весят меньше одного свежего:
+        # вес события убывает вдвое за POPULARITY_HALF_LIFE_DAYS.
+        self.favorite(self.readers[0], old, 30)
+        self.favorite(self.readers[1], old, 30)
+        self.favorite(self.readers[0], recent, 1)
+        self.favorite(self.readers[0], fresh, 0)
+        expected = [fresh.id, recent.id, old.id]
+        self.assertEqual(self.popular(), expected)
+        scores = dict(RecipeScore.objects.values_list('recipe_id', 'score'))
+        recompute_scores()
+        self.assertEqual(self.popular(), expected)
+        for recipe_id, score in RecipeScore.objects.values_list(
+                'recipe_id', 'score'):
+            self.assertAlmostEqual(scores[recipe_id], score)
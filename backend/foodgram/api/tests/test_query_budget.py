@@ -0,0 +1,76 @@
+from django.test import override_settings
+
+from api.views import CustomUserViewSet, RecipeViewset
+from recipe.models import FavoritesRecipe, Follow, ShoppingList
+from recipe.popularity import recompute_scores
+
+from .base import APITestCase
+
+
+@override_settings(QUERY_METRICS=True, QUERY_BUDGET_STRICT=True)
+class WriteActionBudgetTests(APITestCase):
+    """
+    favorite, shopping_cart и subscribe укладываются в query_budget
+    представления (при превышении QueryBudgetExceeded роняет тест) и
+    стоят одинаково для нового пользователя и пользователя с историей.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.newcomer = cls.create_user('newcomer')
+        cls.author = cls.create_user('author')
+        cls.recipe = cls.create_recipes(cls.author, 1)[0]
+        # Первое событие рецепта еще и создает строку рейтинга, а
+        # удаление последнего - удаляет ее. События другого читателя
+        # держат строку на месте.
+        reader = cls.create_user('reader')
+        FavoritesRecipe.objects.create(user=reader, recipe=cls.recipe)
+        ShoppingList.objects.create(user=reader, recipe=cls.recipe)
+        recompute_scores()
+        history = cls.create_recipes(cls.create_user('history'), 50)
+        FavoritesRecipe.objects.bulk_create(
+            FavoritesRecipe(user=cls.user, recipe=recipe)
+            for recipe in history)
+        ShoppingList.objects.bulk_create(
+            ShoppingList(user=cls.user, recipe=recipe)
+            for recipe in history)
+        authors = [cls.create_user(f'followed{number}')
+                   for number in range(50)]
+        for author in authors:
+            cls.create_recipes(author, 3)
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, author=author) for author in authors)
+
+    def assertWithinBudget(self, viewset, action, url):
+        """POST и DELETE по url с ?full=true и без него."""
+        budget = viewset.query_budget[action]
+        for suffix in ('', '?full=true'):
+            counts = set()
+            for user in (self.newcomer, self.user):
+                client = self.client_for(user)
+                for method in ('post', 'delete'):
+                    with self.subTest(url=url + suffix, user=user.username,
+                                      method=method):
+                        queries = self.count_queries(
+                            client, method, url + suffix)
+                        self.assertLessEqual(queries, budget)
+                        counts.add((method, queries))
+            with self.subTest(url=url + suffix):
+                # Ответ не растет с историей пользователя.
+                self.assertEqual(len(counts), 2, counts)
+
+    def test_favorite(self):
+        self.assertWithinBudget(
+            RecipeViewset, 'favorite',
+            f'/api/recipes/{self.recipe.id}/favorite/')
+
+    def test_shopping_cart(self):
+        self.assertWithinBudget(
+            RecipeViewset, 'shopping_cart',
+            f'/api/recipes/{self.recipe.id}/shopping_cart/')
+
+    def test_subscribe(self):
+        self.assertWithinBudget(
+            CustomUserViewSet, 'subscribe',
+            f'/api/users/{self.author.id}/subscribe/')
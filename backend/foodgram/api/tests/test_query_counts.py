@@ -0,0 +1,128 @@
+from django.core.management import call_command
+
+from recipe.models import FavoritesRecipe, Follow, Recipe, ShoppingList
+
+from .base import APITestCase
+
+
+class QueryCountTests(APITestCase):
+    """
+    Число SQL-запросов ответа не зависит от размера страницы и связей
+    пользователя с рецептами и авторами.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = cls.create_user('author')
+        cls.recipes = cls.create_recipes(cls.author, 100)
+        cls.small = cls.create_recipes(
+            cls.create_user('small'), 1, ingredients=1, tags=1)[0]
+        cls.large = cls.create_recipes(
+            cls.create_user('large'), 1, ingredients=10, tags=3)[0]
+        FavoritesRecipe.objects.bulk_create(
+            FavoritesRecipe(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::2])
+        ShoppingList.objects.bulk_create(
+            ShoppingList(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::3])
+        authors = [cls.create_user(f'followed{number}')
+                   for number in range(100)]
+        for author in authors:
+            cls.create_recipes(author, 3)
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, author=author) for author in authors)
+
+    def assertSameQueries(self, client, small_url, large_url):
+        # Первый запрос прогревает кэши версий и связей пользователя.
+        client.get(small_url)
+        queries = self.count_queries(client, 'get', small_url)
+        with self.assertNumQueries(queries):
+            response = client.get(large_url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_recipe_list(self):
+        for user in (None, self.user):
+            with self.subTest(user=user):
+                response = self.assertSameQueries(
+                    self.client_for(user),
+                    '/api/recipes/?limit=6', '/api/recipes/?limit=100')
+                self.assertEqual(len(response.data['results']), 100)
+
+    def test_recipe_list_cursor(self):
+        response = self.assertSameQueries(
+            self.client_for(self.user),
+            '/api/recipes/?cursor=&limit=6',
+            '/api/recipes/?cursor=&limit=100')
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_recipe_retrieve(self):
+        for user in (None, self.user):
+            with self.subTest(user=user):
+                response = self.assertSameQueries(
+                    self.client_for(user),
+                    f'/api/recipes/{self.small.id}/',
+                    f'/api/recipes/{self.large.id}/')
+                self.assertEqual(len(response.data['ingredients']), 10)
+                self.assertEqual(len(response.data['tags']), 3)
+
+    def test_subscriptions(self):
+        response = self.assertSameQueries(
+            self.client_for(self.user),
+            '/api/users/subscriptions/?cursor=&limit=6&recipes_limit=1',
+            '/api/users/subscriptions/?cursor=&limit=100&recipes_limit=3')
+        self.assertEqual(len(response.data['results']), 100)
+        self.assertEqual(
+            {len(author['recipes']) for author in response.data['results']},
+            {3})
+
+    def test_subscriptions_page(self):
+        self.assertSameQueries(
+            self.client_for(self.user),
+            '/api/users/subscriptions/?recipes_limit=1',
+            '/api/users/subscriptions/')
+
+    def test_recipe_retrieve_relations(self):
+        # Автор берется загрузчиком, флаги избранного и корзины - из
+        # кэша связей пользователя, без отдельных запросов.
+        followed = Recipe.objects.filter(
+            author__username='followed0').first()
+        client = self.client_for(self.user)
+        client.get(f'/api/recipes/{self.small.id}/')
+        queries = self.count_queries(
+            client, 'get', f'/api/recipes/{self.small.id}/')
+        for recipe, flags in (
+                (self.small, (False, False)),
+                (self.recipes[0], (True, True)),
+                (self.recipes[2], (True, False)),
+                (self.recipes[3], (False, True)),
+                (followed, (False, False))):
+            with self.subTest(recipe=recipe.name):
+                with self.assertNumQueries(queries):
+                    data = client.get(f'/api/recipes/{recipe.id}/').data
+                self.assertEqual(
+                    (data['is_favorited'], data['is_in_shopping_cart']),
+                    flags)
+                self.assertEqual(data['author']['id'], recipe.author_id)
+                self.assertEqual(data['author']['username'],
+                                 recipe.author.username)
+
+    def test_subscriptions_flags(self):
+        # Рецепты фикстуры созданы bulk_create, мимо счетчиков.
+        call_command('recount', verbosity=0)
+        reader = self.create_user('reader')
+        Follow.objects.create(user=reader, author=self.author)
+        url = '/api/users/subscriptions/?cursor=&limit=100&recipes_limit=2'
+        client = self.client_for(reader)
+        client.get(url)
+        queries = self.count_queries(client, 'get', url)
+        client = self.client_for(self.user)
+        client.get(url)
+        with self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(len(response.data['results']), 100)
+        for author in response.data['results']:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], 3)
+            self.assertEqual(len(author['recipes']), 2)
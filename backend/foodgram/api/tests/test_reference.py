@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from recipe.models import Ingredient, Tag
+from recipe.reference import VERSION_KEY
+
+from .base import APITestCase
+
+URLS = ('/api/tags/', '/api/ingredients/', '/api/ingredients/?name=Ингр')
+
+
+class ReferenceDataTests(APITestCase):
+    """ETag и Cache-Control ответов со справочниками (recipe.reference)."""
+
+    def get(self, url, **headers):
+        return self.client_for().get(url, **headers)
+
+    def etags(self):
+        return {url: self.get(url)['ETag'] for url in URLS}
+
+    def test_etag_and_cache_control(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response['ETag'])
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn(f'max-age={settings.REFERENCE_CACHE_MAX_AGE}',
+                              response['Cache-Control'])
+                self.assertIn('Accept', response['Vary'])
+
+    def test_not_modified(self):
+        for url, etag in self.etags().items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                response = self.get(url, HTTP_IF_NONE_MATCH='"stale"')
+                self.assertEqual(response.status_code, 200)
+
+    def assertChanged(self, old):
+        for url, etag in self.etags().items():
+            with self.subTest(url=url):
+                self.assertNotEqual(etag, old[url])
+                response = self.get(url, HTTP_IF_NONE_MATCH=old[url])
+                self.assertEqual(response.status_code, 200)
+
+    def test_ingredient_change(self):
+        old = self.etags()
+        ingredient = self.ingredients[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.name = 'Ингредиент новый'
+            ingredient.save()
+        self.assertChanged(old)
+        names = [item['name'] for item in self.get(URLS[1]).json()]
+        self.assertIn('Ингредиент новый', names)
+        old = self.etags()
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Ингредиент 99',
+                                      measurement_unit='г')
+        self.assertChanged(old)
+        self.assertIn('Ингредиент 99',
+                      [item['name'] for item in self.get(URLS[2]).json()])
+
+    def test_tag_change(self):
+        old = self.etags()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tags[0].delete()
+        self.assertChanged(old)
+        self.assertEqual([tag['id'] for tag in self.get(URLS[0]).json()],
+                         [tag.id for tag in self.tags[1:]])
+        old = self.etags()
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(name='Новый', color='#ffffff',
+                                     slug='new')
+        self.assertChanged(old)
+        self.assertIn(tag.id,
+                      [item['id'] for item in self.get(URLS[0]).json()])
+
+    def test_version_changed_by_another_process(self):
+        old = self.etags()
+        # Другой воркер изменил справочник в обход этого процесса.
+        Ingredient.objects.filter(id=self.ingredients[0].id).update(
+            name='Ингредиент из другого воркера')
+        cache.set(VERSION_KEY, 'other', None)
+        self.assertChanged(old)
+        self.assertIn('Ингредиент из другого воркера',
+                      [item['name'] for item in self.get(URLS[1]).json()])
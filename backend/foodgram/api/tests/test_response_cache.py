@@ -0,0 +1,90 @@
+from django.test import override_settings
+
+from .base import APITestCase
+
+
+@override_settings(RECIPE_RESPONSE_CACHE=True)
+class ResponseCacheTests(APITestCase):
+    """Кэш ответов анонимным пользователям (api.mixins.ResponseCacheMixin)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = cls.create_user('author')
+        cls.recipes = cls.create_recipes(cls.author, 3)
+
+    def get(self, url, user=None, **headers):
+        response = self.client_for(user).get(url, **headers)
+        self.assertIn(response.status_code, (200, 304))
+        return response
+
+    def urls(self):
+        recipe = self.recipes[0]
+        return ('/api/recipes/', '/api/recipes/?tags=tag1&tags=tag0',
+                f'/api/recipes/{recipe.id}/')
+
+    def test_hit(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                miss = self.get(url)
+                self.assertEqual(miss['X-Cache'], 'MISS')
+                with self.assertNumQueries(0):
+                    hit = self.get(url)
+                self.assertEqual(hit['X-Cache'], 'HIT')
+                self.assertEqual(hit.json(), miss.json())
+                self.assertEqual(hit['ETag'], miss['ETag'])
+
+    def test_tags_order_does_not_matter(self):
+        self.get('/api/recipes/?tags=tag0&tags=tag1')
+        response = self.get('/api/recipes/?tags=tag1&tags=tag0&tags=tag1')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_authenticated_not_cached(self):
+        for _ in range(2):
+            response = self.get('/api/recipes/', self.user)
+            self.assertNotIn('X-Cache', response)
+            self.assertNotIn('ETag', response)
+
+    def test_not_modified(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.get(url)
+                with self.assertNumQueries(0):
+                    not_modified = self.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified['ETag'], response['ETag'])
+                not_modified = self.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(not_modified.status_code, 304)
+
+    def test_recipe_update_invalidates(self):
+        recipe = self.recipes[0]
+        old = {url: self.get(url) for url in self.urls()}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.author).patch(
+                f'/api/recipes/{recipe.id}/',
+                {'name': 'Новое название', 'cooking_time': 5,
+                 'tags': [self.tags[0].id],
+                 'ingredients': [{'id': self.ingredients[0].id,
+                                  'amount': 1}]},
+                format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        for url, old_response in old.items():
+            with self.subTest(url=url):
+                response = self.get(
+                    url, HTTP_IF_NONE_MATCH=old_response['ETag'])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['X-Cache'], 'MISS')
+                self.assertNotEqual(response['ETag'], old_response['ETag'])
+        detail = self.get(f'/api/recipes/{recipe.id}/').json()
+        self.assertEqual(detail['name'], 'Новое название')
+        self.assertEqual(detail['cooking_time'], 5)
+
+    def test_favorite_does_not_invalidate(self):
+        # Счетчики избранного могут отставать на время жизни кэша.
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_for(self.user).post(f'{url}favorite/')
+        self.assertEqual(self.get(url)['X-Cache'], 'HIT')
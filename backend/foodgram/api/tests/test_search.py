@@ -0,0 +1,80 @@
+from unittest import mock
+
+from recipe.models import IngredientsRecipe, Recipe
+from recipe.search import update_search_documents
+
+from .base import APITestCase
+
+
+class RecipeSearchTests(APITestCase):
+    """Поиск ?search= (recipe.search) и его сочетание с фильтрами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        author = cls.create_user('author')
+        tag, other_tag = cls.tags[:2]
+        garlic = cls.ingredients[0]
+        garlic.name = 'чеснок'
+        garlic.save()
+        cls.borscht = cls.create_recipe(
+            author, 'Борщ', 'Свекла и капуста', [tag], [garlic])
+        cls.soup = cls.create_recipe(
+            author, 'Суп', 'Почти как борщ, только без свеклы и капусты',
+            [other_tag])
+        cls.salad = cls.create_recipe(
+            author, 'Салат', 'Огурцы и помидоры', [tag])
+        update_search_documents(
+            [cls.borscht.id, cls.soup.id, cls.salad.id])
+
+    @classmethod
+    def create_recipe(cls, author, name, text, tags, ingredients=()):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text=text, cooking_time=10,
+            image='recipes/test.png')
+        recipe.tags.set(tags)
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients)
+        return recipe
+
+    def search(self, query, **params):
+        response = self.client_for().get(
+            '/api/recipes/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_name_match_ranks_first(self):
+        self.assertEqual(self.search('борщ'),
+                         [self.borscht.id, self.soup.id])
+
+    def test_ingredients_and_tags_are_searched(self):
+        self.assertEqual(self.search('чеснок'), [self.borscht.id])
+        self.assertEqual(set(self.search(self.tags[0].name)),
+                         {self.borscht.id, self.salad.id})
+
+    def test_no_match(self):
+        self.assertEqual(self.search('пельмени'), [])
+
+    def test_search_with_tags(self):
+        self.assertEqual(
+            self.search('борщ', tags=self.tags[1].slug), [self.soup.id])
+        self.assertEqual(
+            self.search('борщ', tags=[self.tags[0].slug, self.tags[1].slug]),
+            [self.borscht.id, self.soup.id])
+
+    def test_renamed_ingredient_is_reindexed(self):
+        garlic = self.ingredients[0]
+        garlic.name = 'черемша'
+        garlic.save()
+        self.assertEqual(self.search('черемша'), [self.borscht.id])
+        self.assertEqual(self.search('чеснок'), [])
+
+    def test_fallback_without_full_text_index(self):
+        # Базы без tsvector и FTS5 ищут вхождение в название и документ.
+        with mock.patch('recipe.search.connection', vendor='mysql'):
+            self.assertEqual(self.search('капуст'),
+                             [self.soup.id, self.borscht.id])
+            self.assertEqual(self.search('капуст', tags=self.tags[0].slug),
+                             [self.borscht.id])
+            self.assertEqual(self.search('чеснок'), [self.borscht.id])
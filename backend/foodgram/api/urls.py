@@ -1,4 +1,5 @@
-from . import views
+from . import async_views, views
+from django.conf import settings
 from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 
@@ -11,12 +12,32 @@ router.register('users', views.CustomUserViewSet, basename='user')
 router.register(r'ingredients',
                 views.IngridientsViewSet, basename='ingredient')
 router.register('tags', views.TagViewset, basename='tag')
+router.register('exports', views.ExportJobViewSet, basename='export')
 
 
 app_name = 'api'
 
 
+# Асинхронное чтение под ASGI (ASYNC_READ_API); остальные методы этих
+# адресов и все прочие адреса обслуживает роутер.
+async_urlpatterns = [
+    path('recipes/', async_views.RecipeListView.as_view()),
+    path('recipes/download_shopping_cart/',
+         async_views.DownloadShoppingCartView.as_view()),
+    path('recipes/<int:pk>/', async_views.RecipeDetailView.as_view()),
+    path('tags/', async_views.TagListView.as_view()),
+    path('ingredients/', async_views.IngredientListView.as_view()),
+    path('users/subscriptions/', async_views.SubscriptionsView.as_view()),
+]
+
 urlpatterns = [
+    path('_metrics', views.MetricsView.as_view(), name='metrics'),
+]
+
+if settings.ASYNC_READ_API:
+    urlpatterns += async_urlpatterns
+
+urlpatterns += [
     path('', include((router.urls, 'api'))),
     path('users/', include('djoser.urls')),          # new
     re_path(r'^auth/', include('djoser.urls.authtoken')),
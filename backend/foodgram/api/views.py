@@ -1,3 +1,4 @@
+from functools import partial
 
 from djoser.views import UserViewSet
 
@@ -7,123 +8,419 @@ from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         AllowAny, IsAuthenticatedOrReadOnly)
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import NotAcceptable, ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 from rest_framework.pagination import LimitOffsetPagination
 import django_filters.rest_framework
+from django.db import transaction
 from django.db.utils import IntegrityError
-from foodgram.utils import download
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django.contrib.auth.models import User
-from django.db.models import Sum
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.db.models import F, Prefetch, Value
 
+from foodgram.metrics import PROMETHEUS_CONTENT_TYPE, registry
+from recipe.cook_index import get_cook_index
+from recipe.counters import batched_counters, change_recipe_counters
+from recipe.popularity import (batch_events_added, batch_events_removed,
+                               event_added, events_removed)
+from recipe.ingredient_index import get_ingredient_index
 from recipe.models import (Recipe, ShoppingList, Follow,
-                           Ingredient, Tag, FavoritesRecipe,
-                           IngredientsRecipe)
+                           Ingredient, Tag, FavoritesRecipe, ExportJob)
 
 from .serializers import (RecipeSerializer, TagtSerializer,
-                          ListUserSerializer, ShoppingListSerializer,
+                          ListUserSerializer, AuthorShortSerializer,
                           CustomUserSerializer, FollowSerializer,
                           IngredientsSerializers, RecipeListSerializers,
                           UserWithRecipes, UserSubscriptions,
-                          FavoriteRecipeSerializers,
-                          RecipeNotAuthenticated
+                          RecipeShortSerializer,
+                          RecipeNotAuthenticated, RecipeIdsSerializer,
+                          ExportJobSerializer
                           )
+from .cache import (bump_cart_version, cache_stream, cart_export_key,
+                    get_cart_version)
+from .exports import (RENDERERS, cart_ingredients, enqueue_export,
+                      export_requested_async)
 from .filters import RecipeFilter
+from .mixins import (QueryMetricsMixin, ReferenceDataMixin,
+                     ResponseCacheMixin)
+from .pagination import KeysetPagination, RecipePagination
+from .relations import FOLLOWING, MODEL_KINDS, get_relations
+from .renderers import (CSVShoppingListRenderer, PDFShoppingListRenderer,
+                        TextShoppingListRenderer)
 
 
-class RecipeViewset(viewsets.ModelViewSet):
+def full_list_requested(request):
+    """Просит ли клиент полный ответ параметром ?full=true."""
+    return request.query_params.get('full') in ('true', 'True', '1')
+
+
+class RecipeViewset(QueryMetricsMixin, ResponseCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     filterset_class = RecipeFilter
     permission_classes = (IsAuthenticatedOrReadOnly, )
-    pagination_class = LimitOffsetPagination
+    pagination_class = RecipePagination
+    query_budget = {'list': 7, 'retrieve': 6, 'popular': 6, 'cookable': 6,
+                    'favorite': 11, 'shopping_cart': 11,
+                    'favorite_batch': 10, 'shopping_cart_batch': 10}
+    cached_query_params = frozenset((
+        'tags', 'author', 'search', 'ordering', 'is_favorited',
+        'is_in_shopping_cart', 'limit', 'offset', 'cursor', 'format'))
+    unordered_query_params = frozenset(('tags', ))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'popular', 'cookable'):
+            return queryset
+        # Автор приходит JOIN, теги и ингредиенты страницы загружает
+        # сериализатор (api.loaders), is_favorited и is_in_shopping_cart
+        # берутся из api.relations.
+        return queryset.select_related('author')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, partial(super().retrieve, request, *args, **kwargs))
 
     def get_serializer_class(self):
         if not self.request.user.is_authenticated:
             return RecipeNotAuthenticated
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'popular', 'cookable'):
             return RecipeListSerializers
         return RecipeSerializer
 
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
 
-    @action(detail=True, methods=['POST', 'DELETE'])
-    def favorite(self, request, *args, **kwargs):
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        bump_cart_version(*instance.is_in_shopping_cart.values_list(
+            'user_id', flat=True))
+        instance.delete()
+
+    def toggle(self, request, model):
+        """
+        Добавляет рецепт в избранное или корзину (model) или удаляет
+        (DELETE). Отвечает только этим рецептом, а с ?full=true - еще и
+        всем списком пользователя (одним запросом).
+        """
         user = request.user
-        recipe_id = self.get_object()
-        context = self.get_serializer_context()
+        recipe = self.get_object()
         if request.method == 'POST':
-            if (FavoritesRecipe.objects.filter(user=user,
-                                               recipe=recipe_id).exists()):
+            try:
+                with transaction.atomic():
+                    item = model.objects.create(user=user, recipe=recipe)
+                    event_added(model, recipe.id, item.created)
+                    if model is ShoppingList:
+                        bump_cart_version(user.id)
+            except IntegrityError:
                 return Response(status=status.HTTP_400_BAD_REQUEST,
                                 data={'errors': 'вы уже добавили этот рецепт'})
-            FavoritesRecipe.objects.create(user=user, recipe=recipe_id)
-            favorite_recipes = FavoritesRecipe.objects.filter(user=user)
-
-            serializers = FavoriteRecipeSerializers(
-                favorite_recipes)
-            return Response(status=status.HTTP_201_CREATED,
-                            data=serializers.data)
-        if request.method == 'DELETE':
-            if not (FavoritesRecipe.objects.filter(user=user,
-                                                   recipe=recipe_id).exists()):
+            data = RecipeShortSerializer(
+                recipe, context=self.get_serializer_context()).data
+            response_status = status.HTTP_201_CREATED
+        else:
+            items = model.objects.filter(user=user, recipe=recipe)
+            created = list(items.values_list('created', flat=True))
+            if not created:
                 return Response(status=status.HTTP_400_BAD_REQUEST,
                                 data={'errors': 'У вас нет этого рецепта'})
-            FavoritesRecipe.objects.filter(
-                user=user, recipe=recipe_id).delete()
-            favorite_recipes = FavoritesRecipe.objects.filter(user=user)
+            with transaction.atomic():
+                items.delete()
+                events_removed(model, recipe.id, created)
+                if model is ShoppingList:
+                    bump_cart_version(user.id)
+            data = None
+            response_status = status.HTTP_204_NO_CONTENT
+        get_relations(request).invalidate(MODEL_KINDS[model])
+        if not full_list_requested(request):
+            return Response(status=response_status, data=data)
+        recipes = Recipe.objects.filter(
+            id__in=model.objects.filter(user=user).values('recipe_id')
+        ).only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time'
+        ).order_by('-id')
+        data = {**(data or {}), 'recipes': RecipeShortSerializer(
+            recipes, many=True, context=self.get_serializer_context()).data}
+        if response_status == status.HTTP_204_NO_CONTENT:
+            # У ответа 204 не бывает тела.
+            response_status = status.HTTP_200_OK
+        return Response(status=response_status, data=data)
 
-            serializers = FavoriteRecipeSerializers(
-                favorite_recipes, context=context)
-            return Response(status=status.HTTP_204_NO_CONTENT,
-                            data=serializers.data)
+    @action(detail=True, methods=['POST', 'DELETE'])
+    def favorite(self, request, *args, **kwargs):
+        return self.toggle(request, FavoritesRecipe)
 
     @action(detail=True, methods=['POST', 'DELETE'])
     def shopping_cart(self, request, *args, **kwargs):
+        return self.toggle(request, ShoppingList)
+
+    @action(detail=False, methods=['GET'])
+    def popular(self, request, *args, **kwargs):
+        """
+        Не более ?limit= рецептов по убыванию рейтинга популярности
+        (recipe.popularity), без подсчета общего числа. Фильтры
+        RecipeFilter, например tags, работают как в списке.
+        """
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.POPULAR_RECIPES_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': 'limit должен быть числом'})
+        if limit < 1:
+            raise ValidationError({'limit': 'limit должен быть больше 0'})
+        limit = min(limit, settings.POPULAR_RECIPES_MAX_LIMIT)
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            popularity__isnull=False
+        ).order_by('-popularity__score', '-popularity__recipe_id')
+        serializer = self.get_serializer(queryset[:limit], many=True)
+        return Response(serializer.data)
+
+    def batch(self, request, model, counter):
+        """
+        Добавляет или удаляет (DELETE) рецепты из тела {"recipes": [id]}
+        в избранном или корзине пользователя за постоянное число
+        запросов и возвращает статус по каждому id.
+
+        Строки пользователя блокируются на время транзакции, поэтому
+        прочитанное до записи состояние точно и счетчики сходятся.
+        Повторная вставка все равно безопасна: bulk_create с
+        ignore_conflicts опирается на UniqueConstraint.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(
+            serializer.validated_data['recipes']))
         user = request.user
-        recipe_id = self.get_object()
-        context = self.get_serializer_context()
-        if request.method == 'POST':
-            if ShoppingList.objects.filter(user=user, recipe=recipe_id):
-                return Response(status=status.HTTP_400_BAD_REQUEST,
-                                data={'errors': 'вы уже добавили этот рецепт'})
-            ShoppingList.objects.create(user=user, recipe=recipe_id)
-            recipe_in_cart = ShoppingList.objects.filter(user=user)
-            serializers = ShoppingListSerializer(
-                recipe_in_cart, context=context, many=True)
-            return Response(status=status.HTTP_201_CREATED,
-                            data=serializers.data)
-        if request.method == 'DELETE':
-            ShoppingList.objects.filter(user=user, recipe=recipe_id).delete()
-            recipe_in_cart = ShoppingList.objects.filter(user=user)
-            serializers = ShoppingListSerializer(
-                recipe_in_cart, context=context, many=True)
-            return Response(status=status.HTTP_204_NO_CONTENT,
-                            data=serializers.data)
+        with transaction.atomic():
+            list(User.objects.select_for_update().filter(id=user.id))
+            found = set(Recipe.objects.filter(
+                id__in=recipe_ids).values_list('id', flat=True))
+            present = dict(model.objects.filter(
+                user=user, recipe_id__in=found
+            ).values_list('recipe_id', 'created'))
+            if request.method == 'POST':
+                changed = [recipe_id for recipe_id in recipe_ids
+                           if recipe_id in found and recipe_id not in present]
+                now = timezone.now()
+                model.objects.bulk_create(
+                    (model(user=user, recipe_id=recipe_id, created=now)
+                     for recipe_id in changed),
+                    ignore_conflicts=True,
+                )
+                # bulk_create не шлет post_save: счетчики меняем сами.
+                change_recipe_counters(changed, counter, 1)
+                batch_events_added(model, changed, now)
+                done, skipped = 'added', 'exists'
+            else:
+                changed = list(present)
+                with batched_counters():
+                    model.objects.filter(
+                        user=user, recipe_id__in=changed).delete()
+                batch_events_removed(model, present.items())
+                done, skipped = 'removed', 'absent'
+            if changed and model is ShoppingList:
+                bump_cart_version(user.id)
+        if changed:
+            get_relations(request).invalidate(MODEL_KINDS[model])
+        changed = set(changed)
+        return Response({'results': [
+            {'id': recipe_id,
+             'status': (done if recipe_id in changed
+                        else skipped if recipe_id in found
+                        else 'not_found')}
+            for recipe_id in recipe_ids
+        ]})
+
+    @action(detail=False, methods=['POST', 'DELETE'],
+            url_path='favorite', permission_classes=(IsAuthenticated, ))
+    def favorite_batch(self, request, *args, **kwargs):
+        return self.batch(request, FavoritesRecipe, 'favorites_count')
+
+    @action(detail=False, methods=['POST', 'DELETE'],
+            url_path='shopping_cart', permission_classes=(IsAuthenticated, ))
+    def shopping_cart_batch(self, request, *args, **kwargs):
+        return self.batch(request, ShoppingList, 'shopping_cart_count')
+
+    def get_ingredient_ids(self):
+        ingredients = []
+        for value in self.request.query_params.getlist('ingredients'):
+            ingredients.extend(item for item in value.split(',') if item)
+        if not ingredients:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент'})
+        if len(ingredients) > settings.COOKABLE_MAX_INGREDIENTS:
+            raise ValidationError({'ingredients': (
+                'Не больше '
+                f'{settings.COOKABLE_MAX_INGREDIENTS} ингредиентов')})
+        try:
+            return [int(item) for item in ingredients]
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'id ингредиентов должны быть числами'})
+
+    def get_max_missing(self):
+        max_missing = self.request.query_params.get('max_missing')
+        if max_missing is None:
+            return None
+        try:
+            max_missing = int(max_missing)
+        except ValueError:
+            raise ValidationError(
+                {'max_missing': 'max_missing должен быть числом'})
+        if max_missing < 0:
+            raise ValidationError(
+                {'max_missing': 'max_missing не может быть меньше 0'})
+        return max_missing
+
+    @action(detail=False, methods=['GET'],
+            pagination_class=LimitOffsetPagination)
+    def cookable(self, request, *args, **kwargs):
+        """
+        «Что приготовить»: рецепты с ингредиентами из ?ingredients=1,2,3
+        по убыванию доли имеющихся ингредиентов. ?max_missing= -
+        сколько ингредиентов рецепта может не хватать.
+
+        Совпадения считаются по обратному индексу в памяти
+        (recipe.cook_index), из базы читается только страница рецептов.
+        """
+        matches = get_cook_index().search(
+            self.get_ingredient_ids(), self.get_max_missing())
+        page = self.paginate_queryset(matches)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        # Рецепт мог быть удален после того, как индекс его учел.
+        page = [match for match in page if match[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page], many=True)
+        for data, (_, matched, total) in zip(serializer.data, page):
+            data['coverage'] = round(matched / total, 3)
+            data['missing_ingredients'] = total - matched
+        return self.get_paginated_response(serializer.data)
+
+    def perform_content_negotiation(self, request, force=False):
+        """
+        Фоновая выгрузка отвечает заданием в JSON, и Accept клиента
+        относится к этому ответу, а не к документу. Формат документа
+        тогда задает ?format=, подходящий Accept или первый рендерер.
+        """
+        if (self.action != 'download_shopping_cart'
+                or not export_requested_async(request)):
+            return super().perform_content_negotiation(request, force)
+        try:
+            return super().perform_content_negotiation(request)
+        except NotAcceptable:
+            renderers = self.get_renderers()
+            format = self.format_kwarg or request.query_params.get(
+                api_settings.URL_FORMAT_OVERRIDE)
+            if format:
+                renderers = self.get_content_negotiator().filter_renderers(
+                    renderers, format)
+            return renderers[0], renderers[0].media_type
 
     @action(
         detail=False,
         methods=['get'],
         url_path='download_shopping_cart',
         url_name='download_shopping_cart',
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PDFShoppingListRenderer,
+                          CSVShoppingListRenderer,
+                          TextShoppingListRenderer)
     )
     def download_shopping_cart(self, request):
-        shopping_lists = ShoppingList.objects.filter(user=request.user)
-        recepies = Recipe.objects.filter(
-            is_in_shopping_cart__in=shopping_lists)
-        ingredient_receipes = IngredientsRecipe.objects.filter(
-            recipe__in=recepies
-        ).values('ingredient').annotate(total_amount=Sum('amount'))
-        return download(ingredient_receipes)
+        if export_requested_async(request):
+            return self.export_job_response(request)
+        renderer = request.accepted_renderer
+        version = get_cart_version(request.user.id)
+        etag = f'"{version}-{renderer.format}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = cart_export_key(request.user.id, version, renderer.format)
+            content = cache.get(key)
+            if content is not None:
+                response = renderer.cached_response(content)
+            else:
+                response = renderer.stream_response(
+                    cart_ingredients(request.user.id).iterator())
+                response.streaming_content = cache_stream(
+                    response.streaming_content, key)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def export_job_response(self, request):
+        """
+        Ставит выгрузку в очередь и отвечает заданием: 202, пока файл
+        не готов, 200 - если готов.
+        """
+        job, _ = enqueue_export(
+            request.user.id, request.accepted_renderer.format)
+        data = ExportJobSerializer(
+            job, context=self.get_serializer_context()).data
+        # Рендереры действия - форматы списка, поэтому ответ в JSON
+        # формируется мимо них.
+        response = JsonResponse(
+            data,
+            status=(status.HTTP_200_OK if job.status == ExportJob.DONE
+                    else status.HTTP_202_ACCEPTED),
+            json_dumps_params={'ensure_ascii': False},
+        )
+        response['Location'] = data['url']
+        return response
 
 
-class TagViewset(mixins.RetrieveModelMixin,
+class ExportJobViewSet(QueryMetricsMixin,
+                       mixins.RetrieveModelMixin,
+                       viewsets.GenericViewSet):
+    """Задания фоновой выгрузки списка покупок текущего пользователя."""
+    serializer_class = ExportJobSerializer
+    permission_classes = (IsAuthenticated, )
+    query_budget = 3
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user)
+
+    @action(detail=True, methods=['get'])
+    def file(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ExportJob.DONE:
+            return Response(status=status.HTTP_404_NOT_FOUND,
+                            data={'errors': 'Файл еще не готов'})
+        renderer = RENDERERS[job.format]()
+        return FileResponse(
+            job.file.open('rb'), as_attachment=True,
+            filename=f'{renderer.filename}.{job.format}',
+            content_type=renderer.content_type)
+
+
+class TagViewset(QueryMetricsMixin,
+                 ReferenceDataMixin,
+                 mixins.RetrieveModelMixin,
                  mixins.ListModelMixin,
                  viewsets.GenericViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagtSerializer
     permission_classes = (AllowAny, )
     pagination_class = None
+    query_budget = 3
+
+    def list(self, request, *args, **kwargs):
+        return self.reference_list(request)
+
+    def reference_list(self, request, reference=None):
+        return self.reference_response(request, lambda reference: (
+            reference.memoize('tags', lambda: TagtSerializer(
+                reference.tags.values(), many=True).data)), reference)
 
 
 class ListUserViewset(mixins.ListModelMixin, viewsets.GenericViewSet):
@@ -150,18 +447,49 @@ class FollowViewSet(mixins.CreateModelMixin,
         return serializer.save(user=self.request.user, author=author)
 
 
-class IngridientsViewSet(viewsets.ModelViewSet):
+class IngridientsViewSet(QueryMetricsMixin, ReferenceDataMixin,
+                         viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientsSerializers
     pagination_class = None
     permission_classes = (AllowAny, )
+    query_budget = {'list': 3, 'retrieve': 3}
     filter_backends = [django_filters.rest_framework.DjangoFilterBackend]
 
+    def list(self, request, *args, **kwargs):
+        return self.reference_list(request)
 
-class CustomUserViewSet(UserViewSet):
-    queryset = User.objects.all()
+    def reference_list(self, request, reference=None):
+        """
+        С параметром name работает как автодополнение: ищет по индексу
+        в памяти процесса, без запроса к базе на каждое нажатие клавиши.
+        """
+        name = request.query_params.get('name')
+        if not name:
+            return self.reference_response(request, lambda reference: (
+                reference.memoize('ingredients', lambda: (
+                    IngredientsSerializers(
+                        reference.ingredients.values(), many=True).data))),
+                reference)
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.INGREDIENT_AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST,
+                            data={'errors': 'limit должен быть числом'})
+        if limit < 1:
+            return Response(status=status.HTTP_400_BAD_REQUEST,
+                            data={'errors': 'limit должен быть больше 0'})
+        return self.reference_response(
+            request, lambda reference: get_ingredient_index(
+                reference).search(name, limit), reference)
+
+
+class CustomUserViewSet(QueryMetricsMixin, UserViewSet):
+    queryset = User.objects.select_related('profile')
     pagination_class = LimitOffsetPagination
     permission_classes = (AllowAny, )
+    query_budget = {'list': 4, 'retrieve': 3, 'subscribe': 8}
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -170,6 +498,10 @@ class CustomUserViewSet(UserViewSet):
 
     @action(detail=True, methods=['POST', 'DELETE'])
     def subscribe(self, request, *args, **kwargs):
+        """
+        Отвечает автором без рецептов, а с ?full=true - вместе с
+        последними recipes_limit рецептами.
+        """
         author = self.get_object()
         user = request.user
         context = super().get_serializer_context()
@@ -179,27 +511,83 @@ class CustomUserViewSet(UserViewSet):
                                 data={'errors':
                                       'Вы не можете подписаться на самого себя'})
             try:
-                Follow.objects.create(user=user, author=author)
+                with transaction.atomic():
+                    Follow.objects.create(user=user, author=author)
             except IntegrityError:
                 return Response(status=status.HTTP_400_BAD_REQUEST,
                                 data={'errors':
                                       'вы уже подписаны на данного пользователя'})
-            serializer = UserWithRecipes(instance=author, context=context)
-
+            get_relations(request).invalidate(FOLLOWING)
+            author.is_subscribed = True
+            if full_list_requested(request):
+                context['recipes_limit'] = self.get_recipes_limit()
+                serializer = UserWithRecipes(instance=author, context=context)
+            else:
+                serializer = AuthorShortSerializer(
+                    instance=author, context=context)
             return Response(status=status.HTTP_201_CREATED, data=serializer.data)
         if request.method == 'DELETE':
             Follow.objects.filter(user=user, author=author).delete()
+            get_relations(request).invalidate(FOLLOWING)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['GET'])
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            raise ValidationError(
+                {'recipes_limit': 'recipes_limit должен быть числом'})
+        if recipes_limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'recipes_limit не может быть меньше 0'})
+        return recipes_limit
+
+    def get_subscriptions_queryset(self, user, recipes_limit=None):
+        """
+        Авторы, на которых подписан user, с числом рецептов, флагом
+        подписки и не более чем recipes_limit последними рецептами на
+        автора, выбранными одним оконным запросом.
+        """
+        recipes = Recipe.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        return User.objects.filter(following__user=user).annotate(
+            recipes_count=F('profile__recipes_count'),
+            # Все авторы выборки - подписки user.
+            is_subscribed=Value(True),
+        ).prefetch_related(
+            Prefetch('author', queryset=recipes,
+                     to_attr='prefetched_recipes'),
+        ).order_by('id')
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=(IsAuthenticated, ))
     def subscriptions(self, request, *args, **kwargs):
-        user = request.user
-        follows = Follow.objects.filter(user=user)
-        users = User.objects.filter(following__in=follows)
-        paginator = PageNumberPagination()
+        recipes_limit = self.get_recipes_limit()
+        users = self.get_subscriptions_queryset(request.user, recipes_limit)
+        if KeysetPagination.cursor_query_param in request.query_params:
+            paginator = KeysetPagination(ordering=('id', ))
+        else:
+            paginator = PageNumberPagination()
         results = paginator.paginate_queryset(users, request)
         context = self.get_serializer_context()
+        context['recipes_limit'] = recipes_limit
         serializer = UserWithRecipes(
             results, context=context, many=True)
-        # serializer.is_valid()
         return paginator.get_paginated_response(serializer.data)
+
+
+class MetricsView(APIView):
+    """Метрики QueryMetricsMiddleware в текстовом формате Prometheus."""
+
+    def get_permissions(self):
+        if settings.QUERY_METRICS_PUBLIC:
+            return (AllowAny(), )
+        return (IsAdminUser(), )
+
+    def get(self, request):
+        return HttpResponse(registry.render(),
+                            content_type=PROMETHEUS_CONTENT_TYPE)
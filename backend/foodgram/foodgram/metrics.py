@@ -0,0 +1,215 @@
+"""
+Метрики запросов: число и время SQL, повторяющиеся запросы, время
+сериализации и размер ответа.
+
+QueryMetricsMiddleware включается настройкой QUERY_METRICS и работает
+как под WSGI, так и под ASGI: метрики текущего запроса хранятся в
+ContextVar, который asgiref копирует в поток синхронного представления.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Представление выполнило больше SQL-запросов, чем заявлено."""
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.fingerprints = Counter()
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.fingerprints.values()
+                   if count > 1)
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        # Параметры Django передает отдельно, так что sql уже является
+        # отпечатком запроса.
+        self.fingerprints[sql] += 1
+
+
+def current_metrics():
+    """Метрики текущего запроса или None, если сбор выключен."""
+    return _current.get()
+
+
+def record_queries(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+def install_wrapper(connection):
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+@receiver(connection_created)
+def connection_created_handler(connection, **kwargs):
+    install_wrapper(connection)
+
+
+class MetricsRegistry:
+    """Накопленные метрики процесса в разрезе маршрута и метода."""
+
+    COUNTERS = (
+        ('requests_total', 'counter', 'Обработано запросов.'),
+        ('request_duration_seconds_sum', 'counter',
+         'Суммарное время обработки.'),
+        ('sql_queries_total', 'counter', 'Выполнено SQL-запросов.'),
+        ('sql_duration_seconds_sum', 'counter', 'Суммарное время SQL.'),
+        ('sql_duplicate_queries_total', 'counter',
+         'Повторы одинаковых SQL-запросов внутри запроса.'),
+        ('serializer_duration_seconds_sum', 'counter',
+         'Суммарное время сериализации.'),
+        ('response_bytes_sum', 'counter', 'Суммарный размер ответов.'),
+    )
+
+    # Счетчики событий с произвольными метками, см. increment.
+    EVENTS = {
+        'response_cache_requests_total': (
+            'Запросы к кэшу ответов по результату: hit, miss, '
+            'not_modified.'),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = defaultdict(lambda: [0] * len(self.COUNTERS))
+        self.events = Counter()
+
+    def increment(self, name, **labels):
+        """Увеличивает счетчик события name из EVENTS."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.events[key] += 1
+
+    def observe(self, route, method, status, metrics, duration, size):
+        values = (1, duration, metrics.queries, metrics.sql_time,
+                  metrics.duplicates, metrics.serializer_time, size)
+        with self.lock:
+            series = self.series[(route, method, str(status))]
+            for position, value in enumerate(values):
+                series[position] += value
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+            self.events.clear()
+
+    def render(self):
+        with self.lock:
+            series = {labels: list(values)
+                      for labels, values in self.series.items()}
+            events = dict(self.events)
+        lines = []
+        for position, (name, kind, description) in enumerate(self.COUNTERS):
+            name = f'foodgram_{name}'
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (route, method, status), values in sorted(series.items()):
+                labels = ','.join(
+                    f'{key}="{escape_label(value)}"' for key, value in (
+                        ('route', route), ('method', method),
+                        ('status', status)))
+                lines.append(f'{name}{{{labels}}} {values[position]}')
+        for event, description in self.EVENTS.items():
+            name = f'foodgram_{event}'
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for (key, labels), count in sorted(events.items()):
+                if key == event:
+                    labels = ','.join(f'{label}="{escape_label(value)}"'
+                                      for label, value in labels)
+                    lines.append(f'{name}{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+registry = MetricsRegistry()
+
+
+class QueryMetricsMiddleware:
+    """
+    Собирает метрики запроса, отдает их заголовком Server-Timing и
+    добавляет в registry для эндпоинта /api/_metrics.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_wrapper(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.started
+        if response.streaming:
+            size = int(response.get('Content-Length', 0))
+        else:
+            size = len(response.content)
+        response['Server-Timing'] = ', '.join((
+            f'sql;dur={metrics.sql_time * 1000:.2f};'
+            f'desc="{metrics.queries} queries, '
+            f'{metrics.duplicates} duplicated"',
+            f'serializer;dur={metrics.serializer_time * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ))
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        registry.observe(route, request.method, response.status_code,
+                         metrics, duration, size)
+        return response
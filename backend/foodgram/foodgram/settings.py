@@ -1,7 +1,7 @@
 import os
 from pathlib import Path
 
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'foodgram.metrics.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -122,6 +123,110 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# LocMemCache живет внутри одного процесса. Версии корзин (по ним
+# выгрузки списка покупок находят готовые задания), версии данных
+# рецептов и справочников и журнал cook_index должны быть общими для
+# всех воркеров gunicorn и run_export_worker, поэтому в
+# infra/docker-compose*.yml обоим сервисам задан Redis:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://redis:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+# Кэш общий для всех процессов (не LocMemCache и не DummyCache).
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+
+SHOPPING_CART_CACHE_MAX_SIZE = 5 * 1024 * 1024
+
+# Фоновая выгрузка списка покупок (api.exports, run_export_worker).
+# С True download_shopping_cart по умолчанию ставит задание в очередь,
+# без него - только с ?async=true.
+SHOPPING_CART_EXPORT_ASYNC = (
+    os.getenv('SHOPPING_CART_EXPORT_ASYNC', 'False') == 'True')
+# Сколько секунд хранятся задание и готовый файл.
+SHOPPING_CART_EXPORT_TTL = 60 * 60
+# Задание, которое выполняется дольше, считается брошенным упавшим
+# воркером и снова попадает в очередь.
+SHOPPING_CART_EXPORT_TIMEOUT = 10 * 60
+SHOPPING_CART_EXPORT_MAX_ATTEMPTS = 3
+
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+
+# Подписки, избранное и корзина пользователя (api.relations) как
+# множества id. С True множества хранятся в общем кэше между запросами,
+# иначе читаются заново в каждом запросе.
+USER_RELATIONS_CACHE = os.getenv('USER_RELATIONS_CACHE', 'False') == 'True'
+USER_RELATIONS_CACHE_TIMEOUT = 10 * 60
+
+# Кэш ответов анонимным пользователям: список и страница рецепта
+# (api.mixins.ResponseCacheMixin). Изменения рецептов, тегов и авторов
+# сбрасывают его сразу, а счетчики избранного и корзины в ответе могут
+# отставать на RECIPE_RESPONSE_CACHE_TIMEOUT секунд. Версия данных
+# рецептов хранится в кэше, и без общего кэша воркер отдавал бы ответы,
+# устаревшие после правок в другом воркере, поэтому кэш ответов
+# работает только с SHARED_CACHE.
+RECIPE_RESPONSE_CACHE = SHARED_CACHE and (
+    os.getenv('RECIPE_RESPONSE_CACHE', 'True') == 'True')
+RECIPE_RESPONSE_CACHE_TIMEOUT = 60
+
+# Сколько секунд клиенты могут не перепроверять списки тегов и
+# ингредиентов; после этого хватает запроса с If-None-Match.
+REFERENCE_CACHE_MAX_AGE = 5 * 60
+
+# Картинки рецептов, см. recipe.images. Картинки больше IMAGE_MAX_PIXELS
+# точек отклоняются, больше IMAGE_MAX_DIMENSION по стороне - уменьшаются.
+IMAGE_MAX_DIMENSION = 2048
+IMAGE_MAX_PIXELS = 40_000_000
+# Миниатюры: имя варианта -> наибольшие ширина и высота.
+IMAGE_VARIANTS = {
+    'list': (320, 320),
+    'card': (800, 800),
+}
+IMAGE_QUALITY = 80
+# Потоки для построения миниатюр; 0 - строить сразу после коммита.
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Асинхронные представления чтения (api.async_views) вместо синхронных;
+# имеет смысл под ASGI (foodgram.asgi, воркеры uvicorn). По умолчанию
+# образ запускает WSGI, ASGI включает infra/docker-compose.asgi.yml.
+ASYNC_READ_API = os.getenv('ASYNC_READ_API', 'False') == 'True'
+
+# Метрики SQL и времени ответа: заголовок Server-Timing и /api/_metrics.
+QUERY_METRICS = os.getenv('QUERY_METRICS', 'False') == 'True'
+
+# Без этого флага /api/_metrics доступен только администраторам.
+QUERY_METRICS_PUBLIC = os.getenv('QUERY_METRICS_PUBLIC', 'False') == 'True'
+
+# Превышение query_budget представления: исключение вместо предупреждения.
+QUERY_BUDGET_STRICT = False
+
+# Популярность рецептов (recipe.popularity): вклад события в рейтинг
+# убывает вдвое за POPULARITY_HALF_LIFE_DAYS. Веса событий хранятся
+# относительно POPULARITY_EPOCH; при смене эпохи или весов нужно
+# пересчитать рейтинг командой recompute_popularity.
+POPULARITY_HALF_LIFE_DAYS = 7
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_CART_WEIGHT = 0.5
+POPULARITY_EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+POPULAR_RECIPES_LIMIT = 6
+
+POPULAR_RECIPES_MAX_LIMIT = 100
+
+COOKABLE_MAX_INGREDIENTS = 100
+
+# Наибольшее число рецептов в пакетных запросах к избранному и корзине.
+BATCH_MAX_RECIPES = 100
+
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -1,32 +1,38 @@
-import io
-from django.http import HttpResponse
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse
+from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase.ttfonts import TTFont
 
-from recipe.models import Ingredient
+# Документы, которые больше этого размера, сбрасываются на диск,
+# а не держатся целиком в памяти воркера.
+SPOOL_MAX_SIZE = 1024 * 1024
+
+pdfmetrics.registerFont(
+    TTFont('FreeSans', settings.BASE_DIR / 'FreeSans.ttf'))
 
 
 def download(ingredient_receipes):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = (
-        "attachment; filename='shopping_cart.pdf'"
-    )
-    canvas.pdfmetrics.registerFont(
-        TTFont('FreeSans', './FreeSans.ttf'))
-    buffer = io.BytesIO()
+    """
+    Формирует PDF со списком покупок и отдает его потоком.
+
+    ingredient_receipes - итерируемое из словарей с ключами
+    ingredient__name, ingredient__measurement_unit и total_amount.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
     pdf_file = canvas.Canvas(buffer)
     pdf_file.setFont('FreeSans', 24)
     pdf_file.drawString(200, 800, 'Список покупок.')
     pdf_file.setFont('FreeSans', 14)
     from_bottom = 750
     for ingredient in ingredient_receipes:
-        unit = Ingredient.objects.get(id=ingredient['ingredient'])
-
         pdf_file.drawString(50,
                             from_bottom,
-                            f"{unit.name}: "
+                            f"{ingredient['ingredient__name']}: "
                             f"{ingredient['total_amount']} - "
-                            f"{unit.measurement_unit}")
+                            f"{ingredient['ingredient__measurement_unit']}")
         from_bottom -= 20
         if from_bottom <= 50:
             from_bottom = 800
@@ -35,7 +41,7 @@ def download(ingredient_receipes):
 
     pdf_file.showPage()
     pdf_file.save()
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
-    return response
+    buffer.seek(0)
+    return FileResponse(buffer, as_attachment=True,
+                        filename='shopping_cart.pdf',
+                        content_type='application/pdf')
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.contrib import admin
+from django.db import transaction
 
 from recipe.models import (Recipe, Ingredient,
                            Tag,
@@ -7,7 +8,13 @@ from recipe.models import (Recipe, Ingredient,
                            ShoppingList,
                            Follow,
                            IngredientsRecipe,
+                           Profile,
+                           ExportJob,
                            )
+from recipe.cook_index import record_recipe_ingredients
+from recipe.counters import batched_counters
+from recipe.images import replace_image
+from recipe.search import search, update_search_documents
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -25,14 +32,39 @@ class IngredientAmountInline(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'text', 'cooking_time', 'author',
-                    'image', 'favorinte_recipe_count')
+                    'image', 'favorites_count', 'shopping_cart_count')
+    list_select_related = ('author', )
+    readonly_fields = ('favorites_count', 'shopping_cart_count')
     search_fields = ('name',)
     inlines = (IngredientAmountInline, )
     list_filter = ('tags', 'pub_date')
 
-    @admin.display(description='favorite_count')
-    def favorinte_recipe_count(self, obj):
-        return FavoritesRecipe.objects.filter(recipe=obj.id).count()
+    def save_model(self, request, obj, form, change):
+        old_variants = None
+        if 'image' in form.changed_data:
+            old_variants = obj.image_variants
+            obj.image_variants = {}
+        super().save_model(request, obj, form, change)
+        if old_variants is not None:
+            replace_image(obj, old_variants)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_documents([form.instance.id])
+        record_recipe_ingredients(
+            form.instance.id,
+            form.instance.ingredients_in_recipe.values_list(
+                'ingredient_id', flat=True))
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search(queryset, search_term), False
+
+    def delete_queryset(self, request, queryset):
+        # Счетчики авторов меняют сигналы, накопленные в один UPDATE.
+        with transaction.atomic(), batched_counters():
+            super().delete_queryset(request, queryset)
 
 
 class IngridientAdmin(admin.ModelAdmin):
@@ -42,10 +74,29 @@ class IngridientAdmin(admin.ModelAdmin):
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name')
+    list_display = ('username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
+    list_select_related = ('profile', )
     search_fields = ('email', 'first_name', 'last_name')
     list_filter = search_fields = ('email', 'first_name', 'last_name')
 
+    @admin.display(description='recipes_count',
+                   ordering='profile__recipes_count')
+    def recipes_count(self, obj):
+        return obj.profile.recipes_count
+
+    @admin.display(description='followers_count',
+                   ordering='profile__followers_count')
+    def followers_count(self, obj):
+        return obj.profile.followers_count
+
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'format', 'status', 'attempts',
+                    'created', 'expires')
+    list_select_related = ('user', )
+    list_filter = ('status', 'format')
+
 
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Tag, TagAdmin)
@@ -54,5 +105,7 @@ admin.site.register(FavoritesRecipe)
 admin.site.register(ShoppingList)
 admin.site.register(Follow)
 admin.site.register(IngredientsRecipe)
+admin.site.register(Profile)
+admin.site.register(ExportJob, ExportJobAdmin)
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,206 @@
+"""
+Обратный индекс «ингредиент -> рецепты» для поиска «что приготовить».
+
+Индекс живет в памяти процесса, как и ingredient_index. Изменения
+рецептов записываются в журнал в кэше (record_recipe_ingredients), и
+процессы применяют чужие изменения инкрементально, не перестраивая
+индекс. Полная перестройка нужна, только если журнал сброшен
+(invalidate_cook_index) или из него вытеснена запись. Вытесненный
+счетчик журнала не начинается заново, а сбрасывает журнал: иначе номера
+повторились бы и процессы пропустили бы изменения.
+
+Записи журнала - итоговый набор ингредиентов рецепта, поэтому их
+повторное применение ничего не портит.
+"""
+import heapq
+import threading
+from array import array
+from collections import Counter
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from recipe.models import IngredientsRecipe
+
+GENERATION_KEY = 'cook_index:generation'
+SEQUENCE_KEY = 'cook_index:sequence:{generation}'
+CHANGE_KEY = 'cook_index:change:{generation}:{number}'
+CHANGE_TIMEOUT = 24 * 60 * 60
+
+
+class CookIndex:
+    """
+    postings - ингредиент -> массив id рецептов, recipes - рецепт ->
+    кортеж его ингредиентов.
+    """
+
+    def __init__(self, rows=()):
+        self.postings = {}
+        recipes = {}
+        for ingredient_id, recipe_id in rows:
+            posting = self.postings.get(ingredient_id)
+            if posting is None:
+                posting = self.postings[ingredient_id] = array('q')
+            posting.append(recipe_id)
+            ingredients = recipes.get(recipe_id)
+            if ingredients is None:
+                ingredients = recipes[recipe_id] = []
+            ingredients.append(ingredient_id)
+        self.recipes = {recipe_id: tuple(ingredients)
+                        for recipe_id, ingredients in recipes.items()}
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """Заменяет ингредиенты рецепта; пустой набор удаляет рецепт."""
+        old = set(self.recipes.pop(recipe_id, ()))
+        new = set(ingredient_ids)
+        for ingredient_id in old - new:
+            posting = self.postings[ingredient_id]
+            posting.remove(recipe_id)
+            if not posting:
+                del self.postings[ingredient_id]
+        for ingredient_id in new - old:
+            self.postings.setdefault(
+                ingredient_id, array('q')).append(recipe_id)
+        if new:
+            self.recipes[recipe_id] = tuple(new)
+
+    def search(self, ingredient_ids, max_missing=None, limit=None):
+        """
+        Рецепты, в которых есть хотя бы один из ingredient_ids, как
+        кортежи (id рецепта, найдено ингредиентов, всего ингредиентов),
+        по убыванию доли найденных, затем числа найденных.
+        """
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(self.postings.get(ingredient_id, ()))
+        results = (
+            (recipe_id, count, len(self.recipes[recipe_id]))
+            for recipe_id, count in matched.items()
+        )
+        if max_missing is not None:
+            results = (result for result in results
+                       if result[2] - result[1] <= max_missing)
+
+        def key(result):
+            recipe_id, count, total = result
+            return count / total, count, recipe_id
+
+        if limit is not None:
+            return heapq.nlargest(limit, results, key=key)
+        return sorted(results, key=key, reverse=True)
+
+
+_lock = threading.Lock()
+_index = None
+_generation = None
+_applied = 0
+
+
+def new_generation():
+    """Новый журнал со счетчиком, созданным вместе с ним."""
+    generation = uuid4().hex
+    cache.set(SEQUENCE_KEY.format(generation=generation), 0, None)
+    return generation
+
+
+def get_generation():
+    return cache.get_or_set(GENERATION_KEY, new_generation, None)
+
+
+def get_sequence(generation):
+    """Номер последнего изменения; None, если счетчик вытеснен."""
+    return cache.get(SEQUENCE_KEY.format(generation=generation))
+
+
+def reset_log():
+    """Журнал потерян: все процессы перестроят индекс из базы."""
+    generation = new_generation()
+    cache.set(GENERATION_KEY, generation, None)
+    return generation
+
+
+def build_index():
+    return CookIndex(IngredientsRecipe.objects.values_list(
+        'ingredient_id', 'recipe_id').iterator(chunk_size=10000))
+
+
+def get_cook_index():
+    """
+    Индекс текущего процесса с примененными изменениями из журнала.
+    """
+    global _index, _generation, _applied
+    generation = get_generation()
+    sequence = get_sequence(generation)
+    if sequence is None:
+        generation = reset_log()
+        sequence = 0
+    if (_index is not None and _generation == generation
+            and _applied == sequence):
+        return _index
+    with _lock:
+        if _index is not None and _generation == generation:
+            if catch_up(generation, sequence):
+                return _index
+        # Номер читается до загрузки строк: изменения, которые попадут
+        # и в загрузку, и в журнал после него, применятся повторно.
+        _index = None
+        sequence = get_sequence(generation) or 0
+        index = build_index()
+        _index, _generation, _applied = index, generation, sequence
+        # Если запись журнала за время загрузки пропала, индекс будет
+        # перестроен при следующем обращении.
+        catch_up(generation, get_sequence(generation))
+    return _index
+
+
+def catch_up(generation, sequence):
+    """
+    Применяет изменения журнала до sequence. False - индекс нужно
+    перестроить: счетчик или хотя бы одна запись журнала вытеснены.
+    """
+    global _applied
+    if sequence is None or sequence < _applied:
+        return False
+    if sequence == _applied:
+        return True
+    keys = [CHANGE_KEY.format(generation=generation, number=number)
+            for number in range(_applied + 1, sequence + 1)]
+    changes = cache.get_many(keys)
+    if any(changes.get(key) is None for key in keys):
+        # Пропустить изменение нельзя: индекс разошелся бы с базой.
+        return False
+    for key in keys:
+        _index.set_recipe(*changes[key])
+    _applied = sequence
+    return True
+
+
+def record_recipe_ingredients(recipe_id, ingredient_ids):
+    """
+    Записывает итоговый набор ингредиентов рецепта (пустой - рецепт
+    удален) в журнал после коммита транзакции.
+    """
+    change = (recipe_id, tuple(ingredient_ids))
+
+    def write():
+        generation = get_generation()
+        try:
+            number = cache.incr(SEQUENCE_KEY.format(generation=generation))
+        except ValueError:
+            # Счетчик вытеснен: журнал сбрасывается, и изменение войдет
+            # в индексы, перестроенные из базы.
+            reset_log()
+            return
+        cache.set(CHANGE_KEY.format(generation=generation, number=number),
+                  change, CHANGE_TIMEOUT)
+
+    transaction.on_commit(write)
+
+
+def invalidate_cook_index():
+    """Сбрасывает журнал: все процессы перестроят индекс из базы."""
+    transaction.on_commit(reset_log)
@@ -0,0 +1,154 @@
+"""
+Денормализованные счетчики: Recipe.favorites_count и
+shopping_cart_count, Profile.recipes_count и followers_count.
+
+Счетчики меняют сигналы post_save и post_delete (recipe.signals)
+атомарным UPDATE ... SET x = GREATEST(x + n, 0) в той же транзакции,
+что и сами записи, поэтому учитываются и админка, и shell, и каскадное
+удаление. Внутри batched_counters изменения копятся и применяются одним
+UPDATE. bulk_create сигналов не шлет: массовые вставки меняют счетчики
+сами. Оставшиеся расхождения (например, loaddata) чинит команда recount.
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipe.models import (FavoritesRecipe, Follow, Profile, Recipe,
+                           ShoppingList)
+
+
+def count_of(model, field, outer='pk'):
+    """Подзапрос COUNT(*) строк model, у которых field = OuterRef(outer)."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+RECIPE_COUNTERS = {
+    'favorites_count': (FavoritesRecipe, 'recipe'),
+    'shopping_cart_count': (ShoppingList, 'recipe'),
+}
+PROFILE_COUNTERS = {
+    'recipes_count': (Recipe, 'author'),
+    'followers_count': (Follow, 'author'),
+}
+
+
+# Изменения счетчиков, накопленные в batched_counters текущего потока.
+_local = threading.local()
+
+
+def shifted(field, delta):
+    """Новое значение счетчика; ниже нуля он не опускается."""
+    return Greatest(F(field) + delta, 0)
+
+
+def change_recipe_counters(recipe_ids, field, delta):
+    """Одно и то же изменение счетчика у нескольких рецептов."""
+    if delta and recipe_ids:
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            **{field: shifted(field, delta)})
+
+
+def change_profile_counters(user_ids, field, delta):
+    """Одно и то же изменение счетчика у профилей нескольких авторов."""
+    if not delta or not user_ids:
+        return
+    updated = Profile.objects.filter(user_id__in=user_ids).update(
+        **{field: shifted(field, delta)})
+    if updated < len(user_ids) and delta > 0:
+        # Профиля нет (пользователь создан в обход сигнала) -
+        # создаем его сразу с посчитанными значениями. При уменьшении
+        # не создаем: пользователь может удаляться прямо сейчас.
+        recount_profiles(User.objects.filter(
+            id__in=user_ids, profile__isnull=True))
+
+
+def change_profile_counter(user_id, field, delta):
+    change_profile_counters((user_id, ), field, delta)
+
+
+APPLY = {Recipe: change_recipe_counters, Profile: change_profile_counters}
+
+
+def counter_changed(model, object_id, field, delta):
+    """
+    Изменение счетчика field строки model (Recipe или Profile, для
+    Profile - по id пользователя): сразу или при выходе из
+    batched_counters.
+    """
+    changes = getattr(_local, 'changes', None)
+    if changes is None:
+        APPLY[model]((object_id, ), field, delta)
+    else:
+        changes[model, field][object_id] += delta
+
+
+@contextmanager
+def batched_counters():
+    """
+    Копит изменения счетчиков от сигналов внутри блока, например от
+    массового удаления, и применяет их при выходе одним UPDATE на
+    счетчик и величину изменения. Блок должен быть в транзакции.
+    """
+    if getattr(_local, 'changes', None) is not None:
+        yield
+        return
+    _local.changes = defaultdict(Counter)
+    try:
+        yield
+        changes = _local.changes
+    finally:
+        _local.changes = None
+    for (model, field), deltas in changes.items():
+        by_delta = defaultdict(list)
+        for object_id, delta in deltas.items():
+            by_delta[delta].append(object_id)
+        for delta, object_ids in by_delta.items():
+            APPLY[model](object_ids, field, delta)
+
+
+def recount(queryset, counters, outer='pk', batch_size=1000):
+    """
+    Пересчитывает счетчики строк queryset, где они разошлись с COUNT,
+    и возвращает число исправленных строк. outer - поле queryset, по
+    которому связаны считаемые записи.
+    """
+    actual = {f'actual_{field}': count_of(model, related, outer)
+              for field, (model, related) in counters.items()}
+    condition = Q()
+    for field in counters:
+        condition |= ~Q(**{field: F(f'actual_{field}')})
+    ids = list(queryset.annotate(**actual).filter(condition).values_list(
+        'pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        queryset.model.objects.filter(
+            pk__in=ids[start:start + batch_size]
+        ).update(**{field: count_of(model, related, outer)
+                    for field, (model, related) in counters.items()})
+    return len(ids)
+
+
+def recount_recipes(queryset=None, batch_size=1000):
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    return recount(queryset, RECIPE_COUNTERS, batch_size=batch_size)
+
+
+def recount_profiles(users=None, batch_size=1000):
+    """Создает недостающие профили и пересчитывает счетчики users."""
+    if users is None:
+        users = User.objects.all()
+    Profile.objects.bulk_create(
+        (Profile(user_id=user_id) for user_id in users.filter(
+            profile__isnull=True).values_list('id', flat=True)),
+        ignore_conflicts=True,
+    )
+    return recount(Profile.objects.filter(user__in=users), PROFILE_COUNTERS,
+                   'user_id', batch_size)
@@ -0,0 +1,33 @@
+"""
+Версия данных рецептов для кэша ответов (api.mixins.ResponseCacheMixin).
+
+Версия меняется после коммита при создании, изменении и удалении
+рецептов, изменении тегов, ингредиентов, авторов и миниатюр (см.
+recipe.signals). Вместе с версией хранится момент изменения: он служит
+Last-Modified закэшированных ответов.
+"""
+import time
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'recipes:version'
+
+
+def new_version():
+    return uuid4().hex, time.time()
+
+
+def get_recipes_version():
+    """(версия, момент изменения в секундах Unix)."""
+    return cache.get_or_set(VERSION_KEY, new_version, None)
+
+
+async def aget_recipes_version():
+    return await cache.aget_or_set(VERSION_KEY, new_version, None)
+
+
+def bump_recipes_version():
+    transaction.on_commit(
+        lambda: cache.set(VERSION_KEY, new_version(), None))
@@ -0,0 +1,180 @@
+"""
+Обработка картинок рецептов.
+
+При загрузке cap_image проверяет картинку и уменьшает ее до
+IMAGE_MAX_DIMENSION по длинной стороне. Миниатюры IMAGE_VARIANTS в JPEG
+и WebP лежат рядом с оригиналом в подкаталоге variants, их имена -
+в Recipe.image_variants ({вариант: {формат: имя файла}}). Пока миниатюр
+нет, клиенты берут оригинал.
+
+Миниатюры строит generate_variants: после коммита в пуле из
+IMAGE_WORKERS потоков (schedule_variants) или, для уже загруженных
+картинок, командой generate_image_variants.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from recipe.data_version import bump_recipes_version
+from recipe.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Формат Pillow -> расширение файла миниатюры.
+FORMATS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+
+def cap_image(file):
+    """
+    Уменьшает картинку до IMAGE_MAX_DIMENSION по длинной стороне.
+    Возвращает file, если уменьшать не нужно. ValueError - если файл не
+    картинка или в ней больше IMAGE_MAX_PIXELS точек.
+    """
+    file.seek(0)
+    try:
+        # Размер известен без декодирования, поэтому огромные картинки
+        # отсекаются до того, как займут память.
+        image = Image.open(file)
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError('Загрузите корректное изображение')
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValueError(
+            f'Изображение больше {settings.IMAGE_MAX_PIXELS} точек')
+    limit = settings.IMAGE_MAX_DIMENSION
+    if max(width, height) <= limit:
+        file.seek(0)
+        return file
+    format = image.format
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((limit, limit))
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return ContentFile(buffer.getvalue(), name=file.name)
+
+
+def variant_name(name, variant, format):
+    directory, base = os.path.split(os.path.splitext(name)[0])
+    return os.path.join(
+        directory, 'variants', f'{base}_{variant}.{FORMATS[format]}')
+
+
+def render_variant(image, size, format):
+    image = image.copy()
+    image.thumbnail(size)
+    if format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, quality=settings.IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def delete_variants(variants):
+    """Удаляет файлы миниатюр из словаря вида Recipe.image_variants."""
+    storage = Recipe._meta.get_field('image').storage
+    for formats in variants.values():
+        for name in formats.values():
+            storage.delete(name)
+
+
+def generate_variants(recipe_id):
+    """
+    Строит миниатюры картинки рецепта и сохраняет их имена. Если
+    картинку успели заменить или рецепт удален, результат выбрасывается.
+    Возвращает True, если миниатюры сохранены.
+    """
+    recipe = Recipe.objects.filter(id=recipe_id).only(
+        'id', 'image', 'image_variants').first()
+    if recipe is None or not recipe.image:
+        return False
+    name = recipe.image.name
+    storage = recipe.image.storage
+    with storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    variants = {}
+    for variant, size in settings.IMAGE_VARIANTS.items():
+        variants[variant] = {}
+        for format in FORMATS:
+            target = variant_name(name, variant, format)
+            # Повторная генерация перезаписывает файл, а не плодит копии.
+            storage.delete(target)
+            variants[variant][format.lower()] = storage.save(
+                target, ContentFile(render_variant(image, size, format)))
+    if not Recipe.objects.filter(id=recipe_id, image=name).update(
+            image_variants=variants):
+        delete_variants(variants)
+        return False
+    bump_recipes_version()
+    saved = {saved_name for formats in variants.values()
+             for saved_name in formats.values()}
+    delete_variants({
+        variant: {format: old for format, old in formats.items()
+                  if old not in saved}
+        for variant, formats in recipe.image_variants.items()
+    })
+    return True
+
+
+def run_in_worker(recipe_id):
+    """generate_variants для потока пула: ошибки пишутся в лог."""
+    try:
+        return generate_variants(recipe_id)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры рецепта %s',
+                         recipe_id)
+        return False
+    finally:
+        # Соединения потока пула не закрывает обработчик запроса.
+        connections.close_all()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='recipe-images')
+    return _executor
+
+
+def schedule_variants(recipe_id):
+    """
+    Строит миниатюры после коммита: в пуле потоков или, если
+    IMAGE_WORKERS = 0, сразу в текущем потоке.
+    """
+    def run():
+        if settings.IMAGE_WORKERS:
+            get_executor().submit(run_in_worker, recipe_id)
+            return
+        try:
+            generate_variants(recipe_id)
+        except Exception:
+            logger.exception('Не удалось построить миниатюры рецепта %s',
+                             recipe_id)
+
+    transaction.on_commit(run)
+
+
+def replace_image(recipe, old_variants):
+    """
+    Для рецепта с новой картинкой: удаляет миниатюры старой после
+    коммита и ставит в очередь построение новых.
+    """
+    if old_variants:
+        transaction.on_commit(lambda: delete_variants(old_variants))
+    schedule_variants(recipe.id)
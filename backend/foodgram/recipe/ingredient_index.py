@@ -0,0 +1,72 @@
+import threading
+from bisect import bisect_left
+
+from recipe.reference import get_reference_data
+
+
+def normalize(value):
+    """Ключ поиска: без учета регистра, «ё» приравнена к «е»."""
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Отсортированный по нормализованному названию список ингредиентов.
+
+    Поиск по началу названия - бинарный, поиск по вхождению - полный
+    проход по списку, что для справочника в пару тысяч строк дешевле
+    запроса к базе.
+    """
+
+    def __init__(self, ingredients):
+        self.entries = sorted(
+            (normalize(name), {'id': id, 'name': name,
+                               'measurement_unit': measurement_unit})
+            for id, name, measurement_unit in ingredients
+        )
+        self.keys = [key for key, _ in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, query, limit=None):
+        """Сначала совпадения по началу названия, затем по вхождению."""
+        query = normalize(query)
+        result = []
+        for key, ingredient in self.entries[bisect_left(self.keys, query):]:
+            if not key.startswith(query) or len(result) == limit:
+                break
+            result.append(ingredient)
+        if limit is not None and len(result) >= limit:
+            return result
+        for key, ingredient in self.entries:
+            if query in key and not key.startswith(query):
+                result.append(ingredient)
+                if len(result) == limit:
+                    break
+        return result
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_ingredient_index(reference=None):
+    """
+    Индекс текущего процесса. Строится по справочнику из
+    recipe.reference (или по переданному reference) и перестраивается
+    вместе с ним.
+    """
+    global _index, _index_version
+    if reference is None:
+        reference = get_reference_data()
+    if _index is not None and _index_version == reference.version:
+        return _index
+    with _lock:
+        if _index is None or _index_version != reference.version:
+            _index = IngredientIndex(
+                (ingredient.id, ingredient.name, ingredient.measurement_unit)
+                for ingredient in reference.ingredients.values())
+            _index_version = reference.version
+    return _index
@@ -0,0 +1,147 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipe.models import (FavoritesRecipe, Follow, Ingredient, Recipe,
+                           ShoppingList, Tag)
+
+
+class Command(BaseCommand):
+    help = ('Гоняет основные эндпоинты API через тестовый клиент DRF и '
+            'выводит p50/p95 задержки, число запросов к базе и выделения '
+            'памяти на запрос. Набор данных создается generate_dataset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username, по умолчанию '
+                            'пользователь с подписками и корзиной.')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument('--output', metavar='PATH',
+                            help='Сохранить результаты в JSON.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient(HTTP_HOST='localhost')
+        client.force_authenticate(user)
+        anonymous = APIClient(HTTP_HOST='localhost')
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        endpoints = {
+            'recipes': (anonymous, '/api/recipes/?limit=6'),
+            'recipes_auth': (client, '/api/recipes/?limit=6'),
+            'recipes_tag_offset': (
+                client,
+                f'/api/recipes/?limit=6&offset=600&tags={tag.slug}'
+                if tag else '/api/recipes/?limit=6&offset=600'),
+            'recipes_favorited': (client,
+                                  '/api/recipes/?limit=6&is_favorited=1'),
+            'subscriptions': (client, '/api/users/subscriptions/'),
+            'users': (client, '/api/users/?limit=6'),
+            'ingredients': (
+                anonymous,
+                f'/api/ingredients/?name={ingredient.name[:2]}'
+                if ingredient else '/api/ingredients/?name=а'),
+            'download_shopping_cart': (
+                client, '/api/recipes/download_shopping_cart/'),
+        }
+        results = {
+            'commit': self.get_commit(),
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'follows': Follow.objects.count(),
+                'favorites': FavoritesRecipe.objects.count(),
+                'shopping_carts': ShoppingList.objects.count(),
+            },
+            'options': {key: options[key]
+                        for key in ('iterations', 'warmup', 'cold')},
+            'endpoints': {},
+        }
+        for name, (api_client, url) in endpoints.items():
+            results['endpoints'][name] = self.measure(
+                api_client, url, options)
+            self.print_result(name, url, results['endpoints'][name])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.filter(
+                follower__isnull=False, user_cart__isnull=False
+            ).order_by('id').first()
+        if user is None:
+            raise CommandError('Пользователь не найден, сначала '
+                               'выполните generate_dataset.')
+        return user
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def request(self, api_client, url, cold):
+        if cold:
+            cache.clear()
+        response = api_client.get(url)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        return response.status_code, size
+
+    def measure(self, api_client, url, options):
+        cold = options['cold']
+        for _ in range(options['warmup']):
+            self.request(api_client, url, cold)
+
+        timings = []
+        for _ in range(options['iterations']):
+            started = time.perf_counter()
+            self.request(api_client, url, cold)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Запросы и память меряются отдельным прогоном, чтобы
+        # tracemalloc не искажал задержки.
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            status, size = self.request(api_client, url, cold)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'status': status,
+            'size': size,
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3)
+            if len(timings) > 1 else round(timings[0], 3),
+            'queries': len(queries),
+            'peak_alloc_kib': round(peak / 1024, 1),
+        }
+
+    def print_result(self, name, url, result):
+        self.stdout.write(
+            f"{name:<24} {result['status']} "
+            f"p50 {result['p50_ms']:>8.2f} ms  "
+            f"p95 {result['p95_ms']:>8.2f} ms  "
+            f"queries {result['queries']:>4}  "
+            f"alloc {result['peak_alloc_kib']:>8.1f} KiB  {url}"
+        )
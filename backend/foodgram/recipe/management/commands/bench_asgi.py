@@ -0,0 +1,149 @@
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+PATHS = (
+    '/api/recipes/?limit=6',
+    '/api/recipes/1/',
+    '/api/tags/',
+    '/api/users/subscriptions/?recipes_limit=3',
+    '/api/recipes/download_shopping_cart/?format=pdf',
+)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность чтения под WSGI '
+            '(синхронные вьюсеты, клиенты в потоках) и под ASGI '
+            '(api.async_views, клиенты в цикле событий). Каждый режим '
+            'запускается в отдельном процессе со своим ASYNC_READ_API.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username, по умолчанию '
+                            'пользователь с подписками и корзиной.')
+        parser.add_argument('--clients', type=int, default=20,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на адрес.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Адрес; можно указать несколько раз.')
+        parser.add_argument('--handler', choices=('wsgi', 'asgi'),
+                            help='Замерить только один режим в этом '
+                                 'процессе.')
+
+    def handle(self, *args, **options):
+        if options['handler'] is None:
+            for handler in ('wsgi', 'asgi'):
+                self.run_subprocess(handler, options)
+            return
+        if (options['handler'] == 'asgi') != settings.ASYNC_READ_API:
+            self.stderr.write('ASYNC_READ_API не соответствует --handler, '
+                              'замер отражает другой набор представлений.')
+        token, _ = Token.objects.get_or_create(user=self.get_user(
+            options['user']))
+        headers = {'authorization': f'Token {token.key}'}
+        measure = (self.measure_asgi if options['handler'] == 'asgi'
+                   else self.measure_wsgi)
+        # Тестовые клиенты ходят на testserver.
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for path in options['paths'] or PATHS:
+                measure(path, headers, options['clients'], 1)
+                started = time.perf_counter()
+                results = measure(path, headers, options['clients'],
+                                  options['requests'])
+                elapsed = time.perf_counter() - started
+                self.print_result(options['handler'], path, results, elapsed)
+
+    def run_subprocess(self, handler, options):
+        command = [sys.executable, sys.argv[0], 'bench_asgi',
+                   '--handler', handler,
+                   '--clients', str(options['clients']),
+                   '--requests', str(options['requests'])]
+        if options['user']:
+            command += ['--user', options['user']]
+        for path in options['paths'] or ():
+            command += ['--path', path]
+        env = {**os.environ,
+               'ASYNC_READ_API': 'True' if handler == 'asgi' else 'False'}
+        completed = subprocess.run(command, env=env, capture_output=True,
+                                   text=True)
+        self.stdout.write(completed.stdout, ending='')
+        if completed.returncode:
+            raise CommandError(completed.stderr)
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.filter(
+                follower__isnull=False, user_cart__isnull=False
+            ).order_by('id').first()
+        if user is None:
+            raise CommandError('Пользователь не найден, сначала '
+                               'выполните generate_dataset.')
+        return user
+
+    def measure_wsgi(self, path, headers, clients, requests):
+        local = threading.local()
+
+        def request(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            started = time.perf_counter()
+            response = local.client.get(path, headers=headers)
+            read_response(response)
+            return response.status_code, time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(request, range(requests)))
+        connections.close_all()
+        return results
+
+    def measure_asgi(self, path, headers, clients, requests):
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(clients)
+
+            async def request():
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(path, headers=headers)
+                    read_response(response)
+                    return response.status_code, time.perf_counter() - started
+
+            return await asyncio.gather(
+                *(request() for _ in range(requests)))
+
+        return asyncio.run(run())
+
+    def print_result(self, handler, path, results, elapsed):
+        statuses = sorted({status for status, _ in results})
+        timings = sorted(timing * 1000 for _, timing in results)
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f"{handler:<5} {','.join(map(str, statuses))} "
+            f"{len(results) / elapsed:>8.1f} rps  "
+            f"p50 {statistics.median(timings):>8.2f} ms  "
+            f"p95 {p95:>8.2f} ms  {path}"
+        )
+
+
+def read_response(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    else:
+        response.content
@@ -0,0 +1,81 @@
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from recipe.cook_index import build_index
+from recipe.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск «что приготовить» по обратному индексу в '
+            'памяти с агрегацией IngredientsRecipe в базе. Набор данных '
+            'создается generate_dataset, например --recipes 100000.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=(3, 10, 20),
+                            help='Размеры наборов ингредиентов.')
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ingredient_ids = list(Ingredient.objects.filter(
+            ingredients_in_recipe__isnull=False
+        ).distinct().values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('В базе нет рецептов с ингредиентами.')
+        # Память меряется отдельной сборкой: tracemalloc замедляет ее
+        # в несколько раз.
+        tracemalloc.start()
+        build_index()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        gc.collect()
+        started = time.perf_counter()
+        index = build_index()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'index: {len(index)} recipes, built in {elapsed:.2f} s, '
+            f'peak {peak / 2 ** 20:.1f} MiB')
+        limit = options['limit']
+        for size in options['sizes']:
+            samples = [rng.sample(ingredient_ids,
+                                  min(size, len(ingredient_ids)))
+                       for _ in range(options['iterations'])]
+            self.report(f'index  {size:>3}', samples,
+                        lambda ids: index.search(ids, limit=limit))
+            self.report(f'query  {size:>3}', samples,
+                        lambda ids: self.aggregate(ids, limit))
+            if index.search(samples[0], limit=limit) != self.aggregate(
+                    samples[0], limit):
+                self.stderr.write(
+                    f'Результаты индекса и запроса для {size} '
+                    'ингредиентов не совпадают.')
+
+    def aggregate(self, ingredient_ids, limit):
+        return [tuple(row) for row in Recipe.objects.annotate(
+            matched=Count('ingredients_in_recipe', filter=Q(
+                ingredients_in_recipe__ingredient__in=ingredient_ids)),
+            total=Count('ingredients_in_recipe'),
+        ).filter(matched__gt=0).annotate(
+            coverage=Cast('matched', FloatField()) / F('total'),
+        ).order_by('-coverage', '-matched', '-id').values_list(
+            'id', 'matched', 'total')[:limit]]
+
+    def report(self, title, samples, search):
+        timings = []
+        for ingredient_ids in samples:
+            started = time.perf_counter()
+            search(ingredient_ids)
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f'{title}: median {statistics.median(timings):.2f} ms, '
+            f'max {max(timings):.2f} ms')
@@ -0,0 +1,56 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.ingredient_index import IngredientIndex
+from recipe.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает автодополнение ингредиентов по индексу в памяти '
+            'с запросом name__istartswith к базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        ingredients = list(Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'))
+        if not ingredients:
+            raise CommandError('Справочник ингредиентов пуст, сначала '
+                               'выполните load_ingredients.')
+        rng = random.Random(options['seed'])
+        prefixes = [
+            name[:rng.randint(1, 4)]
+            for _, name, _ in rng.choices(ingredients, k=options['queries'])
+        ]
+        limit = options['limit']
+
+        started = time.perf_counter()
+        index = IngredientIndex(ingredients)
+        build_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for prefix in prefixes:
+            index.search(prefix, limit)
+        index_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for prefix in prefixes:
+            list(Ingredient.objects.filter(
+                name__istartswith=prefix
+            ).order_by('name').values(
+                'id', 'name', 'measurement_unit'
+            )[:limit])
+        orm_time = time.perf_counter() - started
+
+        count = len(prefixes)
+        self.stdout.write(
+            f'ingredients: {len(index)}, lookups: {count}, limit: {limit}\n'
+            f'index build: {build_time * 1000:.1f} ms\n'
+            f'index: {index_time / count * 1e6:.1f} us per lookup\n'
+            f'orm istartswith: {orm_time / count * 1e6:.1f} us per lookup'
+        )
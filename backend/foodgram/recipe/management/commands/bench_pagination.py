@@ -0,0 +1,49 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+
+from api.pagination import KeysetPagination
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку глубокой страницы /api/recipes/ при '
+            'limit/offset и keyset-пагинации. Набор данных создается '
+            'generate_dataset, например --recipes 1000000.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        page, limit = options['page'], options['limit']
+        offset = (page - 1) * limit
+        # Курсор нужной страницы - это позиция последней записи
+        # предыдущей страницы, ее достаем один раз до замеров.
+        previous = Recipe.objects.order_by(
+            *KeysetPagination.ordering)[offset - 1:offset].first()
+        if previous is None:
+            raise CommandError(f'В базе меньше {offset} рецептов.')
+        cursor = KeysetPagination().encode_cursor(previous)
+        client = APIClient(HTTP_HOST='localhost')
+        urls = {
+            'offset': f'/api/recipes/?limit={limit}&offset={offset}',
+            'keyset': f'/api/recipes/?limit={limit}&cursor={cursor}',
+        }
+        results = {}
+        for name, url in urls.items():
+            timings = []
+            for _ in range(options['iterations'] + 1):
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = [item['id'] for item in response.data['results']]
+            self.stdout.write(
+                f'{name:<7} page {page}: '
+                f'median {statistics.median(timings[1:]):.2f} ms, '
+                f'max {max(timings[1:]):.2f} ms')
+        if results['offset'] != results['keyset']:
+            self.stderr.write('Страницы offset и keyset не совпадают.')
@@ -0,0 +1,62 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.http import QueryDict
+from rest_framework.test import APIClient
+
+from api.filters import RecipeFilter
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает выборку популярных рецептов по таблице рейтинга '
+            'с наивной агрегацией избранного и корзин по всей таблице. '
+            'Набор данных создается generate_dataset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--tags', nargs='*', default=(),
+                            metavar='SLUG')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        params = QueryDict(mutable=True)
+        params.setlist('tags', options['tags'])
+        recipes = RecipeFilter(params, Recipe.objects.all()).qs
+        queries = {
+            'aggregate': lambda: list(recipes.annotate(
+                score=(Count('is_favorited', distinct=True)
+                       * settings.POPULARITY_FAVORITE_WEIGHT
+                       + Count('is_in_shopping_cart', distinct=True)
+                       * settings.POPULARITY_CART_WEIGHT),
+            ).filter(score__gt=0).order_by(
+                '-score', '-id').values_list('id', flat=True)[:limit]),
+            'score': lambda: list(recipes.filter(
+                popularity__isnull=False
+            ).order_by(
+                '-popularity__score', '-popularity__recipe_id'
+            ).values_list('id', flat=True)[:limit]),
+        }
+        for name, query in queries.items():
+            self.report(name, query, options['iterations'])
+        client = APIClient(HTTP_HOST='localhost')
+        url = f'/api/recipes/popular/?{params.urlencode()}&limit={limit}'
+        self.report('endpoint', lambda: client.get(url),
+                    options['iterations'])
+        self.stdout.write(
+            'Порядок у aggregate и score различается: aggregate не '
+            'учитывает затухание по времени.')
+
+    def report(self, name, function, iterations):
+        timings = []
+        for _ in range(iterations + 1):
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f'{name:<9}: median {statistics.median(timings[1:]):.2f} ms, '
+            f'max {max(timings[1:]):.2f} ms')
@@ -0,0 +1,68 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipe.models import Ingredient, Tag
+
+
+class Command(BaseCommand):
+    help = ('Создает и обновляет рецепт через API и считает '
+            'выполненные SQL-запросы. Все созданные данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.measure(options['ingredients'])
+            transaction.set_rollback(True)
+
+    def request(self, client, method, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data, format='json')
+        writes = [query for query in queries
+                  if not query['sql'].lstrip().upper().startswith('SELECT')]
+        self.stdout.write(
+            f'{method.upper()} {url}: status {response.status_code}, '
+            f'{len(queries)} statements ({len(writes)} writes)')
+        return response
+
+    def measure(self, ingredients_count):
+        user = User.objects.create_user(
+            username='bench_write', email='bench_write@example.com')
+        tag = Tag.objects.create(
+            name='bench_write', color='#bec0de', slug='bench_write')
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'bench_write ингредиент {number}',
+                       measurement_unit='г')
+            for number in range(ingredients_count * 2)
+        )
+        client = APIClient(HTTP_HOST='localhost')
+        client.force_authenticate(user)
+        data = {
+            'name': 'bench_write рецепт',
+            'text': 'bench',
+            'cooking_time': 10,
+            'tags': [tag.id],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 1}
+                for ingredient in ingredients[:ingredients_count]
+            ],
+        }
+        response = self.request(client, 'post', '/api/recipes/', data)
+        url = f"/api/recipes/{response.data['id']}/"
+        self.request(client, 'put', url, data)
+        # Меняем количество у пятой части, пятую часть заменяем новыми.
+        part = max(ingredients_count // 5, 1)
+        data['ingredients'] = (
+            [{'id': ingredient.id, 'amount': 2}
+             for ingredient in ingredients[:part]]
+            + [{'id': ingredient.id, 'amount': 1}
+               for ingredient in ingredients[part:ingredients_count - part]]
+            + [{'id': ingredient.id, 'amount': 1}
+               for ingredient in ingredients[
+                   ingredients_count:ingredients_count + part]]
+        )
+        self.request(client, 'put', url, data)
@@ -0,0 +1,82 @@
+import resource
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipe.models import Ingredient, IngredientsRecipe, Recipe, ShoppingList
+
+
+class Command(BaseCommand):
+    help = ('Собирает синтетическую корзину и замеряет выгрузку '
+            'списка покупок: число запросов, пик памяти и время. '
+            'Все созданные данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=10,
+                            help='Ингредиентов в каждом рецепте.')
+        parser.add_argument('--url',
+                            default='/api/recipes/download_shopping_cart/')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.build_cart(options['recipes'],
+                                   options['ingredients'])
+            self.measure(user, options['url'])
+            transaction.set_rollback(True)
+
+    def build_cart(self, recipes_count, ingredients_count):
+        user = User.objects.create_user(
+            username='bench_cart', email='bench_cart@example.com')
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'bench ингредиент {number}',
+                       measurement_unit='г')
+            for number in range(ingredients_count * 4)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=user, name=f'bench рецепт {number}',
+                   image='bench.png', text='bench', cooking_time=1)
+            for number in range(recipes_count)
+        )
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(
+                recipe=recipe,
+                ingredient=ingredients[(number + offset) % len(ingredients)],
+                amount=offset + 1)
+            for number, recipe in enumerate(recipes)
+            for offset in range(ingredients_count)
+        )
+        ShoppingList.objects.bulk_create(
+            ShoppingList(user=user, recipe=recipe) for recipe in recipes)
+        return user
+
+    def measure(self, user, url):
+        client = APIClient(HTTP_HOST='localhost')
+        client.force_authenticate(user)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+            if response.streaming:
+                size = sum(len(chunk)
+                           for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+        elapsed = time.perf_counter() - started
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(
+            f'status: {response.status_code}\n'
+            f'size: {size} bytes\n'
+            f'queries: {len(queries)}\n'
+            f'wall time: {elapsed * 1000:.1f} ms\n'
+            f'python peak allocation: {traced_peak / 1024:.0f} KiB\n'
+            f'peak RSS: {rss_after} KiB (+{rss_after - rss_before} KiB)'
+        )
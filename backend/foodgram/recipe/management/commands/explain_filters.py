@@ -0,0 +1,75 @@
+from itertools import combinations
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from recipe.models import FavoritesRecipe, Ingredient, Recipe, Tag
+
+RECIPE_FILTERS = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+
+
+class Command(BaseCommand):
+    help = ('Печатает EXPLAIN для каждого сочетания фильтров RecipeFilter '
+            'и для поиска ингредиентов по началу названия. '
+            'Использует данные, уже загруженные в базу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username пользователя, от '
+                            'имени которого строятся запросы.')
+        parser.add_argument('--prefix', help='Начало названия ингредиента.')
+        parser.add_argument('--analyze', action='store_true',
+                            help='EXPLAIN ANALYZE (только PostgreSQL).')
+
+    def handle(self, *args, **options):
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        user = self.get_user(options['user'])
+        request = SimpleNamespace(user=user)
+        tag = Tag.objects.first()
+        recipe = Recipe.objects.first()
+        if tag is None or recipe is None:
+            raise CommandError('Нет рецептов или тегов, сначала '
+                               'загрузите данные.')
+        values = {
+            'tags': tag.slug,
+            'author': recipe.author_id,
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+        }
+        for size in range(len(RECIPE_FILTERS) + 1):
+            for names in combinations(RECIPE_FILTERS, size):
+                data = QueryDict(mutable=True)
+                data.update({name: values[name] for name in names})
+                queryset = RecipeFilter(
+                    data, queryset=Recipe.objects.all(), request=request).qs
+                self.print_plan(f'recipes {data.urlencode()}',
+                                queryset, explain_options)
+
+        prefix = options['prefix']
+        if prefix is None:
+            ingredient = Ingredient.objects.first()
+            prefix = ingredient.name[:2] if ingredient else 'а'
+        queryset = Ingredient.objects.filter(name__istartswith=prefix)
+        self.print_plan(f'ingredients name__istartswith={prefix}',
+                        queryset, explain_options)
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+        favorite = FavoritesRecipe.objects.select_related('user').first()
+        if favorite is not None:
+            return favorite.user
+        user = User.objects.first()
+        if user is None:
+            raise CommandError('В базе нет пользователей')
+        return user
+
+    def print_plan(self, title, queryset, explain_options):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(queryset.explain(**explain_options))
+        self.stdout.write('')
@@ -0,0 +1,137 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipe.counters import recount_profiles, recount_recipes
+from recipe.management.utils import batched, create_fake_recipes
+from recipe.models import (FavoritesRecipe, Follow, Ingredient, Recipe,
+                           ShoppingList, Tag)
+from recipe.popularity import recompute_scores
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Создает детерминированный синтетический набор данных: '
+            'пользователей, подписки, рецепты с ингредиентами, избранное '
+            'и корзины. Все вставки - пачками через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--favorites', type=int, default=100000,
+                            help='Всего записей в избранном.')
+        parser.add_argument('--carts', type=int, default=10,
+                            help='Рецептов в корзине пользователя.')
+        parser.add_argument('--prefix', default='bench',
+                            help='Префикс имен пользователей и рецептов.')
+        parser.add_argument('--password', default='bench-password')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Набор с префиксом {prefix} уже создан, '
+                               'укажите другой --prefix.')
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', verbosity=0)
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS)
+
+        user_ids = self.step('users', self.create_users, prefix,
+                             options['users'], options['password'])
+        self.step('recipes', create_fake_recipes,
+                  list(User.objects.filter(id__in=user_ids).order_by('id')),
+                  options['recipes'], f'{prefix} рецепт',
+                  batch_size=min(self.batch_size, 1000),
+                  seed=options['seed'])
+        recipe_ids = list(Recipe.objects.filter(
+            name__startswith=f'{prefix} рецепт '
+        ).order_by('id').values_list('id', flat=True))
+        self.step('follows', self.create_pairs, Follow, 'author_id',
+                  user_ids, user_ids, options['follows'])
+        self.step('favorites', self.create_pairs, FavoritesRecipe,
+                  'recipe_id', user_ids, recipe_ids,
+                  options['favorites'] // max(len(user_ids), 1))
+        self.step('shopping carts', self.create_pairs, ShoppingList,
+                  'recipe_id', user_ids, recipe_ids, options['carts'])
+        self.step('counters', self.recount_counters, prefix)
+        self.step('popularity', recompute_scores, self.batch_size)
+
+    def step(self, title, function, *args, **kwargs):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        count = result if isinstance(result, int) else len(result)
+        self.stdout.write(f'{title}: {count} rows in '
+                          f'{time.perf_counter() - started:.2f} s')
+        return result
+
+    def recount_counters(self, prefix):
+        """bulk_create не обновляет счетчики, пересчитываем их разом."""
+        return recount_profiles(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        )) + recount_recipes(Recipe.objects.filter(
+            name__startswith=f'{prefix} рецепт '))
+
+    def create_users(self, prefix, count, password):
+        password = make_password(password, salt=prefix)
+        for numbers in batched(range(count), self.batch_size):
+            User.objects.bulk_create(
+                User(username=f'{prefix}_{number}',
+                     email=f'{prefix}_{number}@example.com',
+                     first_name='Имя', last_name=f'Фамилия {number}',
+                     password=password)
+                for number in numbers
+            )
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_pairs(self, model, target_field, user_ids, target_ids,
+                     per_user):
+        """
+        По per_user различных целей на пользователя. На себя самого
+        подписаться нельзя, поэтому берется одна цель про запас.
+        Избранное и корзины получают время создания за последний месяц.
+        """
+        per_user = min(per_user, len(target_ids) - 1)
+        if per_user <= 0:
+            return 0
+        now = timezone.now()
+
+        def rows():
+            for user_id in user_ids:
+                targets = [
+                    target_id for target_id in self.rng.sample(
+                        target_ids, per_user + 1)
+                    if model is not Follow or target_id != user_id
+                ]
+                for target_id in targets[:per_user]:
+                    row = model(user_id=user_id, **{target_field: target_id})
+                    if model is not Follow:
+                        row.created = now - timedelta(
+                            days=self.rng.uniform(0, 30))
+                    yield row
+
+        created = 0
+        for batch in batched(rows(), self.batch_size):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+        return created
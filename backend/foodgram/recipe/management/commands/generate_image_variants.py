@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe.images import run_in_worker
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Строит миниатюры (IMAGE_VARIANTS, JPEG и WebP) для картинок '
+            'рецептов, у которых их еще нет, в несколько потоков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Перестроить и уже готовые миниатюры.')
+        parser.add_argument('--workers', type=int,
+                            default=max(settings.IMAGE_WORKERS, 1))
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['force']:
+            recipes = recipes.filter(image_variants={})
+        started = time.perf_counter()
+        total, generated, last_id = 0, 0, 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                recipe_ids = list(recipes.filter(id__gt=last_id).order_by(
+                    'id').values_list('id', flat=True)[:options['batch_size']])
+                if not recipe_ids:
+                    break
+                generated += sum(executor.map(run_in_worker, recipe_ids))
+                total += len(recipe_ids)
+                last_id = recipe_ids[-1]
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'processed recipes: {total}')
+        if options['verbosity']:
+            self.stdout.write(
+                f'image variants: {generated} of {total} recipes in '
+                f'{time.perf_counter() - started:.2f} s')
@@ -0,0 +1,106 @@
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.management.utils import batched, create_fake_recipes, iter_rows
+from recipe.models import Ingredient, Tag
+from recipe.reference import invalidate_reference_data
+
+DEFAULT_PATH = settings.BASE_DIR / 'data' / 'ingredients.csv'
+
+
+class Command(BaseCommand):
+    help = ('Загружает справочник ингредиентов из CSV (name,unit без '
+            'заголовка) или JSON пачками через bulk_create. Может также '
+            'загрузить теги и создать тестовые рецепты для нагрузочных '
+            'тестов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            help='По умолчанию определяется по расширению.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--update', action='store_true',
+                            help='Обновлять measurement_unit у уже '
+                                 'существующих ингредиентов.')
+        parser.add_argument('--skip-ingredients', action='store_true')
+        parser.add_argument('--tags', metavar='PATH',
+                            help='CSV (name,color,slug) или JSON с тегами.')
+        parser.add_argument('--fake-recipes', type=int, default=0,
+                            metavar='N', help='Создать N тестовых рецептов.')
+        parser.add_argument('--author', default='loadtest',
+                            help='username автора тестовых рецептов.')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        batch_size = options['batch_size']
+        if not options['skip_ingredients']:
+            self.load(
+                'ingredients', options['path'], options['format'],
+                ('name', 'measurement_unit'),
+                lambda rows: self.save_ingredients(rows, options['update']),
+                batch_size)
+        if options['tags']:
+            self.load(
+                'tags', options['tags'], None, ('name', 'color', 'slug'),
+                lambda rows: Tag.objects.bulk_create(
+                    (Tag(**row) for row in rows), ignore_conflicts=True),
+                batch_size)
+        # bulk_create не отправляет сигналы, справочники сбрасываются явно.
+        if not options['skip_ingredients'] or options['tags']:
+            invalidate_reference_data()
+        if options['fake_recipes']:
+            self.fake_recipes(options['fake_recipes'], options['author'],
+                              batch_size)
+
+    def load(self, title, path, format, fields, save, batch_size):
+        started = time.perf_counter()
+        total = 0
+        try:
+            for rows in batched(iter_rows(path, fields, format), batch_size):
+                save(rows)
+                total += len(rows)
+                if self.verbosity > 1:
+                    self.report(title, total, started)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'{path}: {error}')
+        self.report(title, total, started)
+
+    def save_ingredients(self, rows, update):
+        if not update:
+            return Ingredient.objects.bulk_create(
+                (Ingredient(**row) for row in rows), ignore_conflicts=True)
+        # В одном INSERT ... ON CONFLICT DO UPDATE строка не может
+        # обновиться дважды, поэтому дубли внутри пачки схлопываются.
+        unique = {row['name']: row for row in rows}
+        return Ingredient.objects.bulk_create(
+            (Ingredient(**row) for row in unique.values()),
+            update_conflicts=True,
+            unique_fields=('name',),
+            update_fields=('measurement_unit',),
+        )
+
+    def fake_recipes(self, count, username, batch_size):
+        author, _ = User.objects.get_or_create(
+            username=username,
+            defaults={'email': f'{username}@example.com'})
+        started = time.perf_counter()
+        try:
+            created = create_fake_recipes(
+                [author], count, f'Тестовый рецепт {uuid4().hex[:8]}',
+                batch_size=min(batch_size, 1000))
+        except ValueError as error:
+            raise CommandError(error)
+        self.report('fake recipes', created, started)
+
+    def report(self, title, total, started):
+        if not self.verbosity:
+            return
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{title}: {total} rows in {elapsed:.2f} s '
+            f'({rate:.0f} rows/s)')
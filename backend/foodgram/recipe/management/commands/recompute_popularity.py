@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe.popularity import recompute_scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинг популярности рецептов по избранному и '
+            'корзинам пачками рецептов. Нужен после миграции, массовой '
+            'загрузки данных и смены настроек POPULARITY_*.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        scored = recompute_scores(options['batch_size'])
+        if options['verbosity']:
+            self.stdout.write(
+                f'scored recipes: {scored} in '
+                f'{time.perf_counter() - started:.2f} s')
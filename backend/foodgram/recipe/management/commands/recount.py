@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe.counters import recount_profiles, recount_recipes
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счетчики рецептов '
+            '(favorites_count, shopping_cart_count) и профилей '
+            '(recipes_count, followers_count), создает недостающие '
+            'профили. Исправляются только разошедшиеся строки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for title, function in (('recipes', recount_recipes),
+                                ('profiles', recount_profiles)):
+            started = time.perf_counter()
+            fixed = function(batch_size=options['batch_size'])
+            if options['verbosity']:
+                self.stdout.write(
+                    f'{title}: {fixed} rows fixed in '
+                    f'{time.perf_counter() - started:.2f} s')
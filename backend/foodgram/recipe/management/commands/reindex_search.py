@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe.search import reindex
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает поисковые документы рецептов (текст, '
+            'ингредиенты, теги) пачками. Нужен после миграции 0005_search '
+            'и правок данных в обход API и админки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        indexed = reindex(options['batch_size'])
+        if options['verbosity']:
+            self.stdout.write(
+                f'indexed recipes: {indexed} in '
+                f'{time.perf_counter() - started:.2f} s')
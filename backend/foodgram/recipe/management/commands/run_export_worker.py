@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.exports import claim_job, cleanup_expired, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Выполняет задания фоновой выгрузки списка покупок '
+            '(api.exports) в несколько потоков и удаляет просроченные '
+            'выгрузки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help='Заданий одновременно.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Пауза в секундах, когда очередь пуста.')
+        parser.add_argument('--cleanup-interval', type=float, default=60.0,
+                            help='Как часто удалять просроченные выгрузки.')
+        parser.add_argument('--once', action='store_true',
+                            help='Выйти, когда очередь опустеет.')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        started = time.perf_counter()
+        deleted = cleanup_expired()
+        with ThreadPoolExecutor(max_workers=options['concurrency'],
+                                thread_name_prefix='export') as executor:
+            workers = [executor.submit(self.work, stop, options)
+                       for _ in range(options['concurrency'])]
+            try:
+                while True:
+                    done, _ = wait(workers,
+                                   timeout=options['cleanup_interval'],
+                                   return_when=FIRST_EXCEPTION)
+                    if done:
+                        break
+                    deleted += self.cleanup()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                stop.set()
+        connections.close_all()
+        results = [worker.result() for worker in workers]
+        if options['verbosity']:
+            self.stdout.write(
+                f'export jobs: {sum(done for done, _ in results)} done, '
+                f'{sum(failed for _, failed in results)} failed, '
+                f'{deleted} expired removed in '
+                f'{time.perf_counter() - started:.2f} s')
+
+    def cleanup(self):
+        try:
+            return cleanup_expired()
+        except Exception:
+            logger.exception('Не удалось удалить просроченные выгрузки')
+            return 0
+        finally:
+            connections.close_all()
+
+    def work(self, stop, options):
+        """Цикл одного потока: (готово, не удалось)."""
+        done = failed = 0
+        try:
+            while not stop.is_set():
+                try:
+                    job = claim_job()
+                    if job is not None:
+                        if run_job(job):
+                            done += 1
+                        else:
+                            failed += 1
+                except Exception:
+                    # Например, потеряно соединение с базой: задание
+                    # вернется в очередь по SHOPPING_CART_EXPORT_TIMEOUT.
+                    logger.exception('Ошибка воркера выгрузок')
+                    connections.close_all()
+                    job = None
+                if job is None:
+                    if options['once']:
+                        break
+                    stop.wait(options['poll_interval'])
+        finally:
+            connections.close_all()
+        return done, failed
@@ -0,0 +1,121 @@
+import csv
+import json
+import random
+import re
+from collections import Counter
+from itertools import islice
+
+from recipe.cook_index import invalidate_cook_index
+from recipe.counters import change_profile_counter
+from recipe.models import Ingredient, IngredientsRecipe, Recipe, Tag
+from recipe.search import update_search_documents
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Пробелы и разделители перед очередным объектом JSON-массива.
+JSON_SEPARATORS = re.compile(r'[\s\[,]*')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def iter_csv(file, fields):
+    """Строки CSV без заголовка как словари с ключами fields."""
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fields, (value.strip() for value in row)))
+
+
+def iter_json(file):
+    """
+    Объекты из JSON-массива или JSON Lines, прочитанные по частям,
+    чтобы не держать в памяти весь файл.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer += chunk
+        # Буфер читается по смещению и обрезается раз на часть файла, а
+        # не копируется после каждого объекта.
+        position = 0
+        while True:
+            position = JSON_SEPARATORS.match(buffer, position).end()
+            if position == len(buffer) or buffer[position] == ']':
+                break
+            try:
+                value, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield value
+        buffer = buffer[position:]
+        if not chunk:
+            return
+
+
+def iter_rows(path, fields, format=None):
+    """Словари из CSV или JSON файла; формат берется из расширения."""
+    if format is None:
+        format = 'csv' if str(path).endswith('.csv') else 'json'
+    with open(path, encoding='utf-8', newline='') as file:
+        if format == 'csv':
+            yield from iter_csv(file, fields)
+            return
+        for value in iter_json(file):
+            # В выгрузках бывают служебные объекты вроде {"model": ...}.
+            if isinstance(value, dict) and fields[0] in value:
+                yield {field: value.get(field) for field in fields}
+
+
+def create_fake_recipes(authors, count, prefix, batch_size=1000,
+                        ingredients_per_recipe=(3, 12), seed=None):
+    """
+    Создает count рецептов с тегами и ингредиентами пачками через
+    bulk_create. Названия - f'{prefix} {номер}', уникальность префикса
+    на совести вызывающего кода. Возвращает число созданных рецептов.
+    """
+    rng = random.Random(seed)
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    if not ingredient_ids:
+        raise ValueError('Справочник ингредиентов пуст')
+    low, high = ingredients_per_recipe
+    high = min(high, len(ingredient_ids))
+    low = min(low, high)
+    RecipeTag = Recipe.tags.through
+    created = 0
+    per_author = Counter()
+    for numbers in batched(range(count), batch_size):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=rng.choice(authors),
+                   name=f'{prefix} {number}'[:50],
+                   text=f'Описание рецепта {number}',
+                   cooking_time=rng.randint(5, 180))
+            for number in numbers
+        )
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                              amount=rng.randint(1, 500))
+            for recipe in recipes
+            for ingredient_id in rng.sample(ingredient_ids,
+                                            rng.randint(low, high))
+        )
+        if tag_ids:
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in rng.sample(
+                    tag_ids, rng.randint(1, min(3, len(tag_ids))))
+            )
+        update_search_documents([recipe.id for recipe in recipes])
+        created += len(recipes)
+        per_author.update(recipe.author_id for recipe in recipes)
+    for author_id, total in per_author.items():
+        change_profile_counter(author_id, 'recipes_count', total)
+    invalidate_cook_index()
+    return created
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:12
+
+from django.db import migrations, models
+from django.db.models import Min
+
+# Уникальное имя ингредиента уже дает в PostgreSQL индекс
+# varchar_pattern_ops для name__startswith. Для регистронезависимого
+# поиска (UPPER(name) LIKE UPPER('abc%')) нужен индекс по выражению.
+INGREDIENT_UPPER_NAME_INDEX = 'ingredient_upper_name_prefix_idx'
+
+
+def remove_duplicate_ingredients(apps, schema_editor):
+    IngredientsRecipe = apps.get_model('recipe', 'IngredientsRecipe')
+    duplicates = IngredientsRecipe.objects.values(
+        'recipe', 'ingredient'
+    ).annotate(first_id=Min('id')).values('first_id')
+    IngredientsRecipe.objects.exclude(id__in=duplicates).delete()
+
+
+def create_upper_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INGREDIENT_UPPER_NAME_INDEX} '
+        'ON recipe_ingredient (UPPER(name) text_pattern_ops)'
+    )
+
+
+def drop_upper_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'DROP INDEX IF EXISTS {INGREDIENT_UPPER_NAME_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favoritesrecipe',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follow_author_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['pub_date', 'id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['recipe', 'user'], name='cart_recipe_user_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredientsrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.RunPython(
+            create_upper_name_index, drop_upper_name_index),
+    ]
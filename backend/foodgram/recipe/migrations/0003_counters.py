@@ -0,0 +1,75 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field, outer='pk'):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Profile = apps.get_model('recipe', 'Profile')
+    Recipe = apps.get_model('recipe', 'Recipe')
+    FavoritesRecipe = apps.get_model('recipe', 'FavoritesRecipe')
+    ShoppingList = apps.get_model('recipe', 'ShoppingList')
+    Follow = apps.get_model('recipe', 'Follow')
+    Profile.objects.bulk_create((
+        Profile(user_id=user_id)
+        for user_id in User.objects.values_list('id', flat=True)
+    ), batch_size=1000)
+    Profile.objects.update(
+        recipes_count=count_of(Recipe, 'author', 'user_id'),
+        followers_count=count_of(Follow, 'author', 'user_id'),
+    )
+    Recipe.objects.update(
+        favorites_count=count_of(FavoritesRecipe, 'recipe'),
+        shopping_cart_count=count_of(ShoppingList, 'recipe'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipe', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipes_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['favorites_count', 'id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
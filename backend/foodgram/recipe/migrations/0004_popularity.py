@@ -0,0 +1,36 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favoritesrecipe',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='RecipeScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='recipe.recipe')),
+                ('score', models.FloatField(default=0)),
+                ('events', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score', '-recipe'], name='recipe_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:32
+
+from django.db import migrations, models
+
+# Индекс поиска живет вне моделей, см. recipe.search. Документы
+# существующих рецептов заполняет команда reindex_search.
+SEARCH_VECTOR_INDEX = 'recipe_search_vector_idx'
+FTS_TABLE = 'recipe_recipe_fts'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipe_recipe ADD COLUMN search_vector tsvector '
+            'GENERATED ALWAYS AS ('
+            "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(search_document, "
+            "'')), 'B')) STORED"
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_VECTOR_INDEX} ON recipe_recipe '
+            'USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            "name, document, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipe_recipe DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0004_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 
@@ -38,16 +39,62 @@ class Recipe(models.Model):
         User, on_delete=models.CASCADE, related_name='author')
     name = models.CharField(max_length=50, unique=True)
     image = models.ImageField()
+    # Миниатюры картинки {вариант: {формат: имя файла}}, см. recipe.images.
+    image_variants = models.JSONField(default=dict, editable=False)
     text = models.CharField(max_length=1000)
     tags = models.ManyToManyField(Tag, related_name='recipes')
     cooking_time = models.PositiveIntegerField()
     pub_date = models.DateTimeField(auto_now_add=True)
+    # Денормализованные счетчики, см. recipe.counters.
+    favorites_count = models.PositiveIntegerField(default=0)
+    shopping_cart_count = models.PositiveIntegerField(default=0)
+    # Текст, ингредиенты и теги для полнотекстового поиска, см. recipe.search.
+    search_document = models.TextField(default='', editable=False)
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=['pub_date', 'id'],
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=['favorites_count', 'id'],
+                         name='recipe_favorites_count_idx'),
+        )
+
+
+class Profile(models.Model):
+    """
+    Счетчики пользователя, которые иначе пришлось бы считать COUNT
+    на каждую строку списка. См. recipe.counters.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='profile')
+    recipes_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.user.username
+
+
+class RecipeScore(models.Model):
+    """Рейтинг популярности рецепта, см. recipe.popularity."""
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True,
+        related_name='popularity')
+    # log2 суммы весов событий.
+    score = models.FloatField(default=0)
+    events = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.score}'
+
+    class Meta:
+        indexes = (
+            models.Index(fields=['-score', '-recipe'],
+                         name='recipe_score_idx'),
+        )
 
 
 class FavoritesRecipe(models.Model):
@@ -55,6 +102,7 @@ class FavoritesRecipe(models.Model):
         User, on_delete=models.CASCADE, related_name='owner')
     recipe = models.ForeignKey(
         Recipe, related_name='is_favorited', on_delete=models.CASCADE)
+    created = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return self.user.username
@@ -68,6 +116,10 @@ class FavoritesRecipe(models.Model):
                 name='unique_user_recipes'
             ),
         )
+        indexes = (
+            models.Index(fields=['recipe', 'user'],
+                         name='favorite_recipe_user_idx'),
+        )
 
 
 class Follow(models.Model):
@@ -96,6 +148,10 @@ class Follow(models.Model):
                 name='unique_user_author'
             ),
         )
+        indexes = (
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        )
 
 
 class ShoppingList(models.Model):
@@ -103,6 +159,7 @@ class ShoppingList(models.Model):
                              on_delete=models.CASCADE)
     recipe = models.ForeignKey(
         Recipe, related_name='is_in_shopping_cart', on_delete=models.CASCADE)
+    created = models.DateTimeField(default=timezone.now)
 
     def __str__(self) -> str:
         return f'{self.user.username} {self.recipe}'
@@ -114,6 +171,10 @@ class ShoppingList(models.Model):
                 name='unique_user_recipe'
             ),
         ]
+        indexes = (
+            models.Index(fields=['recipe', 'user'],
+                         name='cart_recipe_user_idx'),
+        )
 
 
 class IngredientsRecipe(models.Model):
@@ -126,3 +187,61 @@ class IngredientsRecipe(models.Model):
 
     def __str__(self):
         return f'{self.ingredient} {self.recipe}'
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            ),
+        )
+
+
+class ExportJob(models.Model):
+    """
+    Фоновая выгрузка списка покупок, см. api.exports. Задание на одну
+    версию корзины и формат одно: повторные запросы получают его же.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='export_jobs')
+    format = models.CharField(max_length=10)
+    cart_version = models.CharField(max_length=32)
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=PENDING)
+    file = models.FileField(upload_to='exports/', blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    expires = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.user_id} {self.format} {self.status}'
+
+    class Meta:
+        verbose_name = ('Выгрузка списка покупок')
+        verbose_name_plural = ('Выгрузки списка покупок')
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'cart_version', 'format'],
+                name='unique_export_job'
+            ),
+        )
+        indexes = (
+            models.Index(fields=['status', 'created'],
+                         name='export_job_status_idx'),
+            models.Index(fields=['expires'],
+                         name='export_job_expires_idx'),
+        )
@@ -0,0 +1,227 @@
+"""
+Рейтинг популярности рецептов с затуханием по времени.
+
+Событие (добавление в избранное или корзину) в момент t вносит в
+рейтинг вес w * 2 ** ((t - POPULARITY_EPOCH) / half_life). Вместо того
+чтобы уменьшать старые рейтинги, растут веса новых событий, поэтому
+порядок рецептов по сумме весов совпадает с порядком по затухшему
+рейтингу.
+
+Веса растут экспоненциально и за годы переполнили бы float, поэтому
+RecipeScore.score хранит двоичный логарифм суммы весов: он растет
+линейно, а порядок по нему тот же. Событие с логарифмом веса l - это
+один UPDATE: добавление score = max(score, l) + log2(1 + 2 ** -|score -
+l|), удаление score = score + log2(1 - 2 ** (l - score)).
+
+RecipeScore.events - число учтенных событий: удаление последних событий
+рецепта удаляет его строку (отдельным DELETE), и рецепт пропадает из
+популярных. По самому рейтингу этого не понять: остаток после
+вычитания - погрешность float, а не оставшиеся события.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (Case, F, FloatField, IntegerField, Value,
+                              When)
+from django.db.models.functions import Abs, Greatest, Least, Log, Power
+
+from recipe.models import FavoritesRecipe, Recipe, RecipeScore, ShoppingList
+
+EVENTS = (
+    (FavoritesRecipe, 'POPULARITY_FAVORITE_WEIGHT'),
+    (ShoppingList, 'POPULARITY_CART_WEIGHT'),
+)
+
+# Доля рейтинга, которая остается после удаления событий, если из-за
+# погрешности float снимаемый вес оказался не меньше рейтинга.
+MIN_REMAINDER = 2.0 ** -52
+
+
+def log_weight(model, at):
+    """log2 веса события model в момент at; None при нулевом весе."""
+    weight = getattr(settings, dict(EVENTS)[model])
+    if weight <= 0:
+        return None
+    half_life = timedelta(days=settings.POPULARITY_HALF_LIFE_DAYS)
+    return math.log2(weight) + (at - settings.POPULARITY_EPOCH) / half_life
+
+
+def log_sum(values):
+    """log2 суммы 2 ** value без переполнения; None для пустой суммы."""
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    top = max(values)
+    return top + math.log2(sum(2.0 ** (value - top) for value in values))
+
+
+def added(score, weight):
+    """Выражение log2(2 ** score + 2 ** weight)."""
+    return Greatest(score, weight) + Log(
+        2.0, 1.0 + Power(2.0, -Abs(score - weight)))
+
+
+def removed(score, weight):
+    """
+    Выражение log2(2 ** score - 2 ** weight), не ниже MIN_REMAINDER от
+    score. Вес больше рейтинга (рейтинг разошелся с событиями) не
+    переполняет POWER.
+    """
+    return score + Log(2.0, Greatest(
+        1.0 - Power(2.0, Least(weight - score, 0.0)), Value(MIN_REMAINDER)))
+
+
+def total(weights):
+    """(log2 суммы весов, число событий) или None, если веса нулевые."""
+    weights = [weight for weight in weights if weight is not None]
+    if not weights:
+        return None
+    return log_sum(weights), len(weights)
+
+
+def remove_events(scores, weight, events):
+    """
+    Снимает с рейтингов scores вес weight и events событий (выражения).
+    Строки, у которых не останется событий, удаляются.
+    """
+    scores.filter(events__lte=events).delete()
+    scores.update(score=removed(F('score'), weight),
+                  events=F('events') - events)
+
+
+def add_events(scores, weight, events):
+    return scores.update(score=added(F('score'), weight),
+                         events=F('events') + events)
+
+
+def change_score(recipe_id, weights, remove=False):
+    """
+    Добавляет к рейтингу рецепта или снимает (remove) события с log2
+    весов weights.
+    """
+    change = total(weights)
+    if change is None:
+        return
+    weight, events = Value(change[0]), Value(change[1])
+    scores = RecipeScore.objects.filter(recipe_id=recipe_id)
+    if remove:
+        remove_events(scores, weight, events)
+        return
+    if add_events(scores, weight, events):
+        return
+    try:
+        with transaction.atomic():
+            RecipeScore.objects.create(
+                recipe_id=recipe_id, score=change[0], events=change[1])
+    except IntegrityError:
+        # Строку успел создать параллельный запрос.
+        add_events(scores, weight, events)
+
+
+def change_scores(weights, remove=False):
+    """
+    Изменения рейтинга нескольких рецептов {id рецепта: log2 весов
+    событий}: один UPDATE с CASE (при удалении - еще DELETE строк без
+    событий) и вставка недостающих строк.
+    """
+    changes = {recipe_id: total(values)
+               for recipe_id, values in weights.items()}
+    changes = {recipe_id: change for recipe_id, change in changes.items()
+               if change is not None}
+    if not changes:
+        return
+    existing = set(RecipeScore.objects.filter(
+        recipe_id__in=changes).values_list('recipe_id', flat=True))
+    if existing:
+        weight = Case(
+            *(When(recipe_id=recipe_id, then=Value(changes[recipe_id][0]))
+              for recipe_id in existing),
+            output_field=FloatField(),
+        )
+        events = Case(
+            *(When(recipe_id=recipe_id, then=Value(changes[recipe_id][1]))
+              for recipe_id in existing),
+            output_field=IntegerField(),
+        )
+        scores = RecipeScore.objects.filter(recipe_id__in=existing)
+        if remove:
+            remove_events(scores, weight, events)
+        else:
+            add_events(scores, weight, events)
+    if remove:
+        return
+    # Строку, созданную параллельно, пропускаем: ее вклад восстановит
+    # recompute_popularity.
+    RecipeScore.objects.bulk_create(
+        (RecipeScore(recipe_id=recipe_id, score=score, events=events)
+         for recipe_id, (score, events) in changes.items()
+         if recipe_id not in existing),
+        ignore_conflicts=True,
+    )
+
+
+def event_added(model, recipe_id, at):
+    change_score(recipe_id, (log_weight(model, at), ))
+
+
+def events_removed(model, recipe_id, created):
+    """Снимает вклад удаленных событий с моментами создания created."""
+    change_score(recipe_id, [log_weight(model, at) for at in created],
+                 remove=True)
+
+
+def batch_events_added(model, recipe_ids, at):
+    weight = log_weight(model, at)
+    change_scores({recipe_id: (weight, ) for recipe_id in recipe_ids})
+
+
+def batch_events_removed(model, rows):
+    """rows - пары (id рецепта, момент создания) удаленных событий."""
+    weights = {}
+    for recipe_id, created in rows:
+        weights.setdefault(recipe_id, []).append(log_weight(model, created))
+    change_scores(weights, remove=True)
+
+
+def recompute_scores(batch_size=1000):
+    """
+    Пересчитывает рейтинг всех рецептов по событиям пачками рецептов.
+    Возвращает число рецептов с ненулевым рейтингом.
+    """
+    scored = 0
+    recipe_ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+    batch = []
+    for recipe_id in recipe_ids.iterator(chunk_size=batch_size):
+        batch.append(recipe_id)
+        if len(batch) == batch_size:
+            scored += recompute_batch(batch)
+            batch = []
+    if batch:
+        scored += recompute_batch(batch)
+    return scored
+
+
+def recompute_batch(recipe_ids):
+    weights = {}
+    for model, _ in EVENTS:
+        for recipe_id, created in model.objects.filter(
+                recipe_id__in=recipe_ids).values_list('recipe_id', 'created'):
+            weights.setdefault(recipe_id, []).append(
+                log_weight(model, created))
+    scores = {recipe_id: total(values)
+              for recipe_id, values in weights.items()}
+    scores = {recipe_id: score for recipe_id, score in scores.items()
+              if score is not None}
+    with transaction.atomic():
+        RecipeScore.objects.filter(recipe_id__in=recipe_ids).exclude(
+            recipe_id__in=scores).delete()
+        RecipeScore.objects.bulk_create(
+            (RecipeScore(recipe_id=recipe_id, score=score, events=events)
+             for recipe_id, (score, events) in scores.items()),
+            update_conflicts=True,
+            unique_fields=('recipe', ),
+            update_fields=('score', 'events'),
+        )
+    return len(scores)
@@ -0,0 +1,88 @@
+"""
+Справочники тегов и ингредиентов в памяти процесса.
+
+Справочники меняются редко (админка, load_ingredients), поэтому каждый
+процесс держит их целиком и сверяет версию в общем кэше. Сигналы
+post_save и post_delete меняют версию после коммита, и все воркеры
+перечитывают справочники при следующем обращении. Версия служит и
+ETag ответов со справочниками.
+"""
+import threading
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from recipe.models import Ingredient, Tag
+
+VERSION_KEY = 'reference:version'
+
+
+class ReferenceData:
+    """Теги по id и slug, ингредиенты по id, в порядке id."""
+
+    def __init__(self, version, tags, ingredients):
+        self.version = version
+        self.tags = {tag.id: tag for tag in tags}
+        self.tags_by_slug = {tag.slug: tag for tag in self.tags.values()}
+        self.ingredients = {
+            ingredient.id: ingredient for ingredient in ingredients}
+        self.memo = {}
+
+    def tag_choices(self):
+        return [(tag.slug, tag.name) for tag in self.tags.values()]
+
+    def memoize(self, key, build):
+        """Значение build(), посчитанное один раз для этой версии."""
+        if key not in self.memo:
+            self.memo[key] = build()
+        return self.memo[key]
+
+
+_lock = threading.Lock()
+_data = None
+
+
+def get_version():
+    return cache.get_or_set(VERSION_KEY, lambda: uuid4().hex, None)
+
+
+def get_reference_data():
+    """
+    Справочники текущего процесса. Перечитываются из базы, если версия
+    в кэше изменилась, в том числе из другого воркера.
+    """
+    global _data
+    version = get_version()
+    if _data is not None and _data.version == version:
+        return _data
+    with _lock:
+        if _data is None or _data.version != version:
+            _data = ReferenceData(
+                version,
+                Tag.objects.order_by('id'),
+                Ingredient.objects.order_by('id').iterator(),
+            )
+    return _data
+
+
+async def aget_reference_data():
+    """get_reference_data для асинхронных представлений."""
+    global _data
+    version = await cache.aget_or_set(VERSION_KEY, lambda: uuid4().hex, None)
+    data = _data
+    if data is not None and data.version == version:
+        return data
+    data = ReferenceData(
+        version,
+        [tag async for tag in Tag.objects.order_by('id')],
+        [ingredient async for ingredient in Ingredient.objects.order_by('id')],
+    )
+    with _lock:
+        _data = data
+    return data
+
+
+def invalidate_reference_data():
+    transaction.on_commit(
+        lambda: cache.set(VERSION_KEY, uuid4().hex, None))
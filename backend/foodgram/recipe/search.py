@@ -0,0 +1,125 @@
+"""
+Полнотекстовый поиск рецептов.
+
+Recipe.search_document хранит текст, названия ингредиентов и тегов
+рецепта; update_search_documents пересобирает его после изменений.
+Индекс зависит от базы:
+
+* PostgreSQL - сохраняемый генерируемый столбец search_vector
+  (name с весом A, search_document с весом B) и GIN-индекс по нему;
+* SQLite - FTS5-таблица FTS_TABLE с rowid = id рецепта, ее строки
+  обновляются вместе с search_document;
+* остальные базы - icontains по name и search_document.
+
+Столбец и таблица создаются миграцией 0005_search вне моделей Django.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, FloatField, Prefetch, Q
+from django.db.models.expressions import RawSQL
+
+from recipe.models import IngredientsRecipe, Recipe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipe_recipe_fts'
+# Веса bm25 для столбцов name и document FTS-таблицы.
+FTS_WEIGHTS = (10.0, 1.0)
+
+
+def build_document(recipe):
+    """Текст для поиска без названия: оно индексируется с большим весом."""
+    return ' '.join((
+        recipe.text,
+        *(item.ingredient.name
+          for item in recipe.ingredients_in_recipe.all()),
+        *(tag.name for tag in recipe.tags.all()),
+    ))
+
+
+@transaction.atomic
+def update_search_documents(recipe_ids):
+    """Пересобирает поисковые документы рецептов recipe_ids."""
+    recipes = list(Recipe.objects.filter(id__in=recipe_ids).only(
+        'id', 'name', 'text'
+    ).prefetch_related(
+        'tags',
+        Prefetch('ingredients_in_recipe',
+                 queryset=IngredientsRecipe.objects.select_related(
+                     'ingredient')),
+    ))
+    for recipe in recipes:
+        recipe.search_document = build_document(recipe)
+    Recipe.objects.bulk_update(recipes, ('search_document', ))
+    if connection.vendor == 'sqlite':
+        remove_search_documents([recipe.id for recipe in recipes])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, document) '
+                'VALUES (%s, %s, %s)',
+                [(recipe.id, recipe.name, recipe.search_document)
+                 for recipe in recipes])
+    return len(recipes)
+
+
+def remove_search_documents(recipe_ids):
+    """Удаляет строки FTS-таблицы; в PostgreSQL индекс уходит с рецептом."""
+    recipe_ids = list(recipe_ids)
+    if connection.vendor == 'sqlite' and recipe_ids:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+                f'({", ".join(["%s"] * len(recipe_ids))})', recipe_ids)
+
+
+def reindex(batch_size=1000):
+    """Пересобирает документы всех рецептов пачками по batch_size."""
+    indexed, last_id = 0, 0
+    while True:
+        recipe_ids = list(Recipe.objects.filter(id__gt=last_id).order_by(
+            'id').values_list('id', flat=True)[:batch_size])
+        if not recipe_ids:
+            return indexed
+        indexed += update_search_documents(recipe_ids)
+        last_id = recipe_ids[-1]
+
+
+def fts_query(value):
+    """Запрос FTS5 из слов value: все слова, каждое - как префикс."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', value))
+
+
+def search(queryset, value):
+    """
+    Рецепты queryset, подходящие под value, с аннотацией search_rank
+    (больше - релевантнее), по убыванию релевантности.
+    """
+    table = Recipe._meta.db_table
+    if connection.vendor == 'postgresql':
+        query = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        queryset = queryset.filter(RawSQL(
+            f'{table}.search_vector @@ {query}', (value, ),
+            output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank({table}.search_vector, {query})', (value, ),
+            output_field=FloatField(),
+        ))
+    elif connection.vendor == 'sqlite':
+        match = fts_query(value)
+        if not match:
+            return queryset
+        # Соединение с FTS-таблицей через extra: bm25 считается один раз
+        # на найденную строку, а не отдельным подзапросом с MATCH.
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        queryset = queryset.extra(
+            select={'search_rank': f'-bm25({FTS_TABLE}, {weights})'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        )
+    else:
+        queryset = queryset.filter(
+            Q(name__icontains=value) | Q(search_document__icontains=value)
+        ).annotate(search_rank=RawSQL('0', (), output_field=FloatField()))
+    return queryset.order_by('-search_rank', '-id')
@@ -0,0 +1,163 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipe.cook_index import (invalidate_cook_index,
+                               record_recipe_ingredients)
+from recipe.counters import counter_changed
+from recipe.data_version import bump_recipes_version
+from recipe.images import delete_variants
+from recipe.models import (FavoritesRecipe, Follow, Ingredient, Profile,
+                           Recipe, ShoppingList, Tag)
+from recipe.reference import invalidate_reference_data
+from recipe.search import remove_search_documents, update_search_documents
+
+# Сколько рецептов переиндексировать за раз при переименовании
+# ингредиента или тега.
+REINDEX_BATCH_SIZE = 1000
+
+# Счетчик рецепта, который меняет строка избранного или корзины.
+RECIPE_COUNTER_FIELDS = {
+    FavoritesRecipe: 'favorites_count',
+    ShoppingList: 'shopping_cart_count',
+}
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reference_changed(**kwargs):
+    invalidate_reference_data()
+    # Теги и названия ингредиентов входят в ответы с рецептами.
+    bump_recipes_version()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_changed(**kwargs):
+    bump_recipes_version()
+
+
+@receiver(post_save, sender=User)
+def author_changed(created, update_fields=None, raw=False, **kwargs):
+    """Имя и почта автора входят в ответы с рецептами."""
+    if created or raw or update_fields == frozenset(('last_login', )):
+        return
+    bump_recipes_version()
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(**kwargs):
+    invalidate_cook_index()
+
+
+@receiver(pre_save, sender=Ingredient)
+@receiver(pre_save, sender=Tag)
+def remember_name_change(sender, instance, raw=False, **kwargs):
+    instance.name_changed = (
+        not raw and instance.pk is not None
+        and sender.objects.filter(pk=instance.pk).exclude(
+            name=instance.name).exists()
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+def reindex_renamed(sender, instance, **kwargs):
+    """Название тега или ингредиента входит в поисковые документы."""
+    if not getattr(instance, 'name_changed', False):
+        return
+    if sender is Tag:
+        reindex_recipes(instance.recipes.all())
+    else:
+        reindex_recipes(Recipe.objects.filter(
+            ingredients_in_recipe__ingredient=instance))
+
+
+def reindex_recipes(recipes):
+    recipe_ids = list(recipes.values_list('id', flat=True))
+    for start in range(0, len(recipe_ids), REINDEX_BATCH_SIZE):
+        update_search_documents(
+            recipe_ids[start:start + REINDEX_BATCH_SIZE])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    remove_search_documents([instance.id])
+    record_recipe_ingredients(instance.id, ())
+    if instance.image_variants:
+        transaction.on_commit(
+            lambda: delete_variants(instance.image_variants))
+
+
+@receiver(post_save, sender=User)
+def create_profile(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+def deleted_with(origin, model, pk):
+    """Удаляется ли вместе со строкой объект, чей счетчик она меняет."""
+    return isinstance(origin, model) and origin.pk == pk
+
+
+@receiver(post_save, sender=FavoritesRecipe)
+@receiver(post_save, sender=ShoppingList)
+def recipe_mark_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counter_changed(Recipe, instance.recipe_id,
+                        RECIPE_COUNTER_FIELDS[sender], 1)
+
+
+@receiver(post_delete, sender=FavoritesRecipe)
+@receiver(post_delete, sender=ShoppingList)
+def recipe_mark_removed(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Recipe, instance.recipe_id):
+        counter_changed(Recipe, instance.recipe_id,
+                        RECIPE_COUNTER_FIELDS[sender], -1)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_author_change(instance, raw=False, update_fields=None,
+                           **kwargs):
+    instance.previous_author_id = None
+    if raw or instance.pk is None or (
+            update_fields is not None and 'author' not in update_fields):
+        return
+    instance.previous_author_id = Recipe.objects.filter(
+        pk=instance.pk).exclude(author_id=instance.author_id).values_list(
+            'author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_counted(instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counter_changed(Profile, instance.author_id, 'recipes_count', 1)
+    elif getattr(instance, 'previous_author_id', None) is not None:
+        counter_changed(Profile, instance.previous_author_id,
+                        'recipes_count', -1)
+        counter_changed(Profile, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_uncounted(instance, origin=None, **kwargs):
+    if not deleted_with(origin, User, instance.author_id):
+        counter_changed(Profile, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_added(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counter_changed(Profile, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(instance, origin=None, **kwargs):
+    if not deleted_with(origin, User, instance.author_id):
+        counter_changed(Profile, instance.author_id, 'followers_count', -1)